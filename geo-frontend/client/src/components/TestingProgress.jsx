@@ -1,8 +1,11 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 
 export default function TestingProgress({ personaSetId, promptsId, totalTests, onComplete }) {
   const [status, setStatus] = useState('starting');
   const [message, setMessage] = useState('Initializing GEO testing...');
+  // Read when a stage is shown, so a new count doesn't reopen the progress stream
+  const totalTestsRef = useRef(totalTests);
+  totalTestsRef.current = totalTests;
 
   useEffect(() => {
     // Simulate progress updates
@@ -12,50 +15,66 @@ export default function TestingProgress({ personaSetId, promptsId, totalTests, o
       { delay: 8000, status: 'running', message: '🧹 Clearing ChatGPT memory...' },
       { delay: 11000, status: 'running', message: '👤 Setting first persona...' },
       { delay: 14000, status: 'running', message: '📤 Sending test prompts...' },
-      { delay: 20000, status: 'running', message: `⏳ Running ${totalTests} tests. This may take several minutes...` },
+      { delay: 20000, status: 'running', message: () => `⏳ Running ${totalTestsRef.current} tests. This may take several minutes...` },
       { delay: 25000, status: 'running', message: '📊 Recording responses to MongoDB...' },
       { delay: 40000, status: 'checking', message: '🔍 Checking for results...' },
     ];
 
-    stages.forEach(({ delay, status: newStatus, message: newMessage }) => {
+    // Simulated stages only fill the wait until the runner reports real progress
+    let reported = false;
+    const timers = stages.map(({ delay, status: newStatus, message: newMessage }) =>
       setTimeout(() => {
+        if (reported) return;
         setStatus(newStatus);
-        setMessage(newMessage);
-      }, delay);
+        setMessage(typeof newMessage === 'function' ? newMessage() : newMessage);
+      }, delay)
+    );
+
+    // The runner pushes one small event per saved batch of results; the full
+    // results are downloaded once, when the run has finished.
+    // Runs of this persona set started before this screen opened are ignored.
+    const since = new Date(Date.now() - 60000).toISOString();
+    const source = new EventSource(
+      `http://localhost:5001/api/runs/${personaSetId}/progress/stream?since=${encodeURIComponent(since)}`
+    );
+
+    source.addEventListener('progress', (event) => {
+      const progress = JSON.parse(event.data);
+      reported = true;
+      const eta = progress.eta_seconds ? ` (about ${Math.ceil(progress.eta_seconds / 60)} min left)` : '';
+      const current = progress.current?.persona ? ` Latest: ${progress.current.persona}.` : '';
+      setStatus('running');
+      setMessage(`⏳ Testing in progress: ${progress.done}/${progress.total} tests complete${eta}.${current}`);
     });
 
-    // Check for results periodically
-    const checkResults = setInterval(async () => {
+    source.addEventListener('done', async (event) => {
+      source.close();
+      const progress = JSON.parse(event.data);
+      reported = true;
       try {
         const response = await fetch(`http://localhost:5001/api/test-results/${personaSetId}`);
-        
-        if (response.ok) {
-          const data = await response.json();
-          
-          // FIXED: Wait for ALL tests to complete, not just first result
-          // Only show analytics when we have all expected results
-          if (data.success && data.results && data.results.length >= totalTests) {
-            clearInterval(checkResults);
-            setStatus('complete');
-            setMessage(`✅ Testing complete! All ${data.results.length} tests finished.`);
-            console.log('All test results retrieved:', data);
-            setTimeout(() => onComplete(data), 2000);
-          } else if (data.results && data.results.length > 0) {
-            // Show progress: some results received, but not all yet
-            console.log(`Progress: ${data.results.length}/${totalTests} tests complete...`);
-            setMessage(`⏳ Testing in progress: ${data.results.length}/${totalTests} tests complete...`);
-          }
-        } else if (response.status === 404) {
-          // Results not ready yet, keep checking
-          console.log('Results not ready yet, continuing to check...');
+        if (!response.ok) {
+          throw new Error(`HTTP ${response.status}`);
         }
+        const data = await response.json();
+        setStatus('complete');
+        setMessage(progress.status === 'complete'
+          ? `✅ Testing complete! All ${progress.done} tests finished.`
+          : `⚠️ Run stopped early: ${progress.done}/${progress.total} tests finished.`);
+        console.log('All test results retrieved:', data);
+        setTimeout(() => onComplete(data), 2000);
       } catch (err) {
-        console.error('Error checking results:', err);
+        console.error('Error fetching results:', err);
+        setStatus('error');
+        setMessage(`❌ The run finished (${progress.done}/${progress.total} tests), but its results could not be loaded: ${err.message}`);
       }
-    }, 8000); // Check every 8 seconds
+    });
 
-    return () => clearInterval(checkResults);
-  }, [personaSetId, totalTests, onComplete]);
+    return () => {
+      timers.forEach(clearTimeout);
+      source.close();
+    };
+  }, [personaSetId, onComplete]);
 
   return (
     <div className="min-h-screen flex items-center justify-center bg-gradient-to-br from-gray-50 to-gray-100 px-4">
@@ -80,7 +99,9 @@ export default function TestingProgress({ personaSetId, promptsId, totalTests, o
           {/* Title */}
           <div>
             <h2 className="text-3xl font-bold text-gray-900 mb-2">
-              {status === 'complete' ? 'Testing Complete!' : 'GEO Testing In Progress'}
+              {status === 'complete' ? 'Testing Complete!' :
+               status === 'error' ? 'Could Not Load Results' :
+               'GEO Testing In Progress'}
             </h2>
             <p className="text-lg text-gray-600">{message}</p>
           </div>
@@ -96,10 +117,12 @@ export default function TestingProgress({ personaSetId, promptsId, totalTests, o
               <span className={`font-semibold ${
                 status === 'complete' ? 'text-green-600' : 
                 status === 'checking' ? 'text-yellow-600' : 
+                status === 'error' ? 'text-red-600' : 
                 'text-primary-600'
               }`}>
                 {status === 'complete' ? 'Complete ✓' : 
                  status === 'checking' ? 'Checking Results...' : 
+                 status === 'error' ? 'Error' : 
                  'Running...'}
               </span>
             </div>
@@ -123,7 +146,7 @@ export default function TestingProgress({ personaSetId, promptsId, totalTests, o
             </div>
           </div>
 
-          {status !== 'complete' && (
+          {status !== 'complete' && status !== 'error' && (
             <p className="text-sm text-gray-500">
               Please wait... Do not close this window.
             </p>
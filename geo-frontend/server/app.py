@@ -1,11 +1,16 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 import requests
 from openai import OpenAI
 import json
-from pymongo import MongoClient
+import hashlib
+import threading
+import time
+from pymongo import MongoClient, DESCENDING
+from pymongo.errors import OperationFailure
+import sys
 from datetime import datetime
 from bson import ObjectId
 
@@ -18,6 +23,17 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 PERPLEXITY_API_KEY = os.getenv('PERPLEXITY_API_KEY')
 MONGODB_URI = os.getenv('MONGODB_URI')
 MONGODB_DATABASE = os.getenv('MONGODB_DATABASE', 'geo_sundai')
+RUNNER_DAEMON_HOST = os.getenv('RUNNER_DAEMON_HOST', '127.0.0.1')
+RUNNER_DAEMON_PORT = int(os.getenv('RUNNER_DAEMON_PORT', '5055'))
+
+GEO_TESTING_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'geo-testing'))
+# Index definitions and run summaries are shared with the runner
+sys.path.append(GEO_TESTING_PATH)
+from utils.run_summary import FINISHED_STATUSES, new_test_run_id, rate_stats, run_progress, summary_breakdowns, summary_stats
+from utils.job_queue import FINISHED_JOB_STATUSES, JobQueue
+
+# Mirrors PERSONA_STRATEGIES in geo-testing/run_from_db.py
+PERSONA_STRATEGIES = ('memory', 'inline', 'custom_instructions')
 
 # Initialize OpenAI client for persona generation
 openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
@@ -32,6 +48,8 @@ perplexity_client = OpenAI(
 mongo_client = None
 db = None
 personas_collection = None
+job_queue = None
+job_queue_lock = threading.Lock()
 
 if MONGODB_URI:
     try:
@@ -44,6 +62,14 @@ if MONGODB_URI:
     except Exception as e:
         print(f"❌ MongoDB connection failed: {e}")
 
+if db is not None:
+    # Creating the indexes is idempotent (see geo-testing/utils/indexes.py)
+    try:
+        from utils.indexes import ensure_indexes
+        print(f"🗂️ MongoDB indexes ready: {len(ensure_indexes(db))}")
+    except Exception as e:
+        print(f"⚠️ Could not ensure MongoDB indexes: {e}")
+
 @app.route('/api/scrape', methods=['POST'])
 def scrape_url():
     """
@@ -503,26 +529,103 @@ def save_prompts():
             'message': str(e)
         }), 500
 
+def submit_to_runner_daemon(job):
+    """
+    Hand a run to the warm runner daemon (geo-testing/runner_daemon.py).
+    Returns the daemon's reply, or None when no daemon is listening.
+    """
+    import socket
+    
+    try:
+        with socket.create_connection((RUNNER_DAEMON_HOST, RUNNER_DAEMON_PORT), timeout=0.5) as sock:
+            sock.settimeout(30)
+            sock.sendall((json.dumps({'action': 'run', **job}) + '\n').encode())
+            reply = sock.makefile('r').readline()
+    except OSError:
+        return None
+    
+    return json.loads(reply) if reply else None
+
+def get_job_queue():
+    """
+    The job queue of one-off runs (geo-testing/utils/job_queue.py), started on
+    first use so that only the process serving requests dispatches jobs (not
+    the debug reloader's parent).
+    """
+    global job_queue
+    with job_queue_lock:
+        if job_queue is None:
+            job_queue = JobQueue(db, cwd=GEO_TESTING_PATH).start()
+    return job_queue
+
 @app.route('/api/run-geo-test', methods=['POST'])
 def run_geo_test():
     """
-    Trigger GEO testing with saved personas and prompts
+    Trigger GEO testing with saved personas and prompts.
+    Pass `resume` (a test_run_id) to finish an interrupted run: only the
+    persona/prompt pairs without a saved result are run again.
     """
     try:
         data = request.get_json()
         persona_set_id = data.get('persona_set_id', '')
         prompts_id = data.get('prompts_id', '')
+        workers = data.get('workers', 1)
+        persona_strategy = data.get('persona_strategy', 'memory')
+        resume = data.get('resume')
+        
+        if resume and db is not None and not (persona_set_id and prompts_id):
+            # Resuming only needs the run ID; the run's results know what it was testing
+            saved = db.test_results.find_one({'test_run_id': resume}, {'persona_set_id': 1, 'prompts_id': 1})
+            if not saved:
+                return jsonify({'error': f'No saved results for {resume}, nothing to resume'}), 404
+            persona_set_id = saved['persona_set_id']
+            prompts_id = saved['prompts_id']
         
         if not persona_set_id or not prompts_id:
             return jsonify({'error': 'persona_set_id and prompts_id are required'}), 400
         
-        # Import and run the testing script
-        import subprocess
+        try:
+            workers = int(workers)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'workers must be an integer'}), 400
+        if workers < 1:
+            return jsonify({'error': 'workers must be at least 1'}), 400
+        if persona_strategy not in PERSONA_STRATEGIES:
+            return jsonify({'error': f"persona_strategy must be one of {', '.join(PERSONA_STRATEGIES)}"}), 400
+        
+        # Prefer the warm runner daemon; fall back to the managed job queue
+        daemon_reply = submit_to_runner_daemon({
+            'persona_set_id': persona_set_id,
+            'prompts_id': prompts_id,
+            'workers': workers,
+            'persona_strategy': persona_strategy,
+            'resume': resume
+        })
+        if daemon_reply is not None:
+            if not daemon_reply.get('success'):
+                return jsonify({
+                    'error': 'Runner daemon rejected the run',
+                    'message': daemon_reply.get('error', 'Unknown error')
+                }), 400
+            return jsonify({
+                'success': True,
+                'message': 'GEO testing queued on runner daemon',
+                'persona_set_id': persona_set_id,
+                'prompts_id': prompts_id,
+                'workers': workers,
+                'persona_strategy': persona_strategy,
+                'runner': 'daemon',
+                'test_run_id': daemon_reply.get('test_run_id'),
+                'total_tests': daemon_reply.get('total_tests'),
+                'remaining_tests': daemon_reply.get('remaining_tests')
+            }), 200
+        
+        # No daemon: queue a one-off run_from_db process on the managed job queue
+        if db is None:
+            return jsonify({'error': 'MongoDB is not configured, runs cannot be queued'}), 503
         
-        # Path to the geo-testing directory
-        geo_testing_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'geo-testing'))
-        script_path = os.path.join(geo_testing_path, 'run_from_db.py')
-        python_path = os.path.join(geo_testing_path, 'venv', 'bin', 'python')
+        script_path = os.path.join(GEO_TESTING_PATH, 'run_from_db.py')
+        python_path = os.path.join(GEO_TESTING_PATH, 'venv', 'bin', 'python')
         
         # Check if paths exist
         if not os.path.exists(script_path):
@@ -530,21 +633,33 @@ def run_geo_test():
         if not os.path.exists(python_path):
             return jsonify({'error': f'Python venv not found: {python_path}'}), 500
         
-        # Run the test in the background with geo-testing venv
-        process = subprocess.Popen(
-            [python_path, script_path, persona_set_id, prompts_id],
-            cwd=geo_testing_path,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+        # The run ID is fixed up front so the job, its progress and its results can be linked
+        test_run_id = resume or new_test_run_id()
+        command = [python_path, script_path, persona_set_id, prompts_id, '--workers', str(workers),
+                   '--persona-strategy', persona_strategy]
+        command += ['--resume', resume] if resume else ['--test-run-id', test_run_id]
+        
+        job = get_job_queue().submit(
+            command,
+            persona_set_id=persona_set_id,
+            prompts_id=prompts_id,
+            test_run_id=test_run_id,
+            options={'workers': workers, 'persona_strategy': persona_strategy, 'resume': resume}
         )
+        job = get_job_queue().status(job['job_id'])
         
         return jsonify({
             'success': True,
-            'message': 'GEO testing started successfully',
+            'message': 'GEO testing queued',
             'persona_set_id': persona_set_id,
             'prompts_id': prompts_id,
-            'process_id': process.pid
+            'workers': workers,
+            'persona_strategy': persona_strategy,
+            'runner': 'job_queue',
+            'test_run_id': test_run_id,
+            'job_id': job['job_id'],
+            'job_status': job['status'],
+            'queue_position': job.get('queue_position')
         }), 200
         
     except Exception as e:
@@ -555,61 +670,253 @@ def run_geo_test():
             'traceback': traceback.format_exc()
         }), 500
 
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """Latest queued, running and finished run jobs"""
+    if db is None:
+        return jsonify({'error': 'MongoDB is not configured'}), 503
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify({'jobs': [progress_json(job) for job in get_job_queue().list_jobs(limit)]}), 200
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Status of a run job; `?log=N` adds the last N lines of its output
+    """
+    if db is None:
+        return jsonify({'error': 'MongoDB is not configured'}), 503
+    job = get_job_queue().status(job_id)
+    if job is None:
+        return jsonify({'error': f'No job {job_id}'}), 404
+    response = progress_json(job)
+    if request.args.get('log'):
+        try:
+            lines = min(int(request.args['log']), 1000)
+        except ValueError:
+            return jsonify({'error': 'log must be a number of lines'}), 400
+        response['log'] = get_job_queue().log_tail(job_id, lines)
+    return jsonify(response), 200
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    Cancel a queued job, or interrupt a running one (its results so far are
+    kept and its run is marked interrupted, so it can be resumed)
+    """
+    if db is None:
+        return jsonify({'error': 'MongoDB is not configured'}), 503
+    job = get_job_queue().cancel(job_id)
+    if job is None:
+        return jsonify({'error': f'No job {job_id}'}), 404
+    if job['status'] in FINISHED_JOB_STATUSES and job['status'] != 'cancelled':
+        return jsonify({'error': f"Job {job_id} already {job['status']}", 'job': progress_json(job)}), 409
+    return jsonify({'success': True, 'job': progress_json(job)}), 200
+
+def results_query(test_run_id):
+    """Results of a run, addressed by its test_run_id, persona set ID or prompts ID"""
+    return {
+        '$or': [
+            {'persona_set_id': test_run_id},
+            {'prompts_id': test_run_id},
+            {'test_run_id': test_run_id}
+        ]
+    }
+
+def aggregate_result_stats(match):
+    """
+    Overall, per-persona and per-prompt counters of the matching results, computed
+    by MongoDB in one $facet pass so only the numbers reach Flask.
+    Returns None when nothing matches.
+    """
+    counters = {
+        'tests': {'$sum': 1},
+        'with_citations': {'$sum': {'$cond': ['$has_citations', 1, 0]}},
+        'brand_mentioned': {'$sum': {'$cond': ['$brand_mentioned', 1, 0]}}
+    }
+    pipeline = [
+        {'$match': match},
+        # Only the grouped fields go through the sort (no response text)
+        {'$project': {
+            '_id': 0,
+            'timestamp': 1,
+            'has_citations': 1,
+            'brand_mentioned': 1,
+            'persona_details.name': 1,
+            'prompt_details.prompt': 1,
+            'website_title': 1,
+            'website_url': 1
+        }},
+        # Latest result first, so $first picks the current website info
+        {'$sort': {'timestamp': -1}},
+        {'$facet': {
+            'overall': [{'$group': {
+                '_id': None,
+                **counters,
+                'website_title': {'$first': '$website_title'},
+                'website_url': {'$first': '$website_url'}
+            }}],
+            'personas': [{'$group': {'_id': '$persona_details.name', **counters}}, {'$sort': {'_id': 1}}],
+            'prompts': [{'$group': {'_id': '$prompt_details.prompt', **counters}}, {'$sort': {'_id': 1}}]
+        }}
+    ]
+    facets = next(db.test_results.aggregate(pipeline, allowDiskUse=True), None)
+    if not facets or not facets['overall']:
+        return None
+    
+    overall = facets['overall'][0]
+    return {
+        'stats': rate_stats(overall['tests'], overall['with_citations'], overall['brand_mentioned']),
+        'personas': [
+            {'name': group['_id'] or 'Unknown', 'tests': group['tests'],
+             'with_citations': group['with_citations'], 'brand_mentioned': group['brand_mentioned']}
+            for group in facets['personas']
+        ],
+        'prompts': [
+            {'prompt': group['_id'] or 'Unknown', 'tests': group['tests'],
+             'with_citations': group['with_citations'], 'brand_mentioned': group['brand_mentioned']}
+            for group in facets['prompts']
+        ],
+        'website_title': overall.get('website_title') or 'Unknown',
+        'website_url': overall.get('website_url') or ''
+    }
+
+def run_summary_stats(test_run_id, match):
+    """
+    The same numbers as aggregate_result_stats, read from the live summary of the
+    latest run behind these results (by test_run_id, persona set or prompts ID).
+    Returns None unless that run holds every matching result, e.g. when a persona
+    set was run more than once or a run predates the summaries.
+    """
+    summary = db.test_runs.find_one(
+        {'$and': [results_query(test_run_id), {'counts.done': {'$gt': 0}}]},
+        sort=[('started_at', DESCENDING)]
+    )
+    if not summary:
+        return None
+    # An indexed count; far cheaper than aggregating the results
+    if db.test_results.count_documents(match) != summary['counts']['done']:
+        return None
+    return {
+        'stats': summary_stats(summary),
+        **summary_breakdowns(summary),
+        'website_title': summary.get('website_title') or 'Unknown',
+        'website_url': summary.get('website_url') or '',
+        'status': summary.get('status')
+    }
+
+# Model and prompt of generate_ai_analysis; bump the version whenever its prompt changes
+ANALYSIS_MODEL = 'gpt-4o-mini'
+ANALYSIS_PROMPT_VERSION = 1
+
+# Per-test fields the AI analysis needs (no response text)
+TEST_DETAIL_FIELDS = {'persona_details.name': 1, 'prompt_details.prompt': 1, 'brand_mentioned': 1, 'has_citations': 1}
+
+def runs_finished(test_run_id):
+    """False while a run behind these results is still running and has tests left"""
+    runs = db.test_runs.find(results_query(test_run_id), {'status': 1, 'counts': 1, 'total_tests': 1})
+    for run in runs:
+        counts = run.get('counts') or {}
+        tried = counts.get('done', 0) + counts.get('failed', 0)
+        if run.get('status') == 'running' and tried < run.get('total_tests', 0):
+            return False
+    return True
+
+def analysis_fingerprint(test_run_id, result_count, latest_result_id):
+    """Identifies a result set and the analysis settings; any new result changes it"""
+    key = f"{test_run_id}|{result_count}|{latest_result_id}|{ANALYSIS_MODEL}|{ANALYSIS_PROMPT_VERSION}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def cached_ai_analysis(test_run_id, match, numbers, mode='auto'):
+    """
+    AI analysis of a result set, cached in the analyses collection by fingerprint.
+
+    mode 'auto' computes a missing analysis only once the run is finished (until
+    then the latest cached one is returned as stale, if any), 'refresh' computes
+    it now, 'none' skips it. Returns (analysis or None, status) where status is
+    cached, computed, stale, pending or skipped.
+    """
+    if mode == 'none':
+        return None, 'skipped'
+    
+    latest = db.test_results.find_one(match, {'_id': 1}, sort=[('timestamp', -1)])
+    fingerprint = analysis_fingerprint(test_run_id, numbers['stats']['total_tests'], latest['_id'] if latest else None)
+    cached = db.analyses.find_one({'fingerprint': fingerprint}, {'analysis': 1})
+    if cached and mode != 'refresh':
+        return cached['analysis'], 'cached'
+    
+    if mode != 'refresh' and not runs_finished(test_run_id):
+        stale = db.analyses.find_one({'test_run_id': test_run_id}, {'analysis': 1}, sort=[('created_at', -1)])
+        return (stale['analysis'], 'stale') if stale else (None, 'pending')
+    
+    test_details = list(db.test_results.find(match, TEST_DETAIL_FIELDS).sort('timestamp', -1))
+    analysis = generate_ai_analysis(numbers['stats'], numbers['personas'], numbers['prompts'], test_details,
+                                    numbers['website_title'], numbers['website_url'])
+    if analysis.get('score') is not None:
+        # Upsert: concurrent polls of the same result set share one document
+        db.analyses.update_one(
+            {'fingerprint': fingerprint},
+            {
+                '$set': {'analysis': analysis, 'updated_at': datetime.utcnow()},
+                '$setOnInsert': {
+                    'test_run_id': test_run_id,
+                    'result_count': numbers['stats']['total_tests'],
+                    'latest_result_id': latest['_id'] if latest else None,
+                    'model': ANALYSIS_MODEL,
+                    'prompt_version': ANALYSIS_PROMPT_VERSION,
+                    'created_at': datetime.utcnow()
+                }
+            },
+            upsert=True
+        )
+    return analysis, 'computed'
+
 @app.route('/api/test-results/<test_run_id>', methods=['GET'])
 def get_test_results(test_run_id):
     """
-    Get results for a specific test run with AI analysis
+    Get results for a specific test run with AI analysis.
+    Pass ?results=none to get only the stats and analysis, without the result documents.
+    The analysis is cached per result set and only computed once the run is finished;
+    ?analysis=refresh computes it now, ?analysis=none leaves it out.
     """
     try:
         if db is None:
             return jsonify({'error': 'Database not configured'}), 500
         
-        # Query test_results collection
-        results = list(db.test_results.find({
-            '$or': [
-                {'persona_set_id': test_run_id},
-                {'prompts_id': test_run_id},
-                {'test_run_id': test_run_id}
-            ]
-        }).sort('timestamp', -1))
-        
-        if not results:
+        match = results_query(test_run_id)
+        # Runs keep live counters in test_runs; results spread over several runs are aggregated
+        numbers = run_summary_stats(test_run_id, match) or aggregate_result_stats(match)
+        if not numbers:
             return jsonify({
                 'success': False,
                 'message': 'No results found yet. Tests may still be running.'
             }), 404
         
-        # Convert ObjectId to string and convert datetime
-        for result in results:
-            result['_id'] = str(result['_id'])
-            if 'timestamp' in result:
-                result['timestamp'] = result['timestamp'].isoformat()
-        
-        # Calculate stats
-        total = len(results)
-        with_citations = sum(1 for r in results if r.get('has_citations'))
-        brand_mentioned = sum(1 for r in results if r.get('brand_mentioned'))
-        
-        # Get website info from first result
-        website_title = results[0].get('website_title', 'Unknown')
-        website_url = results[0].get('website_url', '')
-        
-        stats = {
-            'total_tests': total,
-            'with_citations': with_citations,
-            'brand_mentioned': brand_mentioned,
-            'brand_mention_rate': brand_mentioned / total if total > 0 else 0,
-            'citation_rate': with_citations / total if total > 0 else 0
-        }
+        results = []
+        if request.args.get('results', 'all') != 'none':
+            results = list(db.test_results.find(match).sort('timestamp', -1))
+            # Convert ObjectId to string and convert datetime
+            for result in results:
+                result['_id'] = str(result['_id'])
+                if 'timestamp' in result:
+                    result['timestamp'] = result['timestamp'].isoformat()
+        
+        stats = numbers['stats']
+        website_title = numbers['website_title']
+        website_url = numbers['website_url']
         
-        # Generate AI analysis
-        analysis = generate_ai_analysis(results, stats, website_title, website_url)
+        analysis, analysis_status = cached_ai_analysis(test_run_id, match, numbers,
+                                                       mode=request.args.get('analysis', 'auto'))
         
         return jsonify({
             'success': True,
             'results': results,
             'stats': stats,
+            'run_status': numbers.get('status'),
             'analysis': analysis,
+            'analysis_status': analysis_status,
             'website_title': website_title,
             'website_url': website_url
         }), 200
@@ -622,41 +929,117 @@ def get_test_results(test_run_id):
             'traceback': traceback.format_exc()
         }), 500
 
-def generate_ai_analysis(results, stats, website_title, website_url):
+# SSE: polling interval where change streams are unavailable, and keep-alive interval
+PROGRESS_POLL_SECONDS = 1
+PROGRESS_HEARTBEAT_SECONDS = 15
+
+def find_run_summary(run_id, since=None):
+    """
+    The test_runs summary of a run, by test_run_id or by persona set / prompts ID
+    (then the latest run started after `since`, if given)
+    """
+    query = results_query(run_id)
+    if since:
+        query = {'$and': [query, {'started_at': {'$gte': since}}]}
+    return db.test_runs.find_one(query, {'personas': 0, 'prompts': 0}, sort=[('started_at', DESCENDING)])
+
+def progress_json(progress):
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in progress.items()}
+
+def parse_since(value):
+    """?since=<ISO 8601 UTC time>, e.g. when the client launched the run"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+@app.route('/api/runs/<run_id>/progress', methods=['GET'])
+def get_run_progress(run_id):
+    """
+    Counters of a run (done/failed/total, current persona/prompt, ETA) from its
+    live summary. `run_id` may also be a persona set or prompts ID (latest run).
+    """
+    try:
+        if db is None:
+            return jsonify({'error': 'Database not configured'}), 500
+        summary = find_run_summary(run_id, parse_since(request.args.get('since')))
+        if not summary:
+            return jsonify({'success': False, 'message': 'Run not started yet'}), 404
+        return jsonify({'success': True, **progress_json(run_progress(summary))}), 200
+    except Exception as e:
+        return jsonify({'error': 'Failed to get progress', 'message': str(e)}), 500
+
+def run_summary_changes(run_id):
+    """
+    Yield once right away, then whenever a matching test_runs document may have
+    changed (change stream) or every PROGRESS_POLL_SECONDS where change streams
+    are unsupported (standalone servers). Also yields after
+    PROGRESS_HEARTBEAT_SECONDS without changes.
+    """
+    yield
+    fields = ('test_run_id', 'persona_set_id', 'prompts_id')
+    pipeline = [{'$match': {'$or': [{f'fullDocument.{field}': run_id} for field in fields]}}]
+    try:
+        with db.test_runs.watch(pipeline, full_document='updateLookup',
+                                max_await_time_ms=PROGRESS_HEARTBEAT_SECONDS * 1000) as stream:
+            while stream.alive:
+                stream.try_next()
+                yield
+    except OperationFailure:
+        while True:
+            time.sleep(PROGRESS_POLL_SECONDS)
+            yield
+
+def progress_events(run_id, since):
+    """SSE stream: a `progress` event whenever the run's counters change, `done` once it has finished"""
+    last_key = None
+    last_sent = time.monotonic()
+    for _ in run_summary_changes(run_id):
+        summary = find_run_summary(run_id, since)
+        if summary:
+            progress = progress_json(run_progress(summary))
+            key = (progress['status'], progress['done'], progress['failed'])
+            if key != last_key:
+                last_key = key
+                last_sent = time.monotonic()
+                yield f"event: progress\ndata: {json.dumps(progress)}\n\n"
+            if progress['status'] in FINISHED_STATUSES:
+                yield f"event: done\ndata: {json.dumps(progress)}\n\n"
+                return
+        if time.monotonic() - last_sent >= PROGRESS_HEARTBEAT_SECONDS:
+            last_sent = time.monotonic()
+            yield ": keep-alive\n\n"
+
+@app.route('/api/runs/<run_id>/progress/stream', methods=['GET'])
+def stream_run_progress(run_id):
+    """Server-Sent Events variant of get_run_progress; waits for the run to start"""
+    if db is None:
+        return jsonify({'error': 'Database not configured'}), 500
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError:
+        return jsonify({'error': 'since must be an ISO 8601 time'}), 400
+    return Response(stream_with_context(progress_events(run_id, since)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def generate_ai_analysis(stats, personas, prompts, test_details, website_title, website_url):
     """
     Use OpenAI to analyze test results and provide brand visibility insights
-    Analyzes ALL test results, not just samples
+    Analyzes ALL test results, not just samples: `personas` and `prompts` are the
+    per-persona/per-prompt counters, `test_details` one small dict per result
     """
     try:
         from openai import OpenAI
         client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
         
-        # Aggregate data from ALL results
-        persona_performance = {}
-        prompt_performance = {}
         all_test_details = []
         
-        # Analyze ALL results (e.g., 3 personas × 3 prompts = 9 tests)
-        for idx, result in enumerate(results, 1):
+        # Every result (e.g., 3 personas × 3 prompts = 9 tests)
+        for idx, result in enumerate(test_details, 1):
             persona_name = result.get('persona_details', {}).get('name', f'Persona {idx}')
             prompt_text = result.get('prompt_details', {}).get('prompt', f'Prompt {idx}')
             brand_mentioned = result.get('brand_mentioned', False)
             has_citations = result.get('has_citations', False)
             
-            # Track persona performance
-            if persona_name not in persona_performance:
-                persona_performance[persona_name] = {'mentions': 0, 'tests': 0}
-            persona_performance[persona_name]['tests'] += 1
-            if brand_mentioned:
-                persona_performance[persona_name]['mentions'] += 1
-            
-            # Track prompt performance
-            if prompt_text not in prompt_performance:
-                prompt_performance[prompt_text] = {'mentions': 0, 'tests': 0}
-            prompt_performance[prompt_text]['tests'] += 1
-            if brand_mentioned:
-                prompt_performance[prompt_text]['mentions'] += 1
-            
             # Collect test details
             all_test_details.append({
                 'test_num': idx,
@@ -675,26 +1058,26 @@ def generate_ai_analysis(results, stats, website_title, website_url):
             'citation_rate': f"{stats['citation_rate'] * 100:.1f}%",
             'persona_breakdown': [
                 {
-                    'name': name, 
-                    'mention_rate': f"{(data['mentions']/data['tests']*100):.0f}%",
-                    'tests': data['tests']
+                    'name': persona['name'], 
+                    'mention_rate': f"{(persona['brand_mentioned']/persona['tests']*100):.0f}%",
+                    'tests': persona['tests']
                 }
-                for name, data in persona_performance.items()
+                for persona in personas
             ],
             'prompt_breakdown': [
                 {
-                    'prompt': prompt[:60] + '...' if len(prompt) > 60 else prompt,
-                    'mention_rate': f"{(data['mentions']/data['tests']*100):.0f}%",
-                    'tests': data['tests']
+                    'prompt': prompt['prompt'][:60] + '...' if len(prompt['prompt']) > 60 else prompt['prompt'],
+                    'mention_rate': f"{(prompt['brand_mentioned']/prompt['tests']*100):.0f}%",
+                    'tests': prompt['tests']
                 }
-                for prompt, data in prompt_performance.items()
+                for prompt in prompts
             ],
             'all_tests': all_test_details
         }
         
         # Call OpenAI for analysis with ALL test data
         response = client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=ANALYSIS_MODEL,
             messages=[
                 {
                     "role": "system",
@@ -146,6 +146,19 @@ def analyze_all_results():
         print(f"  {persona}: \"{prompt}...\"")
         print(f"  Response: {len(r.get('response_text', ''))} chars, {r.get('analysis_flags', {}).get('citation_count', 0)} citations")
     
+    # Stage latency per run (regressions show up as a jump between runs)
+    latency_runs = db.get_latency_by_run()
+    if latency_runs:
+        print_header("⏱️  STAGE LATENCY BY RUN (avg ms)")
+        stages = ["clear_memory", "set_persona", "new_chat", "send", "wait", "extract", "total"]
+        print(f"\n{'run':<22}{'tests':>6}" + "".join(f"{stage:>14}" for stage in stages))
+        for run in latency_runs:
+            cells = "".join(
+                f"{run[f'{stage}_ms']:>14.0f}" if run.get(f"{stage}_ms") is not None else f"{'-':>14}"
+                for stage in stages
+            )
+            print(f"{run['_id']:<22}{run['tests']:>6}{cells}")
+    
     # Export option
     print_header("💾 DATA EXPORT")
     print("\nExport options:")
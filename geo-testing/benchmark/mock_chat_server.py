@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for chatgpt.com, for benchmarking the runner without the real site.
+
+Serves a single-page chat app exposing the selectors the workflows rely on
+(#prompt-textarea, send-button / stop-button, conversation-turn-N, the profile
+menu, the memory reset dialogs and the custom instructions field) and streams
+answers from POST /backend-api/conversation in the delta SSE format, so both
+DOM extraction and --capture network work against it.
+
+The page also carries the weight a real one does: cacheable images and a web
+font, a favicon per citation and a third-party tracker script (served from
+tracker.localhost, which Chromium resolves to loopback) that beacons while
+the page is open. The server counts the bytes it sends, so the benchmark can
+report bandwidth per test.
+
+Streaming latency, answer size, page weight and failure injection are configurable.
+
+Usage:
+    python benchmark/mock_chat_server.py --port 8765 --first-token-ms 800 --answer-words 300
+    CHATGPT_URL=http://127.0.0.1:8765/ python run_from_db.py <persona_set_id> <prompts_id>
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+
+DEFAULT_MOCK_SETTINGS = {
+    "first_token_ms": 800,     # Delay before the first streamed chunk
+    "chunk_delay_ms": 40,      # Delay between streamed chunks
+    "chunk_words": 3,          # Words per streamed chunk
+    "answer_words": 250,       # Answer length
+    "citations": 3,            # Cited links per answer
+    "failure_rate": 0.0,       # Fraction of answers that fail
+    "failure_mode": "stall",   # stall: stream stops mid-answer and never finishes
+                               # error: HTTP 500, the page shows an error turn
+    "asset_kb": 400,           # Images + web font per page load (cacheable); 0 disables page weight
+    "tracker_beacon_ms": 2000, # Tracker beacon interval; 0 disables the tracker
+    "seed": None,
+}
+
+FAILURE_MODES = ("stall", "error")
+
+# Third-party host of the mock tracker (add it to BROWSER_BLOCKED_HOSTS for the lean profile)
+MOCK_TRACKER_HOST = "tracker.localhost"
+IMAGE_COUNT = 4
+FAVICON_BYTES = 4 * 1024
+
+FILLER_WORDS = (
+    "the team compared several options based on price reliability support and reviews "
+    "customers often mention setup time integrations and how quickly issues get resolved "
+    "for most buyers the best choice depends on budget scale and the features they need"
+).split()
+
+CHAT_PAGE = """<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>ChatGPT (mock)</title>
+<style>
+  body { font-family: sans-serif; margin: 0; display: flex; flex-direction: column; height: 100vh; }
+  header { padding: 8px; border-bottom: 1px solid #ddd; }
+  main { flex: 1; overflow-y: auto; padding: 16px; }
+  article { margin-bottom: 16px; }
+  form { display: flex; gap: 8px; padding: 8px; border-top: 1px solid #ddd; }
+  textarea { flex: 1; height: 48px; }
+  [hidden] { display: none !important; }
+  .dialog { position: fixed; top: 20%; left: 30%; width: 40%; background: #fff; border: 1px solid #999; padding: 16px; }
+</style>
+__HEAD_ASSETS__
+</head>
+<body>
+<header>
+  __HEADER_ASSETS__
+  <button id="headlessui-menu-button-1" data-testid="profile-button" aria-haspopup="menu">Profile</button>
+  <div id="user-menu" role="menu" hidden>
+    <div role="menuitem" tabindex="-1" id="menu-personalization">Personalization</div>
+  </div>
+</header>
+<main id="thread"></main>
+<form id="composer" onsubmit="return false">
+  <textarea id="prompt-textarea" placeholder="Ask anything"></textarea>
+  <button type="button" id="send" data-testid="send-button" aria-label="Send prompt">Send</button>
+  <button type="button" id="stop" data-testid="stop-button" aria-label="Stop streaming" hidden>Stop</button>
+</form>
+
+<div id="settings" class="dialog" role="dialog" hidden>
+  <div role="tablist">
+    <button role="tab">Personalization</button>
+    <button data-testid="close-button" aria-label="Close settings" id="close-settings">Close</button>
+  </div>
+  <p>Memory <button id="manage-memories">Manage</button></p>
+  <p>
+    <label for="custom-about">Anything else ChatGPT should know about you?</label>
+    <textarea id="custom-about"></textarea>
+    <button id="save-custom-instructions">Save</button>
+  </p>
+</div>
+
+<div id="memories" class="dialog" data-testid="modal-memories" role="dialog" hidden>
+  <button data-testid="close-button" aria-label="Close memories" id="close-memories">Close</button>
+  <ul id="memory-list"></ul>
+  <button data-testid="reset-memories-button" id="reset-memories">Delete all</button>
+</div>
+
+<div id="confirm-reset" class="dialog" role="alertdialog" hidden>
+  <p>Clear all memories?</p>
+  <button data-testid="confirm-reset-memories-button" id="confirm-reset-button">Delete</button>
+</div>
+
+<script>
+const FAVICONS = __FAVICONS__;
+const $ = (id) => document.getElementById(id);
+const show = (id) => { $(id).hidden = false; };
+const hide = (id) => { $(id).hidden = true; };
+let turnCount = 0;
+
+const memories = () => JSON.parse(localStorage.getItem('mock-memories') || '[]');
+const renderMemories = () => {
+  $('memory-list').innerHTML = '';
+  for (const memory of memories()) {
+    const li = document.createElement('li');
+    li.textContent = memory;
+    $('memory-list').appendChild(li);
+  }
+};
+
+$('headlessui-menu-button-1').onclick = () => { $('user-menu').hidden = !$('user-menu').hidden; };
+$('menu-personalization').onclick = () => { hide('user-menu'); show('settings'); };
+$('manage-memories').onclick = () => { renderMemories(); show('memories'); };
+$('reset-memories').onclick = () => show('confirm-reset');
+$('confirm-reset-button').onclick = () => {
+  localStorage.setItem('mock-memories', '[]');
+  renderMemories();
+  hide('confirm-reset');
+};
+$('close-memories').onclick = () => hide('memories');
+$('close-settings').onclick = () => hide('settings');
+$('custom-about').value = localStorage.getItem('mock-custom-instructions') || '';
+$('save-custom-instructions').onclick = () => {
+  localStorage.setItem('mock-custom-instructions', $('custom-about').value);
+};
+
+const addTurn = () => {
+  turnCount += 1;
+  const article = document.createElement('article');
+  article.setAttribute('data-testid', `conversation-turn-${turnCount}`);
+  $('thread').appendChild(article);
+  return article;
+};
+
+const renderAnswer = (body, text, citations) => {
+  body.innerHTML = '';
+  for (const paragraph of text.split('\\n\\n')) {
+    const p = document.createElement('p');
+    p.textContent = paragraph;
+    body.appendChild(p);
+  }
+  for (const citation of citations) {
+    const p = document.createElement('p');
+    if (FAVICONS) {
+      const icon = document.createElement('img');
+      icon.src = '/assets/favicon?u=' + encodeURIComponent(citation.url);
+      icon.width = icon.height = 16;
+      p.append(icon, ' ');
+    }
+    p.append('Read more in ');
+    const link = document.createElement('a');
+    link.href = citation.url;
+    link.textContent = citation.title;
+    p.append(link, '.');
+    body.appendChild(p);
+  }
+};
+
+const sendPrompt = async () => {
+  const prompt = $('prompt-textarea').value;
+  if (!prompt.trim()) return;
+  $('prompt-textarea').value = '';
+  if (prompt.startsWith('Save this to memory:')) {
+    localStorage.setItem('mock-memories', JSON.stringify([...memories(), prompt.slice(20).trim()]));
+  }
+
+  addTurn().textContent = prompt;
+  const body = document.createElement('div');
+  body.className = 'markdown result-streaming';
+  addTurn().appendChild(body);
+  hide('send');
+  show('stop');
+
+  let text = '';
+  let citations = [];
+  try {
+    const response = await fetch('/backend-api/conversation', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ prompt }),
+    });
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const events = buffer.split('\\n\\n');
+      buffer = events.pop();
+      for (const event of events) {
+        const data = event.replace(/^data: /, '');
+        if (!event.startsWith('data: ') || data === '[DONE]') continue;
+        const payload = JSON.parse(data);
+        if (payload.p === '/message/metadata') {
+          citations = (payload.v.content_references || []).flatMap((ref) => ref.items || []);
+        } else if (typeof payload.v === 'string') {
+          text += payload.v;
+          renderAnswer(body, text, []);
+        }
+      }
+    }
+    renderAnswer(body, text, citations);
+  } catch (error) {
+    body.textContent = 'Something went wrong while generating the response.';
+  }
+  body.classList.remove('result-streaming');
+  hide('stop');
+  show('send');
+};
+
+$('send').onclick = sendPrompt;
+</script>
+</body>
+</html>
+"""
+
+TRACKER_SCRIPT = """(() => {
+  const send = () => {
+    const payload = JSON.stringify({
+      t: Date.now(),
+      path: location.pathname,
+      nodes: document.querySelectorAll('*').length,
+      pad: 'x'.repeat(1024),
+    });
+    navigator.sendBeacon('__TRACKER_ORIGIN__/collect', payload);
+  };
+  send();
+  setInterval(send, __BEACON_MS__);
+})();
+"""
+
+def asset_bytes(size: int) -> bytes:
+    """Deterministic filler of `size` bytes for mock images and fonts."""
+    return (bytes(range(256)) * (size // 256 + 1))[:size]
+
+def render_chat_page(settings: dict, port: int) -> str:
+    """CHAT_PAGE with the configured page weight filled in."""
+    head = header = ""
+    if settings["asset_kb"] > 0:
+        head += ("<style>@font-face { font-family: MockSans; src: url(/assets/font.woff2); }"
+                 " body { font-family: MockSans, sans-serif; }</style>")
+        header += "".join(f'<img src="/assets/image-{n}.png" width="24" height="24" alt="">'
+                          for n in range(1, IMAGE_COUNT + 1))
+    if settings["tracker_beacon_ms"] > 0:
+        head += f'<script async src="http://{MOCK_TRACKER_HOST}:{port}/collect.js"></script>'
+    return (CHAT_PAGE.replace("__HEAD_ASSETS__", head)
+            .replace("__HEADER_ASSETS__", header)
+            .replace("__FAVICONS__", "true" if settings["asset_kb"] > 0 else "false"))
+
+def build_answer(prompt: str, settings: dict, rng: random.Random):
+    """Return (answer text, content_references) for a prompt."""
+    words = [rng.choice(FILLER_WORDS) for _ in range(settings["answer_words"])]
+    sentences = []
+    for start in range(0, len(words), 15):
+        sentence = " ".join(words[start:start + 15])
+        sentences.append(sentence[:1].upper() + sentence[1:] + ".")
+    paragraphs = [" ".join(sentences[start:start + 4]) for start in range(0, len(sentences), 4)]
+    text = f"Here is an overview for: {prompt[:80]}\n\n" + "\n\n".join(paragraphs)
+
+    references = []
+    for n in range(1, settings["citations"] + 1):
+        references.append({
+            "start_idx": min(len(text) - 1, n * len(text) // (settings["citations"] + 1)),
+            "items": [{"title": f"Example Source {n}", "url": f"https://example.com/source-{n}"}],
+        })
+    return text, references
+
+class MockChatHandler(BaseHTTPRequestHandler):
+    server_version = "MockChat/1.0"
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+    def do_GET(self):
+        settings = self.server.settings
+        port = self.server.server_address[1]
+        path = self.path.split("?")[0]
+
+        if path.startswith("/backend-api") or path == "/favicon.ico":
+            self.send_error(404)
+        elif path.startswith("/assets/image-"):
+            size = settings["asset_kb"] * 1024 * 6 // 10 // IMAGE_COUNT
+            self._send_body(asset_bytes(size), "image/png", cacheable=True)
+        elif path == "/assets/font.woff2":
+            self._send_body(asset_bytes(settings["asset_kb"] * 1024 * 4 // 10), "font/woff2", cacheable=True)
+        elif path == "/assets/favicon":
+            self._send_body(asset_bytes(FAVICON_BYTES), "image/png")
+        elif path == "/collect.js":
+            script = (TRACKER_SCRIPT.replace("__TRACKER_ORIGIN__", f"http://{MOCK_TRACKER_HOST}:{port}")
+                      .replace("__BEACON_MS__", str(settings["tracker_beacon_ms"])))
+            # Real tag managers ship tens of KB of script
+            self._send_body((script + "/*" + "x" * 40 * 1024 + "*/").encode(), "text/javascript")
+        else:
+            self._send_body(render_chat_page(settings, port).encode(), "text/html; charset=utf-8")
+
+    def _send_body(self, body: bytes, content_type: str, cacheable: bool = False) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "max-age=600" if cacheable else "no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count_bytes(len(body))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = self.rfile.read(length)
+
+        if self.path.startswith("/collect"):
+            # Tracker beacon
+            self.send_response(204)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            return
+        if not self.path.startswith("/backend-api/conversation"):
+            self.send_error(404)
+            return
+
+        prompt = json.loads(payload or b"{}").get("prompt", "")
+        settings = self.server.settings
+        failure = self.server.roll_failure()
+
+        if failure == "error":
+            self.send_error(500, "Injected failure")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        try:
+            self._stream_answer(prompt, settings, stall=failure == "stall")
+        except (BrokenPipeError, ConnectionResetError):
+            # The page navigated away (new chat, or the runner gave up)
+            pass
+
+    def _send_event(self, payload) -> None:
+        data = payload if isinstance(payload, str) else json.dumps(payload)
+        event = f"data: {data}\n\n".encode()
+        self.wfile.write(event)
+        self.wfile.flush()
+        self.server.count_bytes(len(event))
+
+    def _stream_answer(self, prompt: str, settings: dict, stall: bool = False) -> None:
+        text, references = build_answer(prompt, settings, self.server.rng)
+        message = {
+            "id": str(uuid.uuid4()),
+            "author": {"role": "assistant"},
+            "content": {"content_type": "text", "parts": [""]},
+            "metadata": {},
+        }
+        self._send_event({"v": {"message": message}, "c": 0})
+        time.sleep(settings["first_token_ms"] / 1000)
+
+        tokens = text.split(" ")
+        step = max(1, settings["chunk_words"])
+        for start in range(0, len(tokens), step):
+            chunk = " ".join(tokens[start:start + step]) + (" " if start + step < len(tokens) else "")
+            if start == 0:
+                self._send_event({"p": "/message/content/parts/0", "o": "append", "v": chunk})
+            else:
+                self._send_event({"v": chunk})
+
+            if stall and start >= len(tokens) // 2:
+                # Hold the stream open without finishing until the client disconnects
+                while True:
+                    time.sleep(1)
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+
+            time.sleep(settings["chunk_delay_ms"] / 1000)
+
+        self._send_event({"p": "/message/metadata", "o": "append", "v": {"content_references": references}})
+        self._send_event("[DONE]")
+
+class MockChatServer(ThreadingHTTPServer):
+    """HTTP server holding the mock's settings; start() serves it from a daemon thread."""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, settings: dict = None):
+        super().__init__((host, port), MockChatHandler)
+        self.settings = {**DEFAULT_MOCK_SETTINGS, **(settings or {})}
+        if self.settings["failure_mode"] not in FAILURE_MODES:
+            raise ValueError(f"failure_mode must be one of {FAILURE_MODES}")
+        self.rng = random.Random(self.settings["seed"])
+        self._rng_lock = threading.Lock()
+        self._thread = None
+        self.bytes_sent = 0  # Response bodies, for bandwidth per test
+        self._bytes_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def count_bytes(self, n: int) -> None:
+        with self._bytes_lock:
+            self.bytes_sent += n
+
+    def roll_failure(self):
+        """Failure mode to inject into the next answer, or None."""
+        with self._rng_lock:
+            if self.rng.random() < self.settings["failure_rate"]:
+                return self.settings["failure_mode"]
+        return None
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-chat-server", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    """Mock settings as CLI flags (shared with benchmark/run_benchmark.py)."""
+    parser.add_argument("--first-token-ms", type=int, default=DEFAULT_MOCK_SETTINGS["first_token_ms"],
+                        help="Delay before the first streamed chunk (default: %(default)s)")
+    parser.add_argument("--chunk-delay-ms", type=int, default=DEFAULT_MOCK_SETTINGS["chunk_delay_ms"],
+                        help="Delay between streamed chunks (default: %(default)s)")
+    parser.add_argument("--chunk-words", type=int, default=DEFAULT_MOCK_SETTINGS["chunk_words"],
+                        help="Words per streamed chunk (default: %(default)s)")
+    parser.add_argument("--answer-words", type=int, default=DEFAULT_MOCK_SETTINGS["answer_words"],
+                        help="Answer length in words (default: %(default)s)")
+    parser.add_argument("--citations", type=int, default=DEFAULT_MOCK_SETTINGS["citations"],
+                        help="Cited links per answer (default: %(default)s)")
+    parser.add_argument("--failure-rate", type=float, default=DEFAULT_MOCK_SETTINGS["failure_rate"],
+                        help="Fraction of answers that fail (default: %(default)s)")
+    parser.add_argument("--failure-mode", choices=FAILURE_MODES, default=DEFAULT_MOCK_SETTINGS["failure_mode"],
+                        help="stall: answer never finishes streaming; error: HTTP 500 (default: %(default)s)")
+    parser.add_argument("--asset-kb", type=int, default=DEFAULT_MOCK_SETTINGS["asset_kb"],
+                        help="Image + web font weight per page load, 0 to disable (default: %(default)s)")
+    parser.add_argument("--tracker-beacon-ms", type=int, default=DEFAULT_MOCK_SETTINGS["tracker_beacon_ms"],
+                        help="Third-party tracker beacon interval, 0 to disable (default: %(default)s)")
+    parser.add_argument("--mock-seed", type=int, default=None, help="Seed for answers and failure injection")
+
+def mock_settings_from_args(args) -> dict:
+    return {
+        "first_token_ms": args.first_token_ms,
+        "chunk_delay_ms": args.chunk_delay_ms,
+        "chunk_words": args.chunk_words,
+        "answer_words": args.answer_words,
+        "citations": args.citations,
+        "failure_rate": args.failure_rate,
+        "failure_mode": args.failure_mode,
+        "asset_kb": args.asset_kb,
+        "tracker_beacon_ms": args.tracker_beacon_ms,
+        "seed": args.mock_seed,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve an offline ChatGPT stand-in for benchmarking")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: %(default)s)")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockChatServer(args.host, args.port, mock_settings_from_args(args))
+    print(f"🧪 Mock chat server on {server.url}")
+    print(f"   Point runners at it with CHATGPT_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Mock chat server stopped")
+        server.server_close()
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Benchmark runner throughput against the offline mock chat server.
+
+Starts benchmark/mock_chat_server.py (unless --url points at a running one),
+runs a synthetic persona × prompt matrix through run_from_db's persona-batch
+loop with one process per worker, and reports:
+
+    - tests/minute (from the first page being ready to the last test finishing)
+    - the per-stage latency breakdown (p50 / p95 / max, share of test time)
+    - CPU and peak RSS per worker (worker process + its browser), when psutil is installed
+    - bytes served per test (page, assets, tracker, answer stream), when it starts the mock
+
+--compare-profiles runs the matrix once per browser profile (default, lean)
+and reports the reduction in CPU, RSS and bandwidth per test.
+
+Results are kept in memory; nothing is written to MongoDB.
+
+Usage:
+    python benchmark/run_benchmark.py --personas 4 --prompts 5 --workers 2 --headless
+    python benchmark/run_benchmark.py --workers 4 --capture network --json benchmark.json
+    python benchmark/run_benchmark.py --compare-profiles --personas 2 --prompts 5
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from itertools import count
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark.mock_chat_server import MOCK_TRACKER_HOST, MockChatServer, add_mock_arguments, mock_settings_from_args
+from utils.browser_profile import BROWSER_PROFILES
+from utils.memory_guard import BrowserMemoryProbe
+from run_from_db import CAPTURE_MODES, DEFAULT_RUN_OPTIONS, PERSONA_STRATEGIES, make_logger, new_run_stats, plan_run
+from utils.timing import RunTimings, print_latency_breakdown
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+RESOURCE_SAMPLE_SECONDS = 0.5
+
+def synthetic_personas(n: int) -> list:
+    return [
+        {
+            "name": f"Benchmark Persona {i}",
+            "age": 30 + i,
+            "occupation": "operations manager",
+            "location": "Boston, MA",
+            "goals": ["save time", "compare vendors"],
+            "painPoints": ["too many tools"],
+            "behavior": "Research products online before buying",
+        }
+        for i in range(1, n + 1)
+    ]
+
+def synthetic_prompts(n: int) -> list:
+    return [{"prompt": f"What is the best CRM for a small team? (benchmark prompt {i})"} for i in range(1, n + 1)]
+
+class MemoryCollection:
+    """Stands in for the test_results collection so benchmark runs never touch MongoDB."""
+
+    def __init__(self):
+        self.documents = []
+        self._ids = count(1)
+
+    def insert_one(self, document: dict):
+        document["_id"] = next(self._ids)
+        self.documents.append(document)
+        return type("InsertOneResult", (), {"inserted_id": document["_id"]})()
+
+    def record_failure(self, entry: dict) -> None:
+        # Benchmarks keep no run summary
+        pass
+
+def benchmark_worker(worker_id: int, workers: int, url: str, headless: bool, verbose: bool,
+                     batch_queue, result_queue, run_info: dict) -> None:
+    """One worker process: own Playwright + browser, drains persona batches like run_worker."""
+    from playwright.sync_api import sync_playwright
+    import run_from_db
+
+    log = make_logger(worker_id, workers) if verbose else (lambda *args, **kwargs: None)
+    results_collection = MemoryCollection()
+    stats = new_run_stats(run_info)
+    stats_lock = threading.Lock()
+    report = {"worker_id": worker_id, "pid": os.getpid(), "ready_at": None, "finished_at": None}
+
+    playwright = sync_playwright().start()
+    try:
+        profile = run_info['browser_profile']
+        browser, context, page = run_from_db.launch_runner_browser(playwright, headless=headless, profile=profile)
+        contexts = [context]
+
+        def reopen():
+            context, page = run_from_db.new_runner_context(browser, profile=profile)
+            try:
+                page.goto(url)
+                page.locator("#prompt-textarea").wait_for(timeout=10000)
+            except Exception:
+                context.close()
+                raise
+            contexts.pop().close()
+            contexts.append(context)
+            return page
+
+        page.goto(url)
+        page.locator("#prompt-textarea").wait_for(timeout=10000)
+        slot = run_from_db.open_slot(page, run_info, reopen=reopen, probe=BrowserMemoryProbe(browser),
+                                     worker_id=worker_id)
+        report["ready_at"] = time.time()
+
+        while True:
+            try:
+                batch = batch_queue.get(timeout=0.5)
+            except queue.Empty:
+                break
+            run_from_db.run_persona_batch(slot, batch, run_info, results_collection, stats, stats_lock, log=log)
+
+        report["finished_at"] = time.time()
+        browser.close()
+    except Exception as e:
+        report["error"] = str(e).splitlines()[0] if str(e) else repr(e)
+    finally:
+        playwright.stop()
+        result_queue.put({
+            **report,
+            "successful_tests": stats["successful_tests"],
+            "failed_tests": stats["failed_tests"],
+            "stages": stats["timings"].samples,
+            "recycles": sum(entry["recycles"] for entry in stats["memory"].values()),
+        })
+
+def sample_resources(processes: list, usage: dict, stop: threading.Event) -> None:
+    """Sample CPU % and RSS of each worker process plus its browser children until stopped."""
+    tracked = {}
+    while not stop.wait(RESOURCE_SAMPLE_SECONDS):
+        for worker_id, process in processes:
+            if not process.is_alive():
+                continue
+            try:
+                root = psutil.Process(process.pid)
+                tree = [root] + root.children(recursive=True)
+                cpu = rss = 0.0
+                for proc in tree:
+                    # cpu_percent() needs the same Process object across samples
+                    proc = tracked.setdefault(proc.pid, proc)
+                    cpu += proc.cpu_percent(None)
+                    rss += proc.memory_info().rss
+            except psutil.Error:
+                continue
+            entry = usage.setdefault(worker_id, {"cpu_samples": [], "peak_rss_mb": 0.0})
+            entry["cpu_samples"].append(cpu)
+            entry["peak_rss_mb"] = max(entry["peak_rss_mb"], rss / 1024 / 1024)
+
+def summarize(reports: list, usage: dict, total_tests: int, started_at: float, bytes_sent: int = None) -> dict:
+    successful = sum(report["successful_tests"] for report in reports)
+    failed = sum(report["failed_tests"] for report in reports)
+    ready = [report["ready_at"] for report in reports if report["ready_at"]]
+    finished = [report["finished_at"] for report in reports if report["finished_at"]]
+    steady_seconds = (max(finished) - min(ready)) if ready and finished else 0
+
+    timings = RunTimings()
+    for report in reports:
+        timings.extend(report["stages"])
+
+    workers = []
+    for report in sorted(reports, key=lambda r: r["worker_id"]):
+        entry = usage.get(report["worker_id"], {})
+        cpu_samples = entry.get("cpu_samples", [])
+        workers.append({
+            "worker_id": report["worker_id"],
+            "tests": report["successful_tests"] + report["failed_tests"],
+            "context_recycles": report.get("recycles", 0),
+            "avg_cpu_percent": round(sum(cpu_samples) / len(cpu_samples), 1) if cpu_samples else None,
+            "cpu_seconds": round(sum(cpu_samples) * RESOURCE_SAMPLE_SECONDS / 100, 1) if cpu_samples else None,
+            "peak_rss_mb": round(entry["peak_rss_mb"], 1) if entry else None,
+            "error": report.get("error"),
+        })
+
+    return {
+        "total_tests": total_tests,
+        "successful_tests": successful,
+        "failed_tests": failed,
+        "wall_seconds": round(time.time() - started_at, 1),
+        "steady_seconds": round(steady_seconds, 1),
+        "tests_per_minute": round(successful / steady_seconds * 60, 2) if steady_seconds else 0,
+        "stages": timings.breakdown(),
+        "workers": workers,
+        "per_test": per_test_costs(workers, bytes_sent),
+    }
+
+def per_test_costs(workers: list, bytes_sent: int = None) -> dict:
+    """CPU seconds and KB transferred per test, and mean peak RSS per worker (None when not measured)."""
+    tests = sum(worker["tests"] for worker in workers)
+    cpu = [worker["cpu_seconds"] for worker in workers if worker["cpu_seconds"] is not None]
+    rss = [worker["peak_rss_mb"] for worker in workers if worker["peak_rss_mb"] is not None]
+    return {
+        "cpu_seconds": round(sum(cpu) / tests, 2) if cpu and tests else None,
+        "kb_transferred": round(bytes_sent / 1024 / tests, 1) if bytes_sent is not None and tests else None,
+        "peak_rss_mb_per_worker": round(sum(rss) / len(rss), 1) if rss else None,
+    }
+
+def print_summary(summary: dict) -> None:
+    print(f"\n{'=' * 80}")
+    print(f"📊 BENCHMARK RESULTS")
+    print(f"{'=' * 80}")
+    print(f"   Tests:            {summary['successful_tests']}/{summary['total_tests']} ok, "
+          f"{summary['failed_tests']} failed")
+    print(f"   Wall time:        {summary['wall_seconds']}s ({summary['steady_seconds']}s after pages ready)")
+    print(f"   Throughput:       {summary['tests_per_minute']} tests/min")
+    per_test = summary["per_test"]
+    if per_test["kb_transferred"] is not None:
+        print(f"   Transferred:      {per_test['kb_transferred']} KB/test")
+    if per_test["cpu_seconds"] is not None:
+        print(f"   CPU:              {per_test['cpu_seconds']} CPU-s/test")
+
+    print_latency_breakdown(summary["stages"])
+
+    print(f"\n🖥️  Per worker (process + browser):")
+    for worker in summary["workers"]:
+        cpu = f"{worker['avg_cpu_percent']}%" if worker["avg_cpu_percent"] is not None else "n/a"
+        rss = f"{worker['peak_rss_mb']} MB" if worker["peak_rss_mb"] is not None else "n/a"
+        line = (f"   W{worker['worker_id']}: {worker['tests']} tests, avg CPU {cpu}, peak RSS {rss}, "
+                f"{worker['context_recycles']} context recycle(s)")
+        if worker["error"]:
+            line += f" ❌ {worker['error']}"
+        print(line)
+    if psutil is None:
+        print(f"   (pip install psutil to record CPU/RSS)")
+
+def collect_reports(processes: list, result_queue) -> list:
+    """Wait for every worker's report, without hanging on a worker that died before reporting."""
+    reports = []
+    while len(reports) < len(processes):
+        try:
+            reports.append(result_queue.get(timeout=1))
+        except queue.Empty:
+            if not any(process.is_alive() for _, process in processes):
+                break
+    reported = {report["worker_id"] for report in reports}
+    for worker_id, process in processes:
+        if worker_id not in reported:
+            reports.append({
+                "worker_id": worker_id, "pid": process.pid, "ready_at": None, "finished_at": None,
+                "successful_tests": 0, "failed_tests": 0, "stages": {},
+                "error": f"worker exited with code {process.exitcode}",
+            })
+    return reports
+
+def run_benchmark(args) -> dict:
+    server = None
+    url = args.url
+    if not url:
+        server = MockChatServer(port=0, settings=mock_settings_from_args(args))
+        url = server.start()
+        print(f"🧪 Mock chat server on {url}")
+
+    # workflows.config reads CHATGPT_URL at import, and spawned workers import it
+    # (via this module) before benchmark_worker runs, so it must be in their environment
+    os.environ["CHATGPT_URL"] = url
+    # The mock's tracker stands in for the real third-party trackers the lean profile blocks
+    blocked = [host for host in os.getenv("BROWSER_BLOCKED_HOSTS", "").split(",") if host]
+    os.environ["BROWSER_BLOCKED_HOSTS"] = ",".join(sorted(set(blocked + [MOCK_TRACKER_HOST])))
+
+    personas = synthetic_personas(args.personas)
+    prompts = synthetic_prompts(args.prompts)
+    run_info, batches, workers = plan_run(
+        "benchmark", "benchmark", personas, prompts, "Example Brand", "https://example.com",
+        {
+            "workers": args.workers,
+            "response_timeout": args.response_timeout,
+            "capture": args.capture,
+            "persona_strategy": args.persona_strategy,
+            "max_attempts": args.max_attempts,
+            "browser_profile": args.browser_profile,
+            "recycle_after_tests": args.recycle_after_tests,
+            "max_browser_rss_mb": args.max_browser_rss_mb,
+        }
+    )
+
+    ctx = multiprocessing.get_context("spawn")
+    batch_queue = ctx.Queue()
+    result_queue = ctx.Queue()
+    for batch in batches:
+        batch_queue.put(batch)
+
+    started_at = time.time()
+    processes = []
+    for worker_id in range(1, workers + 1):
+        process = ctx.Process(
+            target=benchmark_worker,
+            args=(worker_id, workers, url, args.headless, args.verbose, batch_queue, result_queue, run_info),
+            name=f"geo-bench-{worker_id}",
+        )
+        process.start()
+        processes.append((worker_id, process))
+
+    usage = {}
+    stop_sampling = threading.Event()
+    sampler = None
+    if psutil is not None:
+        sampler = threading.Thread(target=sample_resources, args=(processes, usage, stop_sampling), daemon=True)
+        sampler.start()
+
+    print(f"\n🚀 Running {run_info['total_tests']} tests on {workers} worker process(es)...")
+    reports = collect_reports(processes, result_queue)
+    for _, process in processes:
+        process.join()
+
+    stop_sampling.set()
+    if sampler:
+        sampler.join()
+    bytes_sent = None
+    if server:
+        server.stop()
+        bytes_sent = server.bytes_sent
+
+    summary = summarize(reports, usage, run_info["total_tests"], started_at, bytes_sent=bytes_sent)
+    summary["config"] = {
+        "personas": args.personas,
+        "prompts": args.prompts,
+        "workers": workers,
+        "headless": args.headless,
+        "capture": args.capture,
+        "persona_strategy": args.persona_strategy,
+        "max_attempts": args.max_attempts,
+        "browser_profile": args.browser_profile,
+        "recycle_after_tests": args.recycle_after_tests,
+        "max_browser_rss_mb": args.max_browser_rss_mb,
+        "mock": mock_settings_from_args(args) if server else {"url": url},
+    }
+    return summary
+
+def compare_profiles(args) -> dict:
+    """Run the same benchmark with every browser profile, each against a fresh mock server."""
+    summaries = {}
+    for profile in BROWSER_PROFILES:
+        print(f"\n{'=' * 80}\n🧭 Browser profile: {profile}\n{'=' * 80}")
+        summaries[profile] = run_benchmark(argparse.Namespace(**{**vars(args), "browser_profile": profile}))
+        print_summary(summaries[profile])
+    return summaries
+
+def print_profile_comparison(summaries: dict) -> None:
+    """Per-test costs of each profile, with the change relative to the default profile."""
+    baseline = summaries["default"]["per_test"]
+    print(f"\n{'=' * 80}")
+    print(f"🧭 PROFILE COMPARISON (per test)")
+    print(f"{'=' * 80}")
+    print(f"   {'profile':<10}{'tests/min':>11}{'CPU-s':>10}{'peak RSS MB':>14}{'KB':>10}")
+    for profile, summary in summaries.items():
+        per_test = summary["per_test"]
+        cells = []
+        for key in ("cpu_seconds", "peak_rss_mb_per_worker", "kb_transferred"):
+            value, base = per_test[key], baseline[key]
+            if value is None:
+                cells.append("n/a")
+            elif profile == "default" or not base:
+                cells.append(f"{value:g}")
+            else:
+                cells.append(f"{value:g} ({(value - base) / base:+.0%})")
+        print(f"   {profile:<10}{summary['tests_per_minute']:>11}{cells[0]:>10}{cells[1]:>14}{cells[2]:>10}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure runner throughput against the offline mock chat server")
+    parser.add_argument("--personas", type=int, default=3, help="Synthetic personas (default: %(default)s)")
+    parser.add_argument("--prompts", type=int, default=5, help="Synthetic prompts per persona (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (default: %(default)s)")
+    parser.add_argument("--headless", action="store_true", help="Run the browsers headless")
+    parser.add_argument("--capture", choices=CAPTURE_MODES, default="dom",
+                        help="Answer capture mode, as in run_from_db.py (default: %(default)s)")
+    parser.add_argument("--persona-strategy", choices=PERSONA_STRATEGIES, default="memory",
+                        help="Persona strategy, as in run_from_db.py (default: %(default)s)")
+    parser.add_argument("--response-timeout", type=float, default=30,
+                        help="Seconds to wait for an answer to finish streaming (default: %(default)s)")
+    parser.add_argument("--max-attempts", type=int, default=1,
+                        help="Tries per test, as in run_from_db.py (default: %(default)s, so injected failures stay visible)")
+    parser.add_argument("--browser-profile", choices=BROWSER_PROFILES, default="default",
+                        help="Browser launch profile, as in run_from_db.py (default: %(default)s)")
+    parser.add_argument("--recycle-after-tests", type=int, default=DEFAULT_RUN_OPTIONS["recycle_after_tests"],
+                        help="Fresh context every N tests, as in run_from_db.py (default: %(default)s)")
+    parser.add_argument("--max-browser-rss-mb", type=int, default=DEFAULT_RUN_OPTIONS["max_browser_rss_mb"],
+                        help="Recycle above this browser RSS, as in run_from_db.py (default: %(default)s)")
+    parser.add_argument("--compare-profiles", action="store_true",
+                        help="Run once per browser profile and compare CPU, RSS and bandwidth per test")
+    parser.add_argument("--url", default=None, help="Use an already running mock server instead of starting one")
+    parser.add_argument("--verbose", action="store_true", help="Show the runner's per-test output")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    if args.compare_profiles:
+        summary = compare_profiles(args)
+        print_profile_comparison(summary)
+    else:
+        summary = run_benchmark(args)
+        print_summary(summary)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
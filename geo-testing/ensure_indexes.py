@@ -0,0 +1,29 @@
+"""
+Create the MongoDB indexes of the GEO collections and check the hot queries' plans.
+
+Usage:
+    python ensure_indexes.py           # create missing indexes (idempotent)
+    python ensure_indexes.py --check   # also explain the hot queries, exit 1 on a collection scan
+"""
+import argparse
+import sys
+from utils.database import Database
+from utils.indexes import check_query_plans, ensure_indexes, print_query_plans
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create MongoDB indexes and check query plans")
+    parser.add_argument("--check", action="store_true",
+                        help="Explain the hot queries and report collection scans / in-memory sorts")
+    args = parser.parse_args()
+
+    db = Database()
+    ready = ensure_indexes(db.db, db.results.name)
+    print(f"   Indexes: {len(ready)} ready")
+    exit_code = 0
+    if args.check:
+        report = check_query_plans(db.db, db.results.name)
+        print_query_plans(report)
+        if any(entry["problem"] == "COLLSCAN" for entry in report):
+            exit_code = 1
+    db.close()
+    sys.exit(exit_code)
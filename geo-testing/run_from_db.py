@@ -1,7 +1,11 @@
 """
 Run automated GEO testing with personas and prompts loaded from MongoDB.
 """
+import argparse
 import json
+import queue
+import random
+import threading
 import time
 import re
 from pathlib import Path
@@ -10,13 +14,56 @@ from pymongo import MongoClient
 from bson import ObjectId
 import os
 from dotenv import load_dotenv
-import sys
 from datetime import datetime
-from workflows.memory import clear_memory, set_persona
-from workflows.chat import send_prompt, extract_response
+from workflows.memory import clear_memory, clear_custom_instructions, set_persona, set_custom_instructions
+from workflows.chat import send_prompt, extract_response, start_new_chat
+from workflows.completion import wait_for_response_complete, RESPONSE_TIMEOUT_MS
+from workflows.login import is_logged_in, login_to_chatgpt
+from utils.session_pool import ACCOUNTS_FILE, SessionPool, last_persona_strategy, record_persona_strategy
+from workflows.network_capture import ConversationCapture
+from utils.scheduler import plan_persona_major, count_tasks, skip_completed
+from utils.timing import RunTimings, StageTimer, print_latency_breakdown
+from utils.memory_guard import JS_HEAP_SCRIPT, MIN_TESTS_BEFORE_RSS_RECYCLE, BrowserMemoryProbe, heap_mb
+from utils.browser_profile import BROWSER_PROFILES, context_options, launch_options
+from utils.rate_limit import AccountDispatcher, print_dispatch_stats
+from utils.result_writer import DEFAULT_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL_S, DEFAULT_WRITE_CONCERN, ResultWriter, parse_write_concern
+from utils.indexes import ensure_indexes
+from utils.run_summary import failure_entry, new_test_run_id
+from utils.task_queue import DEFAULT_LEASE_S, TaskQueue
+from utils.retry import DEFAULT_RETRY_POLICY, CircuitBreaker, backoff_delay, bounded_stage, build_retry_policy
+from workflows.config import CHATGPT_URL
 
 load_dotenv()
 
+CAPTURE_MODES = ("dom", "network")
+
+# memory: clear memory + "Save this to memory" chat per persona (original behaviour)
+# inline: persona prefixed to every prompt in the same turn, no per-persona setup
+# custom_instructions: persona saved once per persona as ChatGPT custom instructions
+PERSONA_STRATEGIES = ("memory", "inline", "custom_instructions")
+
+# Per-run options accepted by the CLI, the engines and the runner daemon
+DEFAULT_RUN_OPTIONS = {
+    "workers": 1,
+    "response_timeout": RESPONSE_TIMEOUT_MS / 1000,
+    "shuffle_prompts": False,
+    "seed": None,
+    "capture": "dom",
+    "persona_strategy": "memory",
+    "resume": None,  # test_run_id of an interrupted run to finish
+    "test_run_id": None,  # ID of a new run (default: run_<UTC timestamp>_<random hex>), e.g. assigned by the job queue
+    "distributed": False,  # Lease tests from run_tasks so runners on several hosts share the run
+    "max_attempts": DEFAULT_RETRY_POLICY["test_attempts"],
+    "browser_profile": "default",  # lean: headless, no images/fonts/trackers (see utils/browser_profile.py)
+    "recycle_after_tests": 25,     # Fresh context every N tests (0: never)
+    "max_browser_rss_mb": 2048,    # Fresh context once the browser's RSS passes this (0: no limit)
+    "tabs": 1,                     # Pipelined chats per worker context (async engine only)
+    # Results are buffered and written in batches (see utils/result_writer.py)
+    "write_batch_size": DEFAULT_BATCH_SIZE,
+    "write_flush_interval": DEFAULT_FLUSH_INTERVAL_S,
+    "write_concern": DEFAULT_WRITE_CONCERN,
+}
+
 def extract_brand_name(website_title: str, website_url: str) -> list:
     """
     Extract brand name from website title or URL for accurate brand detection.
@@ -59,22 +106,644 @@ def extract_brand_name(website_title: str, website_url: str) -> list:
     
     return unique_keywords
 
-def run_geo_tests_from_db(persona_set_id: str, prompts_id: str):
-    """Run GEO tests with personas and prompts from MongoDB"""
+def build_persona_memory_text(persona: dict) -> str:
+    """Build the first-person persona description that gets saved to ChatGPT memory."""
+    return (
+        f"My name is {persona['name']}. I am {persona['age']} and work as a {persona['occupation']} "
+        f"in {persona['location']}. My main goals are: {', '.join(persona['goals'])}. "
+        f"My pain points include: {', '.join(persona['painPoints'])}. "
+        f"I typically {persona['behavior'].lower()}."
+    )
 
-    print("=" * 80)
-    print("🚀 RUNNING GEO TEST AUTOMATION FROM MONGODB")
-    print("=" * 80)
+def build_inline_prompt(persona: dict, prompt_text: str) -> str:
+    """Prefix a prompt with the persona so it travels in the same turn (inline strategy)."""
+    return f"For context, here is some information about me: {build_persona_memory_text(persona)}\n\n{prompt_text}"
 
-    # Initialize database
+def build_result_doc(task: dict, run_info: dict, response: dict, log=print, extra: dict = None) -> dict:
+    """
+    Check the response for brand mentions and build its test_results document.
+
+    Any `extra` fields (e.g. measured latencies) are merged into the document.
+    """
+    log(f"✅ Response received!")
+    log(f"   Length: {len(response['text'])} characters")
+    log(f"   Citations: {len(response['citations'])}")
+    
+    # FIXED: Check if brand mentioned using smart brand extraction
+    brand_keywords = run_info['brand_keywords']
+    response_text_lower = response['text'].lower()
+    brand_mentioned = any(keyword in response_text_lower for keyword in brand_keywords)
+    
+    # Debug: Show what we're checking for
+    log(f"   🔍 Checking for brand keywords: {brand_keywords[:2]}...")  # Show first 2
+    if brand_mentioned:
+        log(f"   ✅ BRAND MENTIONED in response!")
+    else:
+        log(f"   ⚠️ Brand NOT mentioned in response")
+    
+    test_result_doc = {
+        "persona_set_id": run_info['persona_set_id'],
+        "persona_id": task['persona_idx'],
+        "persona_details": task['persona'],
+        "prompts_id": run_info['prompts_id'],
+        "prompt_id": task['prompt_idx'],
+        "prompt_details": task['prompt'],
+        "website_url": run_info['website_url'],
+        "website_title": run_info['website_title'],
+        "response_text": response['text'],
+        "citations": response['citations'],
+        "has_citations": response['has_citations'],
+        "extraction_source": response.get('source', 'dom'),
+        "persona_strategy": run_info.get('persona_strategy', 'memory'),
+        "brand_mentioned": brand_mentioned,
+        "test_run_id": run_info['test_run_id'],
+        "test_number": task['test_number'],
+        "total_tests_in_run": run_info['total_tests'],
+        "timestamp": datetime.utcnow()
+    }
+    if response.get('sources'):
+        test_result_doc["search_sources"] = response['sources']
+    test_result_doc.update(extra or {})
+    return test_result_doc
+
+def make_logger(worker_id: int, workers: int, tab: int = None):
+    """Return a print function that tags output with the worker ID (and tab) when running in parallel."""
+    if workers <= 1 and tab is None:
+        return print
+
+    prefix = f"[W{worker_id}.T{tab}]" if tab is not None else f"[W{worker_id}]"
+
+    def log(*args, **kwargs):
+        print(prefix, *args, **kwargs, flush=True)
+
+    return log
+
+def new_runner_context(browser, storage_state: str = None, profile: str = "default"):
+    """Create an isolated context (restored from `storage_state` if given) and page."""
+    context = browser.new_context(
+        storage_state=storage_state,
+        viewport={"width": 1280, "height": 720},
+        permissions=["geolocation"],
+        **context_options(profile)
+    )
+    return context, context.new_page()
+
+def launch_runner_browser(playwright, storage_state: str = None, headless: bool = False,
+                          profile: str = "default"):
+    """Launch Chromium with an isolated context (restored from `storage_state` if given) and page."""
+    browser = playwright.chromium.launch(**launch_options(profile, headless=headless))
+
+    context, page = new_runner_context(browser, storage_state=storage_state, profile=profile)
+    return browser, context, page
+
+def start_session(context, page, session: dict, session_pool: SessionPool, log=print) -> bool:
+    """
+    Open ChatGPT with a pooled storage state, falling back to a credential login.
+
+    A fallback login is saved back to the pool so the next runner skips it.
+    """
+    if session['storage_state']:
+        page.goto(CHATGPT_URL)
+        if is_logged_in(page):
+            log(f"✅ Session restored from {session['storage_state']}")
+            return True
+        log(f"🔑 Saved session was rejected, logging in with credentials...")
+        session_pool.mark_invalid(session['path'])
+
+    account = session['account']
+    if not login_to_chatgpt(page, account['email'], account['password'], log=log):
+        return False
+    session_pool.save(context, session['path'])
+    log(f"💾 Session saved to pool: {session['path']}")
+    return True
+
+def reset_persona_state(page, strategy: str, account: str = None, log=print, timer: StageTimer = None,
+                        policy: dict = None) -> None:
+    """
+    Clear what other persona strategies leave on the account, once per slot
+    before its first persona: memory (inline and custom_instructions never
+    clear it), and custom instructions when the account was last run with
+    the custom_instructions strategy (see session_pool.last_persona_strategy).
+    Both outlive the run that set them and would colour every answer of this one.
+
+    A failed step is logged and not retried by this run; custom instructions
+    that could not be cleared stay recorded, so the next run tries again.
+    """
+    timer = timer or StageTimer()
+    policy = policy or DEFAULT_RETRY_POLICY
+    previous = last_persona_strategy(account) if account else None
+
+    # The memory strategy clears memory before every persona anyway
+    if strategy != "memory":
+        log(f"🧹 Clearing ChatGPT memory left by earlier runs...")
+        with bounded_stage(page, timer, "clear_memory", policy):
+            try:
+                clear_memory(page)
+                time.sleep(2)
+                log(f"   ✅ Memory cleared successfully!")
+            except Exception as e:
+                log(f"   ⚠️ Could not clear memory: {e}")
+
+    # The custom_instructions strategy overwrites them for every persona
+    if strategy != "custom_instructions" and previous == "custom_instructions":
+        log(f"🧹 Clearing custom instructions left by earlier runs...")
+        with bounded_stage(page, timer, "set_persona", policy):
+            try:
+                clear_custom_instructions(page)
+                log(f"   ✅ Custom instructions cleared!")
+            except Exception as e:
+                log(f"   ⚠️ Could not clear custom instructions: {e}")
+                return
+
+    if account:
+        record_persona_strategy(account, strategy)
+
+def setup_persona(page, persona: dict, log=print, timer: StageTimer = None,
+                  strategy: str = "memory", policy: dict = None) -> bool:
+    """
+    Prepare the page for a persona according to the run's persona strategy.
+
+    memory and custom_instructions leave the page on a fresh chat; inline needs
+    no setup because the persona is sent with every prompt.
+
+    Returns False when a step failed (the caller decides whether to retry).
+    """
+    timer = timer or StageTimer()
+    policy = policy or DEFAULT_RETRY_POLICY
+
+    if strategy == "inline":
+        return True
+
+    if strategy == "custom_instructions":
+        log(f"👤 Setting persona as custom instructions: {persona['name']}...")
+        with bounded_stage(page, timer, "set_persona", policy):
+            try:
+                set_custom_instructions(page, build_persona_memory_text(persona))
+                log(f"   ✅ Persona set!")
+                return True
+            except Exception as e:
+                log(f"   ⚠️ Could not set persona: {e}")
+                return False
+
+    ok = True
+
+    # 1. CLEAR MEMORY (start fresh for each persona)
+    log(f"🧹 Clearing ChatGPT memory...")
+    with bounded_stage(page, timer, "clear_memory", policy):
+        try:
+            clear_memory(page)
+            time.sleep(2)
+            log(f"   ✅ Memory cleared successfully!")
+        except Exception as e:
+            log(f"   ❌ FAILED to clear memory: {e}")
+            log(f"   ⚠️ WARNING: Previous persona may leak into this test!")
+            ok = False
+
+    # 2. SET PERSONA (using workflow function)
+    persona_memory_text = build_persona_memory_text(persona)
+    log(f"👤 Setting persona: {persona['name']}...")
+    with bounded_stage(page, timer, "set_persona", policy):
+        try:
+            set_persona(page, persona_memory_text)
+            time.sleep(3)
+            log(f"   ✅ Persona set!")
+        except Exception as e:
+            log(f"   ⚠️ Could not set persona: {e}")
+            ok = False
+
+    return ok
+
+def run_single_test(page, task: dict, run_info: dict, results_collection, log=print,
+                    new_chat: bool = False, capture: ConversationCapture = None,
+                    timer: StageTimer = None, attempt: int = 1) -> bool:
+    """
+    Run one prompt on a logged-in page whose persona is already set up.
+
+    Pass new_chat=True when the page still holds an earlier prompt's conversation, and
+    a ConversationCapture to read the answer from the network stream. Stage durations
+    are added to `timer` and saved as the result's `timings`.
+
+    Returns True when the result was extracted and saved to MongoDB.
+    """
+    timer = timer or StageTimer()
+    policy = run_info['retry_policy']
+    persona = task['persona']
+    prompt = task['prompt']
+
+    log(f"\n{'─' * 80}")
+    retry_note = f" (attempt {attempt}/{policy['test_attempts']})" if attempt > 1 else ""
+    log(f"👤 TEST {task['test_number']}/{run_info['total_tests']}: {persona['name']} ({persona['location']}){retry_note}")
+    log(f"📝 Prompt {task['prompt_idx']}: {prompt['prompt']}")
+    log(f"{'─' * 80}")
+
+    if new_chat:
+        try:
+            with bounded_stage(page, timer, "new_chat", policy):
+                start_new_chat(page)
+        except Exception as e:
+            log(f"   ❌ Could not open a new chat: {e}")
+            return False
+
+    # 3. SEND PROMPT (using workflow function)
+    log(f"📤 Sending prompt: {prompt['prompt']}")
+    prompt_text = prompt["prompt"]
+    if run_info.get('persona_strategy') == "inline":
+        prompt_text = build_inline_prompt(persona, prompt_text)
+    try:
+        if capture is not None:
+            capture.reset()
+        with bounded_stage(page, timer, "send", policy):
+            send_prompt(page, prompt_text)
+        sent_at = time.monotonic()
+    except Exception as e:
+        log(f"   ❌ Could not send prompt: {e}")
+        return False
+
+    # 4. WAIT FOR THE ANSWER TO FINISH STREAMING
+    log(f"⏳ Waiting for ChatGPT response...")
+    try:
+        with timer.span("wait"):
+            wait_for_response_complete(page, turn_number=2, timeout_ms=run_info['response_timeout_ms'])
+    except Exception as e:
+        log(f"   ❌ Response still streaming after {run_info['response_timeout_ms'] / 1000:.0f}s: {e}")
+        return False
+    completion_latency = time.monotonic() - sent_at
+    log(f"   ⏱️ Response complete after {completion_latency:.1f}s")
+
+    # 5. EXTRACT RESPONSE
+    try:
+        with bounded_stage(page, timer, "extract", policy):
+            response = extract_response(page, turn_number=2, wait_for_completion=False, capture=capture)
+        test_result_doc = build_result_doc(
+            task, run_info, response, log=log,
+            extra={
+                "completion_latency_ms": round(completion_latency * 1000),
+                "prompt_position": task['prompt_position'],
+                "attempts": attempt,
+                "timings": timer.to_doc(),
+            }
+        )
+        
+        # 6. SAVE TO MONGODB (buffered by the run's ResultWriter, the batch is written in the background)
+        with timer.span("save"):
+            result = results_collection.insert_one(test_result_doc)
+        log(f"   💾 Queued for MongoDB: {result.inserted_id}")
+        return True
+            
+    except Exception as e:
+        log(f"   ❌ Error extracting response: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def open_slot(page, run_info: dict, reopen=None, account: str = None,
+              probe: BrowserMemoryProbe = None, worker_id: int = 1) -> dict:
+    """
+    Everything a worker needs to drive one page: the page, its network capture
+    (for --capture network), a count of consecutive failed attempts, an
+    optional `reopen()` that replaces the context with a fresh logged-in page,
+    the name of the account the page is logged in as (for rate limiting), and
+    a memory probe of its browser with the tests run on the current context.
+    """
+    return {
+        "page": page,
+        "capture": ConversationCapture(page) if run_info['capture_mode'] == "network" else None,
+        "failures": 0,
+        "reopen": reopen,
+        "account": account,
+        "probe": probe,
+        "worker_id": worker_id,
+        "tests": 0,
+        "recycles": 0,
+    }
+
+def recycle_slot(slot: dict, run_info: dict, reason: str, log=print) -> None:
+    """Replace the slot's context/page with a fresh one (keeps the old page if reopening fails)."""
+    slot['failures'] = 0
+    slot['tests'] = 0
+    if slot['reopen'] is None:
+        return
+    log(f"♻️ {reason}, recycling the browser context...")
+    try:
+        page = slot['reopen']()
+    except Exception as e:
+        log(f"   ⚠️ Could not recycle the context: {e}")
+        return
+    if page is None:
+        log(f"   ⚠️ Could not log the new context in, keeping the old page")
+        return
+    slot.update(open_slot(page, run_info, reopen=slot['reopen'], account=slot['account'],
+                          probe=slot['probe'], worker_id=slot['worker_id']), recycles=slot['recycles'] + 1)
+    log(f"   ✅ Fresh context ready")
+
+def record_memory(stats: dict, slot: dict, rss: float, heap: float, log=print) -> None:
+    """Log a worker's browser memory and keep its peak (and context recycles) for the run summary."""
+    entry = stats['memory'].setdefault(slot['worker_id'], {"peak_rss_mb": 0.0, "last_rss_mb": None})
+    entry['recycles'] = slot['recycles']
+    if rss is None and heap is None:
+        return
+    if rss is not None:
+        entry['peak_rss_mb'] = max(entry['peak_rss_mb'], rss)
+        entry['last_rss_mb'] = rss
+    log(f"🧠 Memory: browser RSS {rss if rss is not None else 'n/a'} MB, "
+        f"JS heap {heap if heap is not None else 'n/a'} MB, {slot['tests']} test(s) on this context")
+
+def memory_recycle_reason(slot: dict, run_info: dict, rss: float):
+    """Why the slot's context should be recycled now, or None."""
+    guard = run_info['memory_guard']
+    if guard['recycle_after_tests'] and slot['tests'] >= guard['recycle_after_tests']:
+        return f"{slot['tests']} tests on this context"
+    if (guard['max_browser_rss_mb'] and rss is not None and rss > guard['max_browser_rss_mb']
+            and slot['tests'] >= MIN_TESTS_BEFORE_RSS_RECYCLE):
+        return f"Browser RSS {rss:.0f} MB is over {guard['max_browser_rss_mb']} MB"
+    return None
+
+def guard_memory(slot: dict, run_info: dict, stats: dict, log=print) -> None:
+    """After each test: log the browser's memory and recycle a context that ran too long or grew too big."""
+    slot['tests'] += 1
+    rss = slot['probe'].rss_mb() if slot['probe'] else None
+    try:
+        heap = heap_mb(slot['page'].evaluate(JS_HEAP_SCRIPT))
+    except Exception:
+        heap = None
+    record_memory(stats, slot, rss, heap, log=log)
+
+    reason = memory_recycle_reason(slot, run_info, rss)
+    if reason:
+        recycle_slot(slot, run_info, reason, log=log)
+        stats['memory'][slot['worker_id']]['recycles'] = slot['recycles']
+
+def wait_for_breaker(breaker: CircuitBreaker, log=print) -> None:
+    """Block while the run's circuit breaker is open."""
+    pause = breaker.remaining_pause()
+    if pause > 0:
+        log(f"⏸️ Circuit breaker open, waiting {pause:.0f}s before the next test...")
+        time.sleep(pause)
+
+def reserve_send(stats: dict, slot: dict, log=print) -> float:
+    """Take a token from the slot's account bucket; returns the seconds to wait before sending."""
+    dispatcher = stats.get('dispatcher')
+    if dispatcher is None or slot['account'] is None:
+        return 0.0
+    delay = dispatcher.reserve(slot['account'])
+    if delay > 0:
+        log(f"🚦 Account {slot['account']} is at its rate limit, waiting {delay:.0f}s...")
+    return delay
+
+def record_attempt(stats: dict, slot: dict, succeeded: bool, log=print) -> None:
+    """Feed an attempt's outcome to the circuit breaker and the account's dispatch stats."""
+    if stats.get('dispatcher') is not None and slot['account'] is not None:
+        stats['dispatcher'].record(slot['account'], succeeded)
+    cooldown = stats['breaker'].record(succeeded)
+    if cooldown:
+        log(f"🛑 Failure rate spiked, pausing every worker for {cooldown:.0f}s")
+
+def run_test_with_retries(slot: dict, task: dict, run_info: dict, results_collection, stats: dict,
+                          log=print, new_chat: bool = False, timer: StageTimer = None) -> bool:
+    """
+    Run one test under the run's retry policy: failed attempts are retried in a
+    fresh chat after a jittered backoff, the context is recycled after repeated
+    consecutive failures, and attempts wait while the circuit breaker is open
+    or the slot's account is out of rate-limit tokens.
+    """
+    policy = run_info['retry_policy']
+    timer = timer or StageTimer()
+
+    for attempt in range(1, policy['test_attempts'] + 1):
+        wait_for_breaker(stats['breaker'], log=log)
+        with timer.span("throttle"):
+            time.sleep(reserve_send(stats, slot, log=log))
+        succeeded = run_single_test(slot['page'], task, run_info, results_collection, log=log,
+                                    new_chat=new_chat or attempt > 1, capture=slot['capture'],
+                                    timer=timer, attempt=attempt)
+        record_attempt(stats, slot, succeeded, log=log)
+        if succeeded:
+            slot['failures'] = 0
+            return True
+
+        slot['failures'] += 1
+        if slot['failures'] >= policy['recycle_after_failures']:
+            recycle_slot(slot, run_info, f"{slot['failures']} failures in a row", log=log)
+
+        if attempt < policy['test_attempts']:
+            delay = backoff_delay(attempt, policy)
+            log(f"   🔁 Retrying in {delay:.1f}s...")
+            with timer.span("backoff"):
+                time.sleep(delay)
+
+    log(f"   ❌ Giving up on test {task['test_number']} after {policy['test_attempts']} attempts")
+    return False
+
+def run_persona_batch(slot: dict, batch: dict, run_info: dict, results_collection, stats: dict,
+                      stats_lock: threading.Lock, log=print) -> None:
+    """
+    Set a persona up once, then run each of its prompts in a fresh chat.
+    Leased batches (utils/task_queue.py) are told as each test finishes.
+    """
+    log(f"\n{'=' * 80}")
+    log(f"👤 PERSONA {batch['persona_idx']}: {batch['persona']['name']} ({len(batch['tasks'])} prompts)")
+    log(f"{'=' * 80}")
+
+    policy = run_info['retry_policy']
+    strategy = run_info['persona_strategy']
+    setup_timer = StageTimer()
+    # Once per slot (the account's state survives context recycling)
+    if not slot.get('persona_state_reset'):
+        reset_persona_state(slot['page'], strategy, account=slot['account'], log=log, timer=setup_timer,
+                            policy=policy)
+        slot['persona_state_reset'] = True
+    for attempt in range(1, policy['setup_attempts'] + 1):
+        if setup_persona(slot['page'], batch['persona'], log=log, timer=setup_timer,
+                         strategy=strategy, policy=policy):
+            break
+        if attempt < policy['setup_attempts']:
+            delay = backoff_delay(attempt, policy)
+            log(f"   🔁 Persona setup failed, retrying in {delay:.1f}s...")
+            with setup_timer.span("backoff"):
+                time.sleep(delay)
+    else:
+        log(f"   ⚠️ Persona setup kept failing, running its prompts anyway")
+
+    # Persona setup leaves the page on a fresh chat, so only later prompts need a new one
+    # (inline has no setup step, so every prompt opens its own chat)
+    for position, task in enumerate(batch['tasks']):
+        # Persona setup is charged to the persona's first test
+        timer = setup_timer if position == 0 else StageTimer()
+        succeeded = run_test_with_retries(slot, task, run_info, results_collection, stats, log=log,
+                                          new_chat=position > 0 or strategy == "inline", timer=timer)
+        stats['timings'].record(timer)
+        with stats_lock:
+            if succeeded:
+                stats['successful_tests'] += 1
+            else:
+                stats['failed_tests'] += 1
+        if not succeeded:
+            results_collection.record_failure(failure_entry(task, run_info))
+        if batch.get('on_task_done'):
+            batch['on_task_done'](task, succeeded)
+        guard_memory(slot, run_info, stats, log=log)
+
+def run_worker(worker_id: int, workers: int, batch_queue: queue.Queue, run_info: dict,
+               results_collection, stats: dict, stats_lock: threading.Lock,
+               session_pool: SessionPool) -> None:
+    """
+    Drive one isolated browser session, pulling persona batches off the shared queue until it is empty.
+
+    Each worker owns its own Playwright instance, browser and context, so workers
+    never share pages and can run in separate threads.
+    """
+    log = make_logger(worker_id, workers)
+
+    # Spread workers across the pool's accounts; each account is metered by its own bucket
+    account_name = stats['dispatcher'].assign() if stats.get('dispatcher') else None
+
+    # Check out a session before starting Playwright: a refresh launches its own browser
+    session = session_pool.checkout(account_name)
+    log(f"👥 Account: {session['account']['name']}")
+
+    log(f"\n🚀 Launching browser...")
+    playwright = sync_playwright().start()
+    browser, context, page = launch_runner_browser(playwright, storage_state=session['storage_state'],
+                                                   profile=run_info['browser_profile'])
+    contexts = [context]
+
+    def reopen():
+        # Reuse the saved state directly: checkout() could launch a second Playwright in this thread
+        storage_state = session['path'] if os.path.exists(session['path']) else None
+        context, page = new_runner_context(browser, storage_state=storage_state, profile=run_info['browser_profile'])
+        session['storage_state'] = storage_state
+        if not start_session(context, page, session, session_pool, log=log):
+            context.close()
+            return None
+        # Only drop the old context once the new one is logged in
+        contexts.pop().close()
+        contexts.append(context)
+        return page
+
+    try:
+        # LOGIN TO CHATGPT (only when the pooled session is missing or rejected)
+        log(f"🔐 Opening ChatGPT session...")
+        if not start_session(context, page, session, session_pool, log=log):
+            log(f"❌ Worker {worker_id} could not log in; leaving its tests to other workers.")
+            return
+
+        slot = open_slot(page, run_info, reopen=reopen, account=session['account']['name'],
+                         probe=BrowserMemoryProbe(browser), worker_id=worker_id)
+
+        while True:
+            try:
+                batch = batch_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            run_persona_batch(slot, batch, run_info, results_collection, stats, stats_lock, log=log)
+            batch_queue.task_done()
+
+    finally:
+        # Clean up browser
+        log(f"\n🔒 Closing browser...")
+        contexts[-1].close()
+        browser.close()
+        playwright.stop()
+
+def connect_to_mongo():
+    """Open the MongoDB client and database configured in .env."""
     mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
     db_name = os.getenv("MONGODB_DATABASE", "geo_sundai")
     
     mongo_client = MongoClient(mongo_uri)
     db = mongo_client[db_name]
+    # Idempotent: only missing indexes are built
+    try:
+        ensure_indexes(db)
+    except Exception as e:
+        # e.g. a read-only user: queries still work, just slower
+        print(f"⚠️ Could not ensure MongoDB indexes: {e}")
+    return mongo_client, db
+
+def resolve_run_options(overrides: dict = None) -> dict:
+    """Merge caller overrides into DEFAULT_RUN_OPTIONS, rejecting unknown or invalid options."""
+    options = dict(DEFAULT_RUN_OPTIONS)
+    for key, value in (overrides or {}).items():
+        if key not in DEFAULT_RUN_OPTIONS:
+            raise ValueError(f"Unknown run option: {key}")
+        if value is not None:
+            options[key] = value
+
+    if options['capture'] not in CAPTURE_MODES:
+        raise ValueError(f"capture must be one of {CAPTURE_MODES}")
+    if options['persona_strategy'] not in PERSONA_STRATEGIES:
+        raise ValueError(f"persona_strategy must be one of {PERSONA_STRATEGIES}")
+    if options['browser_profile'] not in BROWSER_PROFILES:
+        raise ValueError(f"browser_profile must be one of {BROWSER_PROFILES}")
+    if options['resume'] and options['test_run_id'] and options['resume'] != options['test_run_id']:
+        raise ValueError("resume keeps the interrupted run's ID; don't pass another test_run_id")
+    options['distributed'] = bool(options['distributed'])
+    if options['distributed'] and not (options['resume'] or options['test_run_id']):
+        raise ValueError("a distributed run needs a test_run_id (or resume) that every host shares")
+    options['workers'] = int(options['workers'])
+    options['response_timeout'] = float(options['response_timeout'])
+    options['shuffle_prompts'] = bool(options['shuffle_prompts'])
+    options['max_attempts'] = max(1, int(options['max_attempts']))
+    options['recycle_after_tests'] = max(0, int(options['recycle_after_tests']))
+    options['max_browser_rss_mb'] = max(0, int(options['max_browser_rss_mb']))
+    options['tabs'] = max(1, int(options['tabs']))
+    options['write_batch_size'] = max(1, int(options['write_batch_size']))
+    options['write_flush_interval'] = float(options['write_flush_interval'])
+    options['write_concern'] = str(options['write_concern'])
+    parse_write_concern(options['write_concern'])
+    return options
+
+def find_completed_tests(db, test_run_id: str):
+    """
+    Look up what an earlier run already saved, for resuming it.
+
+    Returns (persona_set_id, prompts_id, {(persona_id, prompt_id), ...}), or None
+    when the run has no results. Only successful tests are saved, so every pair
+    found is done.
+    """
+    persona_set_id = prompts_id = None
+    completed = set()
+    saved = db['test_results'].find(
+        {'test_run_id': test_run_id},
+        {'persona_set_id': 1, 'prompts_id': 1, 'persona_id': 1, 'prompt_id': 1}
+    )
+    for result in saved:
+        persona_set_id = result['persona_set_id']
+        prompts_id = result['prompts_id']
+        completed.add((result['persona_id'], result['prompt_id']))
+
+    if persona_set_id is None:
+        return None
+    return persona_set_id, prompts_id, completed
+
+def prepare_run(db, persona_set_id: str, prompts_id: str, options: dict = None):
+    """
+    Load personas and prompts from MongoDB, print the test plan and build the
+    persona-major schedule.
+
+    With options['resume'] set to an earlier test_run_id, the run keeps that ID
+    and only schedules the (persona, prompt) pairs that have no saved result;
+    persona_set_id and prompts_id may then be None (taken from the saved results).
+
+    Returns (run_info, batches, workers), or None when the test data is missing.
+    """
+    options = resolve_run_options(options)
+
+    completed = set()
+    if options['resume']:
+        found = find_completed_tests(db, options['resume'])
+        if not found:
+            print(f"❌ No saved results for {options['resume']}, nothing to resume.")
+            return None
+        run_persona_set_id, run_prompts_id, completed = found
+        if persona_set_id not in (None, run_persona_set_id) or prompts_id not in (None, run_prompts_id):
+            print(f"❌ {options['resume']} ran persona set {run_persona_set_id} with prompts {run_prompts_id}.")
+            return None
+        persona_set_id, prompts_id = run_persona_set_id, run_prompts_id
+
     personas_collection = db['personas']
     prompts_collection = db['prompts']
-    results_collection = db['test_results']
 
     # Load personas and prompts from MongoDB
     print("\n📂 Loading test data from MongoDB...")
@@ -83,10 +752,10 @@ def run_geo_tests_from_db(persona_set_id: str, prompts_id: str):
 
     if not persona_set:
         print(f"❌ Persona set with ID {persona_set_id} not found.")
-        return
+        return None
     if not prompts_doc:
         print(f"❌ Prompts with ID {prompts_id} not found.")
-        return
+        return None
 
     personas = persona_set['personas']
     prompts = prompts_doc['prompts']
@@ -96,255 +765,395 @@ def run_geo_tests_from_db(persona_set_id: str, prompts_id: str):
     print(f"   ✓ Loaded {len(personas)} personas for {website_title}")
     print(f"   ✓ Loaded {len(prompts)} prompts")
 
+    run_info, batches, workers = plan_run(persona_set_id, prompts_id, personas, prompts,
+                                          website_title, website_url, options)
+
+    if options['resume']:
+        batches = skip_completed(batches, completed)
+        run_info['completed_before_resume'] = run_info['total_tests'] - count_tasks(batches)
+        workers = max(1, min(workers, len(batches)))
+        print(f"\n⏯️  Resuming {run_info['test_run_id']}: {run_info['completed_before_resume']} of "
+              f"{run_info['total_tests']} tests already saved, {count_tasks(batches)} left")
+
+    return run_info, batches, workers
+
+def plan_run(persona_set_id: str, prompts_id: str, personas: list, prompts: list,
+             website_title: str, website_url: str, options: dict = None):
+    """
+    Print the test plan for loaded personas and prompts and build the
+    persona-major schedule.
+
+    Returns (run_info, batches, workers).
+    """
+    options = resolve_run_options(options)
+    workers = options['workers']
+    seed = options['seed']
+    shuffle_prompts = options['shuffle_prompts']
+
+    total_tests = len(personas) * len(prompts)
+    # Work is handed out one persona at a time
+    workers = max(1, min(workers, len(personas)))
+    if shuffle_prompts and seed is None:
+        seed = random.randrange(2**31)
+
     print(f"\n📊 Test Plan:")
     print(f"   Website: {website_title} ({website_url})")
     print(f"   Personas: {len(personas)}")
     print(f"   Prompts: {len(prompts)}")
-    print(f"   Total Tests: {len(personas) * len(prompts)}")
-    print(f"\n🚀 Starting tests...")
+    print(f"   Total Tests: {total_tests}")
+    print(f"   Workers: {workers}" + (f" × {options['tabs']} pipelined tabs" if options['tabs'] > 1 else ""))
+    print(f"   Schedule: persona-major" + (f", shuffled prompts (seed {seed})" if shuffle_prompts else ""))
+    print(f"   Answer capture: {options['capture']}")
+    print(f"   Persona strategy: {options['persona_strategy']}")
+    print(f"   Attempts per test: {options['max_attempts']}")
+    print(f"   Browser profile: {options['browser_profile']}")
+    recycling = []
+    if options['recycle_after_tests']:
+        recycling.append(f"every {options['recycle_after_tests']} tests")
+    if options['max_browser_rss_mb']:
+        recycling.append(f"above {options['max_browser_rss_mb']} MB browser RSS")
+    print(f"   Context recycling: {', '.join(recycling) or 'off'}")
+    print(f"   Result writes: batches of {options['write_batch_size']}, every {options['write_flush_interval']:g}s, "
+          f"w={options['write_concern']}")
+    if options['distributed']:
+        print(f"   Work queue: run_tasks, shared with other hosts ({DEFAULT_LEASE_S:g}s leases)")
 
-    # Track results
-    test_count = 0
-    total_tests = len(personas) * len(prompts)
-    test_run_id = f"run_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
-    
-    # Track success/failure
-    successful_tests = 0
-    failed_tests = 0
+    run_info = {
+        "persona_set_id": persona_set_id,
+        "prompts_id": prompts_id,
+        "website_url": website_url,
+        "website_title": website_title,
+        "brand_keywords": extract_brand_name(website_title, website_url),
+        "test_run_id": options['resume'] or options['test_run_id'] or new_test_run_id(),
+        "total_tests": total_tests,
+        "response_timeout_ms": int(options['response_timeout'] * 1000),
+        "shuffle_seed": seed if shuffle_prompts else None,
+        "capture_mode": options['capture'],
+        "persona_strategy": options['persona_strategy'],
+        "retry_policy": build_retry_policy(options['max_attempts']),
+        "browser_profile": options['browser_profile'],
+        "tabs": options['tabs'],
+        "distributed": options['distributed'],
+        "result_writer": {
+            "batch_size": options['write_batch_size'],
+            "flush_interval_s": options['write_flush_interval'],
+            "write_concern": options['write_concern'],
+        },
+        "memory_guard": {
+            "recycle_after_tests": options['recycle_after_tests'],
+            "max_browser_rss_mb": options['max_browser_rss_mb'],
+        },
+        "options": {**options, "workers": workers, "seed": seed},
+    }
 
-    # Launch browser ONCE and reuse for all tests
-    print(f"\n🚀 Launching browser...")
-    playwright = sync_playwright().start()
+    # Each persona is set up once and then runs all of its prompts
+    batches = plan_persona_major(personas, prompts, shuffle_prompts=shuffle_prompts, seed=seed)
 
-    browser = playwright.chromium.launch(
-        headless=False,
-        args=['--disable-blink-features=AutomationControlled']
-    )
+    return run_info, batches, workers
 
-    # Create browser context (no saved session - we'll login fresh)
-    context = browser.new_context(
-        viewport={"width": 1280, "height": 720},
-        permissions=["geolocation"]
-    )
+def create_session_pool():
+    """Build the storage-state session pool from .env accounts, or None if none are configured."""
+    session_pool = SessionPool()
+    
+    if not session_pool.accounts:
+        print(f"❌ Missing CHATGPT_EMAIL or CHATGPT_PASSWORD in .env (or accounts in {ACCOUNTS_FILE})")
+        return None
+    print(f"👥 Accounts: {', '.join(account['name'] for account in session_pool.accounts)}")
+    return session_pool
+
+def warn_shared_accounts(run_info: dict, workers: int, session_pool: SessionPool) -> None:
+    """Warn when several workers will share one account's memory / custom instructions."""
+    if workers > len(session_pool.accounts) and run_info['persona_strategy'] != "inline":
+        print(f"   ⚠️ ChatGPT memory and custom instructions are shared per account: {workers} workers on")
+        print(f"      {len(session_pool.accounts)} account(s) can overwrite each other's persona "
+              f"(add accounts or use --persona-strategy inline).")
 
-    page = context.new_page()
+def new_run_stats(run_info: dict, dispatcher: AccountDispatcher = None) -> dict:
+    """
+    Success/failure counters, per-stage timings, the circuit breaker and the
+    account dispatcher of a run (None runs without rate limits, e.g. the benchmark).
+    """
+    return {
+        "successful_tests": 0,
+        "failed_tests": 0,
+        "timings": RunTimings(),
+        "breaker": CircuitBreaker(run_info['retry_policy']),
+        "dispatcher": dispatcher,
+        "memory": {},  # worker_id -> {"peak_rss_mb", "last_rss_mb", "recycles"}
+    }
 
+def start_run_document(db, run_info: dict) -> None:
+    """
+    Mark the run as running in test_runs (see utils/run_summary.py). A resumed
+    run keeps its result counters but starts its failure tallies over, since
+    the tests that failed before are the ones being run again. A host joining
+    a distributed run that is already running leaves the document as it is.
+    """
     try:
-        # LOGIN TO CHATGPT
-        print(f"🔐 Logging into ChatGPT...")
-        email = os.getenv("CHATGPT_EMAIL")
-        password = os.getenv("CHATGPT_PASSWORD")
-        
-        if not email or not password:
-            print(f"❌ Missing CHATGPT_EMAIL or CHATGPT_PASSWORD in .env")
-            playwright.stop()
-            mongo_client.close()
-            return
-        
-        page.goto("https://chatgpt.com/")
-        time.sleep(3)
-        
-        # Check if we need to login (look for "Log in" button)
-        login_needed = False
-        try:
-            login_button = page.get_by_role("button", name="Log in")
-            if login_button.is_visible(timeout=2000):
-                login_needed = True
-                print(f"🔑 Not logged in. Starting login process...")
-        except:
-            # No login button found, might be logged in
-            pass
-        
-        if not login_needed:
-            # Verify we're actually logged in by checking for textarea
-            try:
-                page.locator("#prompt-textarea").wait_for(timeout=3000)
-                print(f"✅ Already logged in!")
-            except:
-                login_needed = True
-                print(f"🔑 Session expired. Need to login...")
-        
-        if login_needed:
-            # Perform login
-            print(f"🔐 Logging in with credentials...")
-            try:
-                # Click login button
-                page.get_by_role("button", name="Log in").click(timeout=5000)
-                time.sleep(2)
-                
-                # Enter email
-                page.get_by_role("textbox", name="Email address").fill(email)
-                page.get_by_role("button", name="Continue", exact=True).click()
-                time.sleep(2)
-                
-                # Enter password
-                page.get_by_role("textbox", name="Password").fill(password)
-                page.get_by_role("button", name="Continue", exact=True).click()
-                time.sleep(5)
-                
-                # Wait for chat interface
-                page.locator("#prompt-textarea").wait_for(timeout=15000)
-                print(f"✅ Login successful!")
-                
-            except Exception as e:
-                print(f"❌ Login failed: {e}")
-                print(f"   Please check credentials in .env file")
-                print(f"   Current URL: {page.url}")
-                playwright.stop()
-                mongo_client.close()
-                return
-        
-        # FINAL VERIFICATION: Make sure we're logged in before starting tests
-        print(f"\n🔍 Verifying login status before starting tests...")
-        try:
-            # Check that we can interact with the textarea
-            textarea = page.locator("#prompt-textarea")
-            textarea.wait_for(timeout=5000)
-            if not textarea.is_visible():
-                raise Exception("Textarea not visible")
-            print(f"✅ Login verified! Ready to start tests.")
-        except Exception as e:
-            print(f"❌ Not properly logged in: {e}")
-            print(f"   Current URL: {page.url}")
-            print(f"   Taking screenshot for debugging...")
-            page.screenshot(path="login_verification_failed.png")
-            playwright.stop()
-            mongo_client.close()
+        existing = db['test_runs'].find_one({"test_run_id": run_info['test_run_id']},
+                                            {"counts": 1, "personas": 1, "prompts": 1, "status": 1}) or {}
+        if run_info.get('distributed') and existing.get('status') == "running":
             return
+        # Results saved before this start don't count towards its ETA
+        reset = {"counts.failed": 0, "progress_base": (existing.get("counts") or {}).get("done", 0)}
+        for scope in ("personas", "prompts"):
+            for key in existing.get(scope) or {}:
+                reset[f"{scope}.{key}.failed"] = 0
+        db['test_runs'].update_one(
+            {"test_run_id": run_info['test_run_id']},
+            {
+                "$set": {
+                    "persona_set_id": run_info['persona_set_id'],
+                    "prompts_id": run_info['prompts_id'],
+                    "website_url": run_info['website_url'],
+                    "website_title": run_info['website_title'],
+                    "total_tests": run_info['total_tests'],
+                    "status": "running",
+                    "started_at": datetime.utcnow(),
+                    "finished_at": None,
+                    **reset,
+                },
+                "$setOnInsert": {"created_at": datetime.utcnow()},
+            },
+            upsert=True,
+        )
+    except Exception as e:
+        print(f"⚠️ Could not save the run document: {e}")
+
+def save_run_document(db, run_info: dict, stats: dict, status: str = None) -> None:
+    """
+    Upsert the run's document in test_runs when it ends: its settings, per-account
+    dispatch stats and status (complete, or interrupted if tests were left unrun).
+    A distributed runner passes the status of the whole run (see TaskQueue.run_status).
+    """
+    dispatcher = stats.get('dispatcher')
+    if status is None:
+        scheduled = run_info['total_tests'] - run_info.get('completed_before_resume', 0)
+        finished = stats['successful_tests'] + stats['failed_tests'] >= scheduled
+        status = "complete" if finished else "interrupted"
+    try:
+        db['test_runs'].update_one(
+            {"test_run_id": run_info['test_run_id']},
+            {
+                "$set": {
+                    "persona_set_id": run_info['persona_set_id'],
+                    "prompts_id": run_info['prompts_id'],
+                    "website_url": run_info['website_url'],
+                    "total_tests": run_info['total_tests'],
+                    "options": run_info['options'],
+                    "dispatch": dispatcher.to_doc() if dispatcher else {},
+                    "status": status,
+                    # Other hosts are still working on a running distributed run
+                    "finished_at": None if status == "running" else datetime.utcnow(),
+                    "updated_at": datetime.utcnow(),
+                },
+                "$setOnInsert": {"created_at": datetime.utcnow()},
+            },
+            upsert=True,
+        )
+    except Exception as e:
+        print(f"⚠️ Could not save the run document: {e}")
+
+def print_run_summary(run_info: dict, stats: dict, not_run: int = 0) -> None:
+    """Print the final results summary for a run."""
+    total_tests = run_info['total_tests']
+    successful_tests = stats['successful_tests']
+    failed_tests = stats['failed_tests']
+    resumed = run_info.get('completed_before_resume', 0)
 
-        # Test each PROMPT with each PERSONA independently
-        for prompt_idx, prompt in enumerate(prompts, 1):
-            print(f"\n{'=' * 80}")
-            print(f"📝 PROMPT {prompt_idx}/{len(prompts)}: {prompt['prompt']}")
-            print(f"{'=' * 80}")
-            print(f"Category: {prompt['category']}")
-            print(f"Intent: {prompt['intent']}")
-
-            for persona_idx, persona in enumerate(personas, 1):
-                test_count += 1
-
-                print(f"\n{'─' * 80}")
-                print(f"👤 TEST {test_count}/{total_tests}: {persona['name']} ({persona['location']})")
-                print(f"{'─' * 80}")
-
-                # 1. CLEAR MEMORY (start fresh for each test)
-                print(f"🧹 Clearing ChatGPT memory...")
-                try:
-                    clear_memory(page)
-                    time.sleep(2)
-                    print(f"   ✅ Memory cleared successfully!")
-                except Exception as e:
-                    print(f"   ❌ FAILED to clear memory: {e}")
-                    print(f"   ⚠️ WARNING: Previous persona may leak into this test!")
-                    import traceback
-                    traceback.print_exc()
-
-                # 2. SET PERSONA (using workflow function)
-                persona_memory_text = (
-                    f"My name is {persona['name']}. I am {persona['age']} and work as a {persona['occupation']} "
-                    f"in {persona['location']}. My main goals are: {', '.join(persona['goals'])}. "
-                    f"My pain points include: {', '.join(persona['painPoints'])}. "
-                    f"I typically {persona['behavior'].lower()}."
-                )
-                print(f"👤 Setting persona: {persona['name']}...")
-                try:
-                    set_persona(page, persona_memory_text)
-                    time.sleep(3)
-                    print(f"   ✅ Persona set!")
-                except Exception as e:
-                    print(f"   ⚠️ Could not set persona: {e}")
-
-                # 3. SEND PROMPT (using workflow function)
-                print(f"📤 Sending prompt: {prompt['prompt']}")
-                try:
-                    send_prompt(page, prompt["prompt"])
-                except Exception as e:
-                    print(f"   ❌ Could not send prompt: {e}")
-                    failed_tests += 1
-                    continue
-
-                # 4. WAIT FOR RESPONSE (using workflow function)
-                print(f"⏳ Waiting for ChatGPT response...")
-                time.sleep(5)  # Give it time to think
-
-                # 5. EXTRACT RESPONSE (using workflow function)
-                try:
-                    # extract_response waits for conversation-turn-2 (first actual response after persona)
-                    response = extract_response(page, turn_number=2)
-                    
-                    print(f"✅ Response received!")
-                    print(f"   Length: {len(response['text'])} characters")
-                    print(f"   Citations: {len(response['citations'])}")
-                    
-                    # FIXED: Check if brand mentioned using smart brand extraction
-                    brand_keywords = extract_brand_name(website_title, website_url)
-                    response_text_lower = response['text'].lower()
-                    brand_mentioned = any(keyword in response_text_lower for keyword in brand_keywords)
-                    
-                    # Debug: Show what we're checking for
-                    print(f"   🔍 Checking for brand keywords: {brand_keywords[:2]}...")  # Show first 2
-                    if brand_mentioned:
-                        print(f"   ✅ BRAND MENTIONED in response!")
-                    else:
-                        print(f"   ⚠️ Brand NOT mentioned in response")
-                    
-                    # 6. SAVE TO MONGODB
-                    test_result_doc = {
-                        "persona_set_id": persona_set_id,
-                        "persona_id": persona_idx,
-                        "persona_details": persona,
-                        "prompts_id": prompts_id,
-                        "prompt_id": prompt_idx,
-                        "prompt_details": prompt,
-                        "website_url": website_url,
-                        "website_title": website_title,
-                        "response_text": response['text'],
-                        "citations": response['citations'],
-                        "has_citations": response['has_citations'],
-                        "brand_mentioned": brand_mentioned,
-                        "test_run_id": test_run_id,
-                        "test_number": test_count,
-                        "total_tests_in_run": total_tests,
-                        "timestamp": datetime.utcnow()
-                    }
-                    
-                    result = results_collection.insert_one(test_result_doc)
-                    print(f"   💾 Saved to MongoDB: {result.inserted_id}")
-                    successful_tests += 1
-                        
-                except Exception as e:
-                    print(f"   ❌ Error extracting response: {e}")
-                    failed_tests += 1
-                    import traceback
-                    traceback.print_exc()
-    
-    finally:
-        # Clean up browser
-        print(f"\n🔒 Closing browser...")
-        context.close()
-        browser.close()
-        playwright.stop()
-        mongo_client.close()
-    
-    # Final summary
     print(f"\n{'=' * 80}")
     print(f"✅ TESTING COMPLETE!")
     print(f"{'=' * 80}")
     print(f"\n📊 RESULTS SUMMARY:")
     print(f"   Total Tests:      {total_tests}")
+    if resumed:
+        print(f"   ⏯️  Saved Earlier: {resumed}")
     print(f"   ✅ Successful:    {successful_tests}")
     print(f"   ❌ Failed:        {failed_tests}")
-    print(f"   📈 Success Rate:  {(successful_tests/total_tests*100):.1f}%")
+    if not_run:
+        print(f"   ⏭️  Not Run:       {not_run}")
+    scheduled = total_tests - resumed
+    print(f"   📈 Success Rate:  {(successful_tests/scheduled*100 if scheduled else 100):.1f}%")
+    if resumed:
+        print(f"   📦 Run Progress:  {resumed + successful_tests}/{total_tests} saved")
+    print_latency_breakdown(stats['timings'].breakdown())
+    if stats.get('dispatcher'):
+        print_dispatch_stats(stats['dispatcher'].to_doc())
+    if stats.get('memory'):
+        print(f"\n🧠 MEMORY BY WORKER:")
+        for worker_id, entry in sorted(stats['memory'].items()):
+            print(f"   W{worker_id}: peak browser RSS {entry['peak_rss_mb'] or 'n/a'} MB, "
+                  f"last {entry['last_rss_mb'] or 'n/a'} MB, context recycled {entry['recycles']}x")
     print(f"\n💾 All results saved to MongoDB:")
     print(f"   Collection: test_results")
-    print(f"   Test Run ID: {test_run_id}")
+    print(f"   Test Run ID: {run_info['test_run_id']}")
     print(f"\n🎉 GEO testing complete!")
 
-if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python run_from_db.py <persona_set_id> <prompts_id>")
-        sys.exit(1)
+def open_task_queue(db, run_info: dict, batches: list, log=print) -> TaskQueue:
+    """Publish a distributed run's tests to run_tasks (or join them) and start heartbeating leases."""
+    task_queue = TaskQueue(db, run_info['test_run_id'], log=log)
+    created = task_queue.publish(batches, requeue='completed_before_resume' in run_info)
+    counts = task_queue.counts()
+    open_tests = counts.get('pending', 0) + counts.get('leased', 0)
+    log(f"📋 Work queue: {created} test(s) published, {open_tests} open"
+        + (f", {counts['leased']} leased by runners" if counts.get('leased') else ""))
+    return task_queue.start()
+
+def run_geo_tests_from_db(persona_set_id: str, prompts_id: str, **options):
+    """Run GEO tests with personas and prompts from MongoDB (options: see DEFAULT_RUN_OPTIONS)"""
+
+    print("=" * 80)
+    print("🚀 RUNNING GEO TEST AUTOMATION FROM MONGODB")
+    print("=" * 80)
+
+    # Initialize database
+    mongo_client, db = connect_to_mongo()
+
+    plan = prepare_run(db, persona_set_id, prompts_id, options)
+    session_pool = create_session_pool() if plan else None
+    if not plan or not session_pool:
+        mongo_client.close()
+        return
+
+    run_info, batches, workers = plan
+    if not batches:
+        print(f"\n✅ Every test of {run_info['test_run_id']} already has a result.")
+        mongo_client.close()
+        return
+    if run_info['tabs'] > 1:
+        print(f"   ⚠️ Pipelined tabs need the async engine (--engine async), running one tab per worker")
+        run_info['tabs'] = 1
+    session_pool.start_background_refresh()
+
+    warn_shared_accounts(run_info, workers, session_pool)
+
+    print(f"\n🚀 Starting tests...")
+
+    # Workers pull persona batches from one shared queue independently
+    # (distributed: leased from run_tasks, shared with runners on other hosts)
+    if run_info['distributed']:
+        batch_queue = task_queue = open_task_queue(db, run_info, batches)
+    else:
+        task_queue = None
+        batch_queue = queue.Queue()
+        for batch in batches:
+            batch_queue.put(batch)
     
-    persona_set_id = sys.argv[1]
-    prompts_id = sys.argv[2]
-    run_geo_tests_from_db(persona_set_id, prompts_id)
+    # Track success/failure and stage timings
+    stats = new_run_stats(run_info, AccountDispatcher(session_pool.accounts))
+    stats_lock = threading.Lock()
+    start_run_document(db, run_info)
+    results_collection = ResultWriter(db['test_results'], summaries=db['test_runs'], **run_info['result_writer'])
+
+    try:
+        if workers == 1:
+            run_worker(1, 1, batch_queue, run_info, results_collection, stats, stats_lock, session_pool)
+        else:
+            threads = [
+                threading.Thread(
+                    target=run_worker,
+                    args=(worker_id, workers, batch_queue, run_info, results_collection,
+                          stats, stats_lock, session_pool),
+                    name=f"geo-worker-{worker_id}",
+                    daemon=True,
+                )
+                for worker_id in range(1, workers + 1)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    finally:
+        session_pool.stop_background_refresh()
+        results_collection.close()
+        run_status = None
+        if task_queue:
+            task_queue.close()
+            run_status = task_queue.run_status()
+            not_run = task_queue.counts().get('pending', 0)
+        else:
+            not_run = count_tasks(list(batch_queue.queue))
+        save_run_document(db, run_info, stats, status=run_status)
+        mongo_client.close()
+
+    print_run_summary(run_info, stats, not_run=not_run)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run GEO tests with personas and prompts from MongoDB")
+    parser.add_argument("persona_set_id", nargs="?", help="MongoDB ID of the persona set")
+    parser.add_argument("prompts_id", nargs="?", help="MongoDB ID of the prompts document")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of parallel browser sessions (default: 1)")
+    parser.add_argument("--engine", choices=["sync", "async"], default="sync",
+                        help="sync: one thread per browser; async: all pages driven from one asyncio loop")
+    parser.add_argument("--response-timeout", type=float, default=RESPONSE_TIMEOUT_MS / 1000,
+                        help="Max seconds to wait for an answer to finish streaming (default: %(default)s)")
+    parser.add_argument("--shuffle-prompts", action="store_true",
+                        help="Randomize prompt order within each persona to avoid ordering bias")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed for --shuffle-prompts (default: random, printed in the test plan)")
+    parser.add_argument("--capture", choices=CAPTURE_MODES, default="dom",
+                        help="network: read answers from the conversation stream, falling back to the DOM")
+    parser.add_argument("--persona-strategy", choices=PERSONA_STRATEGIES, default="memory",
+                        help="How personas reach ChatGPT: memory (default), inline prompt prefix "
+                             "(fastest, no memory round trip) or custom_instructions")
+    parser.add_argument("--resume", metavar="TEST_RUN_ID", default=None,
+                        help="Finish an interrupted run: only tests without a saved result are run "
+                             "(persona set and prompts default to the run's own)")
+    parser.add_argument("--test-run-id", default=None,
+                        help="ID of the new run (default: run_<UTC timestamp>_<random hex>)")
+    parser.add_argument("--distributed", action="store_true",
+                        help="Share the run with runners on other hosts through MongoDB task leases "
+                             "(start the same command, with the same --test-run-id, on each host)")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_RETRY_POLICY["test_attempts"],
+                        help="Tries per test before it counts as failed, each in a fresh chat (default: %(default)s)")
+    parser.add_argument("--browser-profile", choices=BROWSER_PROFILES, default="default",
+                        help="lean: new headless mode without images, web fonts or trackers, "
+                             "with trimmed Chromium flags for GPU-less servers")
+    parser.add_argument("--recycle-after-tests", type=int, default=DEFAULT_RUN_OPTIONS["recycle_after_tests"],
+                        help="Open a fresh context (from the stored login) every N tests, 0 to never (default: %(default)s)")
+    parser.add_argument("--max-browser-rss-mb", type=int, default=DEFAULT_RUN_OPTIONS["max_browser_rss_mb"],
+                        help="Recycle the context once the browser's RSS passes this, 0 for no limit (default: %(default)s)")
+    parser.add_argument("--tabs", type=int, default=DEFAULT_RUN_OPTIONS["tabs"],
+                        help="Chats each worker keeps open in its logged-in context: the next prompt is sent "
+                             "while earlier answers are still streaming (async engine, default: %(default)s)")
+    parser.add_argument("--write-batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Results buffered per MongoDB insert_many (default: %(default)s)")
+    parser.add_argument("--write-flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL_S,
+                        help="Max seconds a result waits in the buffer (default: %(default)s)")
+    parser.add_argument("--write-concern", default=DEFAULT_WRITE_CONCERN,
+                        help="Write concern of result inserts: 0, 1, 2... or majority (default: %(default)s)")
+    args = parser.parse_args()
+    if args.tabs > 1 and args.engine != "async":
+        parser.error("--tabs needs --engine async")
+    if args.distributed and not (args.test_run_id or args.resume):
+        parser.error("--distributed needs --test-run-id (or --resume) so every host joins the same run")
+    if not args.resume and not (args.persona_set_id and args.prompts_id):
+        parser.error("persona_set_id and prompts_id are required unless --resume is given")
+
+    options = {
+        "workers": args.workers,
+        "response_timeout": args.response_timeout,
+        "shuffle_prompts": args.shuffle_prompts,
+        "seed": args.seed,
+        "capture": args.capture,
+        "persona_strategy": args.persona_strategy,
+        "resume": args.resume,
+        "test_run_id": args.test_run_id,
+        "distributed": args.distributed,
+        "max_attempts": args.max_attempts,
+        "browser_profile": args.browser_profile,
+        "recycle_after_tests": args.recycle_after_tests,
+        "max_browser_rss_mb": args.max_browser_rss_mb,
+        "tabs": args.tabs,
+        "write_batch_size": args.write_batch_size,
+        "write_flush_interval": args.write_flush_interval,
+        "write_concern": args.write_concern,
+    }
+
+    if args.engine == "async":
+        import asyncio
+        from run_from_db_async import run_geo_tests_from_db_async
+        asyncio.run(run_geo_tests_from_db_async(args.persona_set_id, args.prompts_id, **options))
+    else:
+        run_geo_tests_from_db(args.persona_set_id, args.prompts_id, **options)
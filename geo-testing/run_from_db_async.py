@@ -0,0 +1,650 @@
+"""
+Asyncio driver for GEO tests loaded from MongoDB.
+
+Runs the same persona × prompt matrix as run_from_db.py, but drives every
+worker page from a single event loop on top of playwright.async_api, so one
+process can keep many pages busy without a thread per browser.
+
+Usage:
+    python run_from_db.py <persona_set_id> <prompts_id> --engine async --workers 8
+"""
+import asyncio
+import os
+import time
+import traceback
+from playwright.async_api import async_playwright
+from run_from_db import (
+    build_inline_prompt,
+    build_persona_memory_text,
+    build_result_doc,
+    connect_to_mongo,
+    create_session_pool,
+    make_logger,
+    new_run_stats,
+    open_task_queue,
+    prepare_run,
+    print_run_summary,
+    memory_recycle_reason,
+    record_attempt,
+    record_memory,
+    reserve_send,
+    save_run_document,
+    start_run_document,
+    warn_shared_accounts,
+)
+from workflows.async_memory import clear_memory, clear_custom_instructions, set_persona, set_custom_instructions
+from workflows.async_chat import send_prompt, extract_response, start_new_chat
+from workflows.async_completion import wait_for_response_complete
+from workflows.async_login import is_logged_in, login_to_chatgpt
+from utils.scheduler import count_tasks
+from utils.timing import StageTimer
+from utils.browser_profile import context_options, launch_options
+from utils.memory_guard import JS_HEAP_SCRIPT, AsyncBrowserMemoryProbe, heap_mb
+from utils.rate_limit import AccountDispatcher
+from utils.result_writer import ResultWriter
+from utils.run_summary import failure_entry
+from utils.session_pool import last_persona_strategy, record_persona_strategy
+from utils.task_queue import TaskQueue
+from utils.retry import DEFAULT_RETRY_POLICY, backoff_delay, bounded_stage
+from workflows.async_network_capture import ConversationCapture
+from workflows.config import CHATGPT_URL
+
+async def new_runner_context(browser, storage_state: str = None, profile: str = "default"):
+    """Create an isolated context (restored from `storage_state` if given) and page for one async worker."""
+    context = await browser.new_context(
+        storage_state=storage_state,
+        viewport={"width": 1280, "height": 720},
+        permissions=["geolocation"],
+        **context_options(profile)
+    )
+    page = await context.new_page()
+    return context, page
+
+async def open_tab(context):
+    """Open another page in a logged-in context, on a new chat ready for a prompt."""
+    page = await context.new_page()
+    try:
+        await start_new_chat(page)
+    except Exception:
+        await page.close()
+        raise
+    return page
+
+async def open_pooled_session(browser, session_pool, log=print, account_name: str = None,
+                              profile: str = "default"):
+    """
+    Check out a pooled storage state (of `account_name`, default the first account)
+    and open a logged-in context with it.
+
+    Falls back to a credential login (saved back to the pool) when the state is
+    missing or rejected. Returns (context, page), or None if login failed.
+    """
+    # The pool may launch a sync browser to refresh a state, keep that off the event loop
+    session = await asyncio.to_thread(session_pool.checkout, account_name)
+    context, page = await new_runner_context(browser, storage_state=session['storage_state'], profile=profile)
+
+    if session['storage_state']:
+        await page.goto(CHATGPT_URL)
+        if await is_logged_in(page):
+            log(f"✅ Session restored from {session['storage_state']}")
+            return context, page
+        log(f"🔑 Saved session was rejected, logging in with credentials...")
+        session_pool.mark_invalid(session['path'])
+
+    account = session['account']
+    if not await login_to_chatgpt(page, account['email'], account['password'], log=log):
+        await context.close()
+        return None
+
+    os.makedirs(os.path.dirname(session['path']), exist_ok=True)
+    await context.storage_state(path=session['path'])
+    session_pool.mark_validated(session['path'])
+    log(f"💾 Session saved to pool: {session['path']}")
+    return context, page
+
+async def reset_persona_state_async(page, strategy: str, account: str = None, log=print,
+                                    timer: StageTimer = None, policy: dict = None) -> None:
+    """Clear memory and custom instructions left by other persona strategies (see reset_persona_state)."""
+    timer = timer or StageTimer()
+    policy = policy or DEFAULT_RETRY_POLICY
+    previous = last_persona_strategy(account) if account else None
+
+    # The memory strategy clears memory before every persona anyway
+    if strategy != "memory":
+        log(f"🧹 Clearing ChatGPT memory left by earlier runs...")
+        with bounded_stage(page, timer, "clear_memory", policy):
+            try:
+                await clear_memory(page)
+                await asyncio.sleep(2)
+                log(f"   ✅ Memory cleared successfully!")
+            except Exception as e:
+                log(f"   ⚠️ Could not clear memory: {e}")
+
+    # The custom_instructions strategy overwrites them for every persona
+    if strategy != "custom_instructions" and previous == "custom_instructions":
+        log(f"🧹 Clearing custom instructions left by earlier runs...")
+        with bounded_stage(page, timer, "set_persona", policy):
+            try:
+                await clear_custom_instructions(page)
+                log(f"   ✅ Custom instructions cleared!")
+            except Exception as e:
+                log(f"   ⚠️ Could not clear custom instructions: {e}")
+                return
+
+    if account:
+        record_persona_strategy(account, strategy)
+
+async def setup_persona_async(page, persona: dict, log=print, timer: StageTimer = None,
+                              strategy: str = "memory", policy: dict = None) -> bool:
+    """Prepare the page for a persona according to the run's persona strategy (see setup_persona)."""
+    timer = timer or StageTimer()
+    policy = policy or DEFAULT_RETRY_POLICY
+
+    if strategy == "inline":
+        return True
+
+    if strategy == "custom_instructions":
+        log(f"👤 Setting persona as custom instructions: {persona['name']}...")
+        with bounded_stage(page, timer, "set_persona", policy):
+            try:
+                await set_custom_instructions(page, build_persona_memory_text(persona))
+                log(f"   ✅ Persona set!")
+                return True
+            except Exception as e:
+                log(f"   ⚠️ Could not set persona: {e}")
+                return False
+
+    ok = True
+
+    # 1. CLEAR MEMORY (start fresh for each persona)
+    log(f"🧹 Clearing ChatGPT memory...")
+    with bounded_stage(page, timer, "clear_memory", policy):
+        try:
+            await clear_memory(page)
+            await asyncio.sleep(2)
+            log(f"   ✅ Memory cleared successfully!")
+        except Exception as e:
+            log(f"   ❌ FAILED to clear memory: {e}")
+            log(f"   ⚠️ WARNING: Previous persona may leak into this test!")
+            ok = False
+
+    # 2. SET PERSONA
+    log(f"👤 Setting persona: {persona['name']}...")
+    with bounded_stage(page, timer, "set_persona", policy):
+        try:
+            await set_persona(page, build_persona_memory_text(persona))
+            await asyncio.sleep(3)
+            log(f"   ✅ Persona set!")
+        except Exception as e:
+            log(f"   ⚠️ Could not set persona: {e}")
+            ok = False
+
+    return ok
+
+async def run_single_test_async(page, task: dict, run_info: dict, results_collection, log=print,
+                                new_chat: bool = False, capture: ConversationCapture = None,
+                                timer: StageTimer = None, attempt: int = 1) -> bool:
+    """
+    Run one prompt on a logged-in page whose persona is already set up.
+
+    Returns True when the result was extracted and saved to MongoDB.
+    """
+    timer = timer or StageTimer()
+    policy = run_info['retry_policy']
+    persona = task['persona']
+    prompt = task['prompt']
+
+    log(f"\n{'─' * 80}")
+    retry_note = f" (attempt {attempt}/{policy['test_attempts']})" if attempt > 1 else ""
+    log(f"👤 TEST {task['test_number']}/{run_info['total_tests']}: {persona['name']} ({persona['location']}){retry_note}")
+    log(f"📝 Prompt {task['prompt_idx']}: {prompt['prompt']}")
+    log(f"{'─' * 80}")
+
+    if new_chat:
+        try:
+            with bounded_stage(page, timer, "new_chat", policy):
+                await start_new_chat(page)
+        except Exception as e:
+            log(f"   ❌ Could not open a new chat: {e}")
+            return False
+
+    # 3. SEND PROMPT
+    log(f"📤 Sending prompt: {prompt['prompt']}")
+    prompt_text = prompt["prompt"]
+    if run_info.get('persona_strategy') == "inline":
+        prompt_text = build_inline_prompt(persona, prompt_text)
+    try:
+        if capture is not None:
+            capture.reset()
+        with bounded_stage(page, timer, "send", policy):
+            await send_prompt(page, prompt_text)
+        sent_at = time.monotonic()
+    except Exception as e:
+        log(f"   ❌ Could not send prompt: {e}")
+        return False
+
+    # 4. WAIT FOR THE ANSWER TO FINISH STREAMING
+    log(f"⏳ Waiting for ChatGPT response...")
+    try:
+        with timer.span("wait"):
+            await wait_for_response_complete(page, turn_number=2, timeout_ms=run_info['response_timeout_ms'])
+    except Exception as e:
+        log(f"   ❌ Response still streaming after {run_info['response_timeout_ms'] / 1000:.0f}s: {e}")
+        return False
+    completion_latency = time.monotonic() - sent_at
+    log(f"   ⏱️ Response complete after {completion_latency:.1f}s")
+
+    # 5. EXTRACT RESPONSE
+    try:
+        with bounded_stage(page, timer, "extract", policy):
+            response = await extract_response(page, turn_number=2, wait_for_completion=False, capture=capture)
+        test_result_doc = build_result_doc(
+            task, run_info, response, log=log,
+            extra={
+                "completion_latency_ms": round(completion_latency * 1000),
+                "prompt_position": task['prompt_position'],
+                "attempts": attempt,
+                "timings": timer.to_doc(),
+            }
+        )
+
+        # 6. SAVE TO MONGODB (a ResultWriter only buffers here; its own thread does the blocking writes)
+        with timer.span("save"):
+            result = results_collection.insert_one(test_result_doc)
+        log(f"   💾 Queued for MongoDB: {result.inserted_id}")
+        return True
+
+    except Exception as e:
+        log(f"   ❌ Error extracting response: {e}")
+        traceback.print_exc()
+        return False
+
+def open_slot(page, run_info: dict, reopen=None, account: str = None,
+              probe: AsyncBrowserMemoryProbe = None, worker_id: int = 1, log=print) -> dict:
+    """
+    Async counterpart of run_from_db.open_slot; `reopen` is a coroutine function returning
+    a page or None. Async workers share one browser, so `probe` measures all of them.
+    `log` tags the slot's own output (one slot per tab when pipelining).
+    """
+    return {
+        "page": page,
+        "capture": ConversationCapture(page) if run_info['capture_mode'] == "network" else None,
+        "failures": 0,
+        "reopen": reopen,
+        "account": account,
+        "probe": probe,
+        "worker_id": worker_id,
+        "tests": 0,
+        "recycles": 0,
+        "fresh": False,  # page sits on an unused new chat
+        "log": log,
+    }
+
+def close_slot(slot: dict) -> None:
+    if slot['capture'] is not None:
+        slot['capture'].detach()
+
+async def recycle_slot(slot: dict, run_info: dict, reason: str, log=print) -> None:
+    """Replace the slot's context/page with a fresh one (keeps the old page if reopening fails)."""
+    slot['failures'] = 0
+    slot['tests'] = 0
+    if slot['reopen'] is None:
+        return
+    log(f"♻️ {reason}, recycling the browser context...")
+    try:
+        page = await slot['reopen']()
+    except Exception as e:
+        log(f"   ⚠️ Could not recycle the context: {e}")
+        return
+    if page is None:
+        log(f"   ⚠️ Could not log the new context in, keeping the old page")
+        return
+    close_slot(slot)
+    if not slot['page'].is_closed():
+        # A pipelined tab reopens as a new page of the shared context; drop the old one
+        await slot['page'].close()
+    slot.update(open_slot(page, run_info, reopen=slot['reopen'], account=slot['account'],
+                          probe=slot['probe'], worker_id=slot['worker_id'], log=slot['log']),
+                recycles=slot['recycles'] + 1)
+    log(f"   ✅ Fresh context ready")
+
+async def guard_memory_async(slot: dict, run_info: dict, stats: dict, log=print) -> None:
+    """
+    After each test: log memory and recycle a context that ran too long or grew too big.
+
+    The RSS is the shared browser's, so when it is over the limit each worker
+    recycles its own context in turn as it finishes a test. Pipelined tabs only
+    count their tests here: their shared context is recycled between persona
+    batches, once every tab is idle (see recycle_pipelined_context).
+    """
+    slot['tests'] += 1
+    rss = await slot['probe'].rss_mb() if slot['probe'] else None
+    try:
+        heap = heap_mb(await slot['page'].evaluate(JS_HEAP_SCRIPT))
+    except Exception:
+        heap = None
+    record_memory(stats, slot, rss, heap, log=log)
+
+    if slot.get('context') is not None:
+        slot['context']['tests'] += 1
+        return
+
+    reason = memory_recycle_reason(slot, run_info, rss)
+    if reason:
+        await recycle_slot(slot, run_info, reason, log=log)
+        stats['memory'][slot['worker_id']]['recycles'] = slot['recycles']
+
+async def wait_for_breaker(breaker, log=print) -> None:
+    """Sleep while the run's circuit breaker is open."""
+    pause = breaker.remaining_pause()
+    if pause > 0:
+        log(f"⏸️ Circuit breaker open, waiting {pause:.0f}s before the next test...")
+        await asyncio.sleep(pause)
+
+async def run_test_with_retries_async(slot: dict, task: dict, run_info: dict, results_collection,
+                                      stats: dict, log=print, new_chat: bool = False,
+                                      timer: StageTimer = None) -> bool:
+    """Run one test under the run's retry policy (see run_from_db.run_test_with_retries)."""
+    policy = run_info['retry_policy']
+    timer = timer or StageTimer()
+
+    for attempt in range(1, policy['test_attempts'] + 1):
+        await wait_for_breaker(stats['breaker'], log=log)
+        with timer.span("throttle"):
+            await asyncio.sleep(reserve_send(stats, slot, log=log))
+        succeeded = await run_single_test_async(slot['page'], task, run_info, results_collection, log=log,
+                                                new_chat=new_chat or attempt > 1, capture=slot['capture'],
+                                                timer=timer, attempt=attempt)
+        record_attempt(stats, slot, succeeded, log=log)
+        if succeeded:
+            slot['failures'] = 0
+            return True
+
+        slot['failures'] += 1
+        if slot['failures'] >= policy['recycle_after_failures']:
+            await recycle_slot(slot, run_info, f"{slot['failures']} failures in a row", log=log)
+
+        if attempt < policy['test_attempts']:
+            delay = backoff_delay(attempt, policy)
+            log(f"   🔁 Retrying in {delay:.1f}s...")
+            with timer.span("backoff"):
+                await asyncio.sleep(delay)
+
+    log(f"   ❌ Giving up on test {task['test_number']} after {policy['test_attempts']} attempts")
+    return False
+
+async def run_persona_batch_async(slots: list, batch: dict, run_info: dict, results_collection,
+                                  stats: dict, log=print) -> None:
+    """
+    Set a persona up once, then run each of its prompts in a fresh chat.
+
+    With several tabs (--tabs) the prompts are pipelined: every tab takes the
+    next prompt as soon as its last answer is saved, so one tab is sending
+    while the others are still streaming. Memory and custom instructions
+    belong to the account, so the persona set up in the first tab holds for
+    all of them.
+    """
+    log(f"\n{'=' * 80}")
+    log(f"👤 PERSONA {batch['persona_idx']}: {batch['persona']['name']} ({len(batch['tasks'])} prompts)")
+    log(f"{'=' * 80}")
+
+    policy = run_info['retry_policy']
+    strategy = run_info['persona_strategy']
+    lead = slots[0]
+    setup_timer = StageTimer()
+    # Once per worker: the tabs share the account, whose state survives context recycling
+    if not lead.get('persona_state_reset'):
+        await reset_persona_state_async(lead['page'], strategy, account=lead['account'], log=lead['log'],
+                                        timer=setup_timer, policy=policy)
+        lead['persona_state_reset'] = True
+    for attempt in range(1, policy['setup_attempts'] + 1):
+        if await setup_persona_async(lead['page'], batch['persona'], log=lead['log'], timer=setup_timer,
+                                     strategy=strategy, policy=policy):
+            # Memory and custom instructions setup end on a new chat
+            lead['fresh'] = lead['fresh'] if strategy == "inline" else True
+            break
+        lead['fresh'] = False
+        if attempt < policy['setup_attempts']:
+            delay = backoff_delay(attempt, policy)
+            log(f"   🔁 Persona setup failed, retrying in {delay:.1f}s...")
+            with setup_timer.span("backoff"):
+                await asyncio.sleep(delay)
+    else:
+        log(f"   ⚠️ Persona setup kept failing, running its prompts anyway")
+
+    # All tabs and workers share one event loop, so the iterator and plain counters need no lock
+    pending = iter(batch['tasks'])
+    first_task = batch['tasks'][0] if batch['tasks'] else None
+
+    async def run_tab(slot: dict) -> None:
+        for task in pending:
+            # Persona setup is charged to the persona's first test
+            timer = setup_timer if task is first_task else StageTimer()
+            new_chat = not slot['fresh']
+            slot['fresh'] = False
+            succeeded = await run_test_with_retries_async(slot, task, run_info, results_collection, stats,
+                                                          log=slot['log'], new_chat=new_chat, timer=timer)
+            stats['timings'].record(timer)
+            if succeeded:
+                stats['successful_tests'] += 1
+            else:
+                stats['failed_tests'] += 1
+                results_collection.record_failure(failure_entry(task, run_info))
+            if batch.get('on_task_done'):
+                await asyncio.to_thread(batch['on_task_done'], task, succeeded)
+            await guard_memory_async(slot, run_info, stats, log=slot['log'])
+
+    await asyncio.gather(*(run_tab(slot) for slot in slots))
+
+async def open_pipelined_slots(context, first_slot: dict, run_info: dict, log=print) -> list:
+    """
+    Open the extra tabs of a pipelined worker (run_info['tabs'] in total) in the
+    context of `first_slot`. Tabs that fail to open are skipped.
+    """
+    slots = [first_slot]
+    for tab in range(2, run_info['tabs'] + 1):
+        try:
+            page = await open_tab(context)
+        except Exception as e:
+            log(f"⚠️ Could not open tab {tab}: {e}")
+            continue
+        slot = open_slot(page, run_info, reopen=first_slot['reopen'], account=first_slot['account'],
+                         probe=first_slot['probe'], worker_id=first_slot['worker_id'],
+                         log=make_logger(first_slot['worker_id'], 1, tab=tab))
+        slot['fresh'] = True
+        slot['context'] = first_slot.get('context')
+        slots.append(slot)
+    if len(slots) > 1:
+        log(f"🗂️ Pipelining prompts over {len(slots)} tabs")
+    return slots
+
+async def recycle_pipelined_context(slots: list, run_info: dict, stats: dict, log=print) -> list:
+    """
+    Between persona batches, with every tab idle: replace a pipelined worker's
+    shared context when the memory guard calls for it. (A tab's own recycle only
+    opens a new page in the same context, which frees none of its memory.)
+
+    Returns the worker's slots: new tabs in a fresh context, or the old ones.
+    """
+    lead = slots[0]
+    context = lead['context']
+    rss = await lead['probe'].rss_mb() if lead['probe'] else None
+    reason = memory_recycle_reason(context, run_info, rss)
+    if not reason:
+        return slots
+
+    log(f"♻️ {reason}, recycling the context shared by {len(slots)} tabs...")
+    context['tests'] = 0
+    try:
+        page = await context['reopen']()
+    except Exception as e:
+        log(f"   ⚠️ Could not recycle the context: {e}")
+        return slots
+    if page is None:
+        log(f"   ⚠️ Could not log the new context in, keeping the old tabs")
+        return slots
+
+    # reopen() closed the old context, and every tab with it
+    for slot in slots:
+        close_slot(slot)
+    context['recycles'] += 1
+    first = open_slot(page, run_info, reopen=lead['reopen'], account=lead['account'], probe=lead['probe'],
+                      worker_id=lead['worker_id'], log=lead['log'])
+    first['context'] = context
+    # Memory and custom instructions belong to the account, not the context
+    first['persona_state_reset'] = lead.get('persona_state_reset', False)
+    slots = await open_pipelined_slots(page.context, first, run_info, log=log)
+    for slot in slots:
+        slot['recycles'] = context['recycles']
+    stats['memory'][lead['worker_id']]['recycles'] = context['recycles']
+    log(f"   ✅ Fresh context ready")
+    return slots
+
+async def run_worker_async(worker_id: int, workers: int, browser, batch_queue: asyncio.Queue,
+                           run_info: dict, results_collection, stats: dict,
+                           session_pool, probe: AsyncBrowserMemoryProbe = None) -> None:
+    """Drive one isolated context, pulling persona batches off the shared queue until it is empty."""
+    log = make_logger(worker_id, workers)
+    # Spread workers across the pool's accounts; each account is metered by its own bucket
+    account_name = stats['dispatcher'].assign() if stats.get('dispatcher') else None
+
+    log(f"🔐 Opening ChatGPT session{f' for {account_name}' if account_name else ''}...")
+    opened = await open_pooled_session(browser, session_pool, log=log, account_name=account_name,
+                                       profile=run_info['browser_profile'])
+    if not opened:
+        log(f"❌ Worker {worker_id} could not log in; leaving its tests to other workers.")
+        return
+    contexts = [opened[0]]
+
+    async def reopen():
+        reopened = await open_pooled_session(browser, session_pool, log=log, account_name=account_name,
+                                             profile=run_info['browser_profile'])
+        if not reopened:
+            return None
+        # Only drop the old context once the new one is logged in
+        await contexts.pop().close()
+        contexts.append(reopened[0])
+        return reopened[1]
+
+    async def reopen_tab():
+        # Pipelined tabs share the login: recycling one must not close its siblings
+        return await open_tab(contexts[-1])
+
+    tabbed = run_info['tabs'] > 1
+    slot = open_slot(opened[1], run_info, reopen=reopen_tab if tabbed else reopen, account=account_name,
+                     probe=probe, worker_id=worker_id,
+                     log=make_logger(worker_id, workers, tab=1) if tabbed else log)
+    if tabbed:
+        # The tabs' tests add up on one context, which only reopen() can replace
+        slot['context'] = {"tests": 0, "recycles": 0, "reopen": reopen}
+    slots = [slot]
+    try:
+        if tabbed:
+            slots = await open_pipelined_slots(contexts[-1], slot, run_info, log=log)
+        await drain_batch_queue(slots, batch_queue, run_info, results_collection, stats, log=log)
+
+    finally:
+        for slot in slots:
+            close_slot(slot)
+        await contexts[-1].close()
+
+def queue_batches(batches: list) -> asyncio.Queue:
+    """Put persona batches on a queue that async workers drain."""
+    batch_queue = asyncio.Queue()
+    for batch in batches:
+        batch_queue.put_nowait(batch)
+    return batch_queue
+
+def count_unrun_tasks(batch_queue: asyncio.Queue) -> int:
+    """Count the tests still sitting in a batch queue (e.g. after every worker failed)."""
+    remaining = []
+    while not batch_queue.empty():
+        remaining.append(batch_queue.get_nowait())
+    return count_tasks(remaining)
+
+async def drain_batch_queue(slots: list, batch_queue: asyncio.Queue, run_info: dict, results_collection,
+                            stats: dict, log=print) -> None:
+    """
+    Run persona batches on a worker's slots (its tabs) until the shared queue is
+    empty, or until no test of a distributed run is left to lease.
+    """
+    while True:
+        if isinstance(batch_queue, TaskQueue):
+            # Leasing is a MongoDB round trip
+            batch = await asyncio.to_thread(batch_queue.lease_batch)
+            if batch is None:
+                break
+        else:
+            try:
+                batch = batch_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+
+        await run_persona_batch_async(slots, batch, run_info, results_collection, stats, log=log)
+        batch_queue.task_done()
+        if slots[0].get('context') is not None:
+            # In place, so the worker closes the current tabs when it stops
+            slots[:] = await recycle_pipelined_context(slots, run_info, stats, log=log)
+
+async def run_geo_tests_from_db_async(persona_set_id: str, prompts_id: str, **options):
+    """Run GEO tests with personas and prompts from MongoDB on one asyncio event loop"""
+
+    print("=" * 80)
+    print("🚀 RUNNING GEO TEST AUTOMATION FROM MONGODB (ASYNC)")
+    print("=" * 80)
+
+    mongo_client, db = connect_to_mongo()
+
+    plan = prepare_run(db, persona_set_id, prompts_id, options)
+    session_pool = create_session_pool() if plan else None
+    if not plan or not session_pool:
+        mongo_client.close()
+        return
+
+    run_info, batches, workers = plan
+    if not batches:
+        print(f"\n✅ Every test of {run_info['test_run_id']} already has a result.")
+        mongo_client.close()
+        return
+    session_pool.start_background_refresh()
+
+    warn_shared_accounts(run_info, workers, session_pool)
+    if run_info['distributed']:
+        batch_queue = task_queue = await asyncio.to_thread(open_task_queue, db, run_info, batches)
+    else:
+        task_queue = None
+        batch_queue = queue_batches(batches)
+
+    stats = new_run_stats(run_info, AccountDispatcher(session_pool.accounts))
+    await asyncio.to_thread(start_run_document, db, run_info)
+    results_collection = ResultWriter(db['test_results'], summaries=db['test_runs'], **run_info['result_writer'])
+
+    print(f"\n🚀 Launching browser...")
+    playwright = await async_playwright().start()
+    browser = await playwright.chromium.launch(**launch_options(run_info['browser_profile']))
+    probe = await AsyncBrowserMemoryProbe.open(browser)
+
+    try:
+        print(f"\n🚀 Starting tests...")
+        await asyncio.gather(*(
+            run_worker_async(worker_id, workers, browser, batch_queue, run_info,
+                             results_collection, stats, session_pool, probe=probe)
+            for worker_id in range(1, workers + 1)
+        ))
+    finally:
+        print(f"\n🔒 Closing browser...")
+        await browser.close()
+        await playwright.stop()
+        session_pool.stop_background_refresh()
+        await asyncio.to_thread(results_collection.close)
+        run_status = None
+        if task_queue:
+            await asyncio.to_thread(task_queue.close)
+            run_status = await asyncio.to_thread(task_queue.run_status)
+            not_run = (await asyncio.to_thread(task_queue.counts)).get('pending', 0)
+        else:
+            not_run = count_unrun_tasks(batch_queue)
+        await asyncio.to_thread(save_run_document, db, run_info, stats, run_status)
+        mongo_client.close()
+
+    print_run_summary(run_info, stats, not_run=not_run)
@@ -19,7 +19,8 @@ def run_tech_geo_tests():
     print("=" * 80)
     
     # Initialize database
-    db = Database()
+    db = Database(buffered=True)
+    db.ensure_indexes()
     
     # Load test data
     print("\n📂 Loading test data...")
@@ -159,6 +160,8 @@ def run_tech_geo_tests():
         context.close()
         browser.close()
         playwright.stop()
+        # Results are buffered; write them before reading the stats back
+        db.flush()
     
     # Final summary
     print(f"\n{'=' * 80}")
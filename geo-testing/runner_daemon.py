@@ -0,0 +1,256 @@
+"""
+Long-lived GEO runner daemon.
+
+Keeps Chromium running with a pool of warm, logged-in pages and accepts run
+jobs over a local TCP socket, so a new run starts immediately instead of
+paying for browser launch + credential login every time.
+
+Protocol: one JSON object per line in, one JSON reply per line out.
+    {"action": "run", "persona_set_id": "...", "prompts_id": "...", "workers": 2, ...run options}
+        -> {"success": true, "test_run_id": "run_...", "total_tests": 15, "remaining_tests": 15, "queued_jobs": 1}
+    {"action": "run", "resume": "run_..."}   (finish an interrupted run)
+    {"action": "status"}
+        -> {"success": true, "warm_pages": 3, "running": "run_...", "queued_jobs": 0}
+
+Usage:
+    python runner_daemon.py --pages 3 [--host 127.0.0.1] [--port 5055]
+"""
+import argparse
+import asyncio
+import json
+import os
+import traceback
+from playwright.async_api import async_playwright
+from run_from_db import (
+    DEFAULT_RUN_OPTIONS,
+    connect_to_mongo,
+    create_session_pool,
+    make_logger,
+    new_run_stats,
+    prepare_run,
+    print_run_summary,
+    resolve_run_options,
+    save_run_document,
+    start_run_document,
+)
+from run_from_db_async import (
+    close_slot,
+    count_unrun_tasks,
+    drain_batch_queue,
+    open_pooled_session,
+    open_slot,
+    queue_batches,
+)
+from workflows.async_login import is_logged_in, login_to_chatgpt
+from utils.browser_profile import BROWSER_PROFILES, launch_options
+from utils.memory_guard import AsyncBrowserMemoryProbe
+from utils.rate_limit import AccountDispatcher
+from utils.result_writer import ResultWriter
+from utils.scheduler import count_tasks
+
+DEFAULT_HOST = os.getenv("RUNNER_DAEMON_HOST", "127.0.0.1")
+DEFAULT_PORT = int(os.getenv("RUNNER_DAEMON_PORT", "5055"))
+
+class RunnerDaemon:
+    """Owns the warm browser pages and runs queued jobs on them one at a time."""
+
+    def __init__(self, pages: int = 1, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 browser_profile: str = "default"):
+        self.page_count = max(1, pages)
+        self.browser_profile = browser_profile
+        self.host = host
+        self.port = port
+        self.slots = []  # [{"worker_id", "account", "context", "page"}]
+        self.jobs = asyncio.Queue()
+        self.running = None
+
+    async def serve(self) -> None:
+        """Launch the browser, warm every page, then accept jobs until cancelled."""
+        self.session_pool = create_session_pool()
+        if not self.session_pool:
+            return
+        self.session_pool.start_background_refresh()
+
+        self.mongo_client, self.db = connect_to_mongo()
+
+        print(f"🚀 Launching browser...")
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(**launch_options(self.browser_profile))
+        self.memory_probe = await AsyncBrowserMemoryProbe.open(self.browser)
+
+        try:
+            print(f"🔥 Warming {self.page_count} logged-in page(s)...")
+            await asyncio.gather(*(self._warm_slot(worker_id) for worker_id in range(1, self.page_count + 1)))
+            if not self.slots:
+                print(f"❌ No page could log in; daemon not started.")
+                return
+
+            server = await asyncio.start_server(self._handle_client, self.host, self.port)
+            print(f"✅ Runner daemon ready on {self.host}:{self.port} with {len(self.slots)} warm page(s)")
+
+            async with server:
+                await asyncio.gather(server.serve_forever(), self._job_loop())
+        finally:
+            print(f"\n🔒 Closing browser...")
+            await self.browser.close()
+            await self.playwright.stop()
+            self.session_pool.stop_background_refresh()
+            self.mongo_client.close()
+
+    async def _warm_slot(self, worker_id: int) -> None:
+        """Open a logged-in context for one worker from the session pool (pages take the accounts in turn)."""
+        log = make_logger(worker_id, self.page_count)
+        accounts = self.session_pool.accounts
+        account_name = accounts[(worker_id - 1) % len(accounts)]["name"]
+        opened = await open_pooled_session(self.browser, self.session_pool, log=log, account_name=account_name,
+                                           profile=self.browser_profile)
+        if opened:
+            context, page = opened
+            self.slots.append({"worker_id": worker_id, "account": account_name, "context": context, "page": page})
+            self.slots.sort(key=lambda slot: slot["worker_id"])
+
+    async def _ensure_logged_in(self, slot: dict) -> bool:
+        """Cheap health check before a job; re-login only if the session dropped."""
+        log = make_logger(slot["worker_id"], self.page_count)
+        if await is_logged_in(slot["page"], timeout=2000):
+            return True
+        log(f"🔑 Warm page lost its session, logging in again...")
+        account = self.session_pool.get_account(slot["account"])
+        return await login_to_chatgpt(slot["page"], account["email"], account["password"], log=log)
+
+    def _reopener(self, slot: dict):
+        """Coroutine function that swaps a warm slot's context for a fresh pooled one (used for recycling)."""
+        async def reopen():
+            opened = await open_pooled_session(self.browser, self.session_pool,
+                                               log=make_logger(slot["worker_id"], self.page_count),
+                                               account_name=slot["account"], profile=self.browser_profile)
+            if not opened:
+                return None
+            # Only drop the old context once the new one is logged in
+            await slot["context"].close()
+            slot["context"], slot["page"] = opened
+            return slot["page"]
+        return reopen
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer newline-delimited JSON requests from one connection."""
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    reply = await self._dispatch(request)
+                except Exception as e:
+                    reply = {"success": False, "error": str(e)}
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request: dict) -> dict:
+        action = request.get("action")
+        if action == "status":
+            return {
+                "success": True,
+                "warm_pages": len(self.slots),
+                "running": self.running,
+                "queued_jobs": self.jobs.qsize(),
+            }
+        if action == "run":
+            return await self._submit_run(request)
+        return {"success": False, "error": f"Unknown action: {action}"}
+
+    async def _submit_run(self, request: dict) -> dict:
+        """Plan the run now (so the caller gets its test_run_id) and queue it."""
+        persona_set_id = request.get("persona_set_id")
+        prompts_id = request.get("prompts_id")
+        if not request.get("resume") and (not persona_set_id or not prompts_id):
+            return {"success": False, "error": "persona_set_id and prompts_id are required"}
+
+        options = resolve_run_options({
+            key: value for key, value in request.items() if key in DEFAULT_RUN_OPTIONS
+        })
+        options["workers"] = min(options["workers"], len(self.slots))
+        # The warm pages were opened with the daemon's profile, one tab each
+        options["browser_profile"] = self.browser_profile
+        options["tabs"] = 1
+        # Jobs are queued on the daemon's own warm pages, not leased from run_tasks
+        options["distributed"] = False
+        plan = await asyncio.to_thread(prepare_run, self.db, persona_set_id, prompts_id, options)
+        if not plan:
+            return {"success": False, "error": "Persona set, prompts or resumable run not found"}
+
+        run_info, batches, workers = plan
+        if batches:
+            self.jobs.put_nowait({"run_info": run_info, "batches": batches, "workers": workers})
+        return {
+            "success": True,
+            "test_run_id": run_info["test_run_id"],
+            "total_tests": run_info["total_tests"],
+            "remaining_tests": count_tasks(batches),
+            "queued_jobs": self.jobs.qsize(),
+        }
+
+    async def _job_loop(self) -> None:
+        """Run queued jobs one after another on the warm pages."""
+        while True:
+            job = await self.jobs.get()
+            self.running = job["run_info"]["test_run_id"]
+            try:
+                await self._run_job(job)
+            except Exception as e:
+                print(f"❌ Run {self.running} crashed: {e}")
+                traceback.print_exc()
+            finally:
+                self.running = None
+                self.jobs.task_done()
+
+    async def _run_job(self, job: dict) -> None:
+        run_info = job["run_info"]
+        print(f"\n🚀 Starting {run_info['test_run_id']} on {job['workers']} warm page(s)...")
+
+        slots = self.slots[:job["workers"]]
+        ready = await asyncio.gather(*(self._ensure_logged_in(slot) for slot in slots))
+        slots = [slot for slot, ok in zip(slots, ready) if ok]
+
+        await asyncio.to_thread(start_run_document, self.db, run_info)
+        results_collection = ResultWriter(self.db['test_results'], summaries=self.db['test_runs'],
+                                          **run_info['result_writer'])
+        batch_queue = queue_batches(job["batches"])
+        dispatcher = AccountDispatcher(self.session_pool.accounts)
+        stats = new_run_stats(run_info, dispatcher)
+        runner_slots = [
+            open_slot(slot["page"], run_info, reopen=self._reopener(slot), account=dispatcher.assign(slot["account"]),
+                      probe=self.memory_probe, worker_id=slot["worker_id"],
+                      log=make_logger(slot["worker_id"], len(slots)))
+            for slot in slots
+        ]
+
+        try:
+            await asyncio.gather(*(
+                drain_batch_queue([runner_slot], batch_queue, run_info, results_collection, stats,
+                                  log=make_logger(slot["worker_id"], len(slots)))
+                for slot, runner_slot in zip(slots, runner_slots)
+            ))
+        finally:
+            for runner_slot in runner_slots:
+                close_slot(runner_slot)
+            await asyncio.to_thread(results_collection.close)
+            await asyncio.to_thread(save_run_document, self.db, run_info, stats)
+
+        print_run_summary(run_info, stats, not_run=count_unrun_tasks(batch_queue))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep warm, logged-in browser pages and run GEO jobs on demand")
+    parser.add_argument("--pages", type=int, default=1,
+                        help="Number of warm logged-in pages (max workers per run, default: 1)")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on (default: %(default)s)")
+    parser.add_argument("--browser-profile", choices=BROWSER_PROFILES, default="default",
+                        help="Launch profile of the warm pages, as in run_from_db.py (default: %(default)s)")
+    args = parser.parse_args()
+
+    try:
+        daemon = RunnerDaemon(pages=args.pages, host=args.host, port=args.port, browser_profile=args.browser_profile)
+        asyncio.run(daemon.serve())
+    except KeyboardInterrupt:
+        print("\n👋 Runner daemon stopped")
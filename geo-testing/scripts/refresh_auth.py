@@ -1,22 +1,34 @@
-from playwright.sync_api import sync_playwright
+#!/usr/bin/env python3
+"""
+Refresh saved ChatGPT sessions in the session pool (storage/sessions/).
+
+Usage:
+    python scripts/refresh_auth.py            # Refresh states that are missing or close to expiry
+    python scripts/refresh_auth.py --force    # Refresh every state
+    python scripts/refresh_auth.py --manual   # Wait for you to finish 2FA/captcha before saving
+"""
 import os
-from dotenv import load_dotenv
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.session_pool import SessionPool, auth_cookie_expiry
+
+
+if __name__ == "__main__":
+    pool = SessionPool()
+    if not pool.accounts:
+        print("❌ Missing CHATGPT_EMAIL or CHATGPT_PASSWORD in .env")
+        sys.exit(1)
 
-load_dotenv()
+    force = "--force" in sys.argv
+    manual = "--manual" in sys.argv
+    for account in pool.accounts:
+        for path in pool.state_paths(account):
+            if force or pool.needs_refresh(path):
+                pool.refresh(account, path, manual=manual)
 
-with sync_playwright() as p:
-    browser = p.chromium.launch(headless=False)
-    context = browser.new_context(viewport={"width": 1280, "height": 720})
-    page = context.new_page()
-    
-    page.goto("https://chatgpt.com/")
-    page.get_by_test_id("login-button").click()
-    page.get_by_role("textbox", name="Email address").fill(os.getenv("CHATGPT_EMAIL"))
-    page.get_by_role("button", name="Continue", exact=True).click()
-    page.get_by_role("textbox", name="Password").fill(os.getenv("CHATGPT_PASSWORD"))
-    page.get_by_role("button", name="Continue", exact=True).click()
-    
-    input("Press Enter after completing any 2FA...")
-    
-    context.storage_state(path="storage/auth_state.json")
-    browser.close()
\ No newline at end of file
+            expiry = auth_cookie_expiry(path)
+            status = f"expires {datetime.fromtimestamp(expiry):%Y-%m-%d %H:%M}" if expiry else "❌ no valid session"
+            print(f"   {account['name']}: {path} ({status})")
@@ -8,7 +8,8 @@ from workflows.memory import clear_memory, set_persona
 from workflows.chat import send_prompt, extract_response
 
 def run_geo_tests():
-    db = Database()
+    db = Database(buffered=True)
+    db.ensure_indexes()
     
     # Load test data
     personas = list(Path("data/personas").glob("*.json"))
@@ -0,0 +1,36 @@
+from playwright.async_api import async_playwright
+from utils.browser_profile import context_options, launch_options
+
+async def launch_browser_with_auth(
+    storage_state_path: str = "storage/auth_state.json",
+    location: dict = None,
+    proxy: dict = None,
+    profile: str = "default"
+):
+    """
+    Launch browser with location/proxy override (asyncio version).
+    
+    Args:
+        location: {"latitude": 37.7749, "longitude": -122.4194} for SF
+        proxy: {"server": "http://proxy-server:port", "username": "user", "password": "pass"}
+        profile: "default" or "lean" (see utils/browser_profile.py)
+    """
+    playwright = await async_playwright().start()
+    
+    browser = await playwright.chromium.launch(**launch_options(profile, proxy=proxy))
+    
+    new_context_kwargs = {
+        "storage_state": storage_state_path,
+        "viewport": {"width": 1280, "height": 720},
+        "user_agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36",
+        **context_options(profile)
+    }
+    
+    if location:
+        new_context_kwargs["geolocation"] = location
+        new_context_kwargs["permissions"] = ["geolocation"]
+    
+    context = await browser.new_context(**new_context_kwargs)
+    page = await context.new_page()
+    
+    return playwright, browser, context, page
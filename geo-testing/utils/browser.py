@@ -1,9 +1,11 @@
 from playwright.sync_api import sync_playwright
+from utils.browser_profile import context_options, launch_options
 
 def launch_browser_with_auth(
     storage_state_path: str = "storage/auth_state.json",
     location: dict = None,
-    proxy: dict = None
+    proxy: dict = None,
+    profile: str = "default"
 ):
     """
     Launch browser with location/proxy override.
@@ -11,26 +13,24 @@ def launch_browser_with_auth(
     Args:
         location: {"latitude": 37.7749, "longitude": -122.4194} for SF
         proxy: {"server": "http://proxy-server:port", "username": "user", "password": "pass"}
+        profile: "default" or "lean" (see utils/browser_profile.py)
     """
     playwright = sync_playwright().start()
     
-    browser = playwright.chromium.launch(
-        headless=False,
-        args=['--disable-blink-features=AutomationControlled'],
-        proxy=proxy
-    )
+    browser = playwright.chromium.launch(**launch_options(profile, proxy=proxy))
     
-    context_options = {
+    new_context_kwargs = {
         "storage_state": storage_state_path,
         "viewport": {"width": 1280, "height": 720},
-        "user_agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
+        "user_agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36",
+        **context_options(profile)
     }
     
     if location:
-        context_options["geolocation"] = location
-        context_options["permissions"] = ["geolocation"]
+        new_context_kwargs["geolocation"] = location
+        new_context_kwargs["permissions"] = ["geolocation"]
     
-    context = browser.new_context(**context_options)
+    context = browser.new_context(**new_context_kwargs)
     page = context.new_page()
     
     return playwright, browser, context, page
\ No newline at end of file
@@ -3,11 +3,13 @@ from datetime import datetime
 from typing import Dict, List, Optional
 import os
 from dotenv import load_dotenv
+from utils.indexes import ensure_indexes
+from utils.result_writer import ResultWriter
 
 load_dotenv()
 
 class Database:
-    def __init__(self):
+    def __init__(self, buffered: bool = False):
         mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
         db_name = os.getenv("MONGODB_DATABASE", "geo_sundai")
         collection_name = os.getenv("MONGODB_COLLECTION", "test_results")
@@ -26,6 +28,19 @@ class Database:
         except Exception as e:
             print(f"❌ MongoDB connection failed: {e}")
             raise
+
+        # buffered: insert_test_result() only queues; batches are written in the background
+        # (call flush/close before exiting)
+        self.writer = ResultWriter(self.results) if buffered else None
+
+    def ensure_indexes(self):
+        """Create missing indexes (idempotent); test runners call it at startup."""
+        try:
+            ready = ensure_indexes(self.db, self.results.name)
+            print(f"   Indexes: {len(ready)} ready")
+        except Exception as e:
+            # e.g. a read-only user: queries still work, just slower
+            print(f"⚠️ Could not ensure indexes: {e}")
     
     def insert_test_result(self, data: Dict) -> str:
         """
@@ -46,8 +61,8 @@ class Database:
         if "analysis_flags" not in data:
             data["analysis_flags"] = self._compute_analysis_flags(data)
         
-        # Insert and return ID
-        result = self.results.insert_one(data)
+        # Insert (or queue, when buffered) and return ID
+        result = (self.writer or self.results).insert_one(data)
         inserted_id = str(result.inserted_id)
         
         print(f"   💾 Saved: {data.get('persona_id', 'unknown')} × {data.get('prompt_id', 'unknown')} → {inserted_id[:8]}...")
@@ -149,7 +164,30 @@ class Database:
             "geo_content_rate": with_geo_content / total_tests if total_tests > 0 else 0
         }
     
+    def get_latency_by_run(self, limit: int = 10) -> List[Dict]:
+        """Average per-stage latency (ms) of the most recent runs that recorded timings."""
+        from utils.timing import STAGES
+
+        group = {"_id": "$test_run_id", "tests": {"$sum": 1}, "started": {"$min": "$timestamp"}}
+        for stage in STAGES + ("total",):
+            group[f"{stage}_ms"] = {"$avg": f"$timings.{stage}_ms"}
+
+        pipeline = [
+            {"$match": {"timings": {"$exists": True}}},
+            {"$group": group},
+            {"$sort": {"started": -1}},
+            {"$limit": limit}
+        ]
+        return list(self.results.aggregate(pipeline))
+    
+    def flush(self):
+        """Write buffered test results now, e.g. before reading them back."""
+        if self.writer:
+            self.writer.flush()
+    
     def close(self):
-        """Close MongoDB connection."""
+        """Flush buffered results and close MongoDB connection."""
+        if self.writer:
+            self.writer.close()
         self.client.close()
         print("🔌 MongoDB connection closed")
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+MongoDB indexes for the GEO collections.
+
+ensure_indexes() creates the indexes behind every hot query (results of a
+run sorted by time, resume lookups, per-persona and per-prompt analytics,
+the persona set list, run documents, the job queue, task leases). It is
+idempotent: existing indexes are left alone, so the test runners, the Flask
+app and `python ensure_indexes.py` all call it at startup.
+
+check_query_plans() explains each hot query and reports the ones MongoDB
+still answers with a collection scan or an in-memory sort.
+"""
+from typing import Dict, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# Index builds that clash with an existing index of another name or options
+INDEX_CONFLICTS = (85, 86)  # IndexOptionsConflict, IndexKeySpecsConflict
+
+def index_specs(results_collection: str = "test_results") -> Dict[str, List[IndexModel]]:
+    """IndexModels per collection (test_results may be renamed with MONGODB_COLLECTION)."""
+    return {
+        results_collection: [
+            # /api/test-results: $or over the three ids, each branch sorted by timestamp
+            IndexModel([("test_run_id", ASCENDING), ("timestamp", DESCENDING)], name="test_run_id_timestamp"),
+            IndexModel([("persona_set_id", ASCENDING), ("timestamp", DESCENDING)], name="persona_set_id_timestamp"),
+            IndexModel([("prompts_id", ASCENDING), ("timestamp", DESCENDING)], name="prompts_id_timestamp"),
+            # Analytics: results of one persona (per prompt) and of one prompt (per persona)
+            IndexModel([("persona_id", ASCENDING), ("prompt_id", ASCENDING)], name="persona_id_prompt_id"),
+            IndexModel([("prompt_id", ASCENDING), ("persona_id", ASCENDING)], name="prompt_id_persona_id"),
+        ],
+        "personas": [
+            # /api/personas: latest persona sets first
+            IndexModel([("created_at", DESCENDING)], name="created_at"),
+        ],
+        "test_runs": [
+            IndexModel([("test_run_id", ASCENDING)], name="test_run_id", unique=True),
+            # Is any run behind a persona set's / prompt list's results still running?
+            IndexModel([("persona_set_id", ASCENDING)], name="persona_set_id"),
+            IndexModel([("prompts_id", ASCENDING)], name="prompts_id"),
+        ],
+        "runs": [
+            IndexModel([("job_id", ASCENDING)], name="job_id", unique=True),
+            # Job queue: oldest queued job first
+            IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        ],
+        "run_tasks": [
+            # Distributed runs: next open test of a run, persona by persona
+            IndexModel([("test_run_id", ASCENDING), ("status", ASCENDING), ("persona_idx", ASCENDING),
+                        ("prompt_position", ASCENDING)], name="test_run_id_status_persona_idx"),
+        ],
+        "analyses": [
+            IndexModel([("fingerprint", ASCENDING)], name="fingerprint", unique=True),
+            # Latest (stale) analysis while a run is still going
+            IndexModel([("test_run_id", ASCENDING), ("created_at", DESCENDING)], name="test_run_id_created_at"),
+        ],
+    }
+
+def ensure_indexes(db, results_collection: str = "test_results", log=print) -> List[str]:
+    """Create any missing index; returns the names of the indexes in place."""
+    ready = []
+    for collection, models in index_specs(results_collection).items():
+        for model in models:
+            name = model.document["name"]
+            try:
+                db[collection].create_indexes([model])
+                ready.append(name)
+            except OperationFailure as e:
+                if e.code not in INDEX_CONFLICTS:
+                    raise
+                # Same keys under another name (e.g. created by hand): the query is covered either way
+                log(f"   ⚠️ {collection}.{name} not created: {e.details.get('errmsg', e)}")
+    return ready
+
+def hot_queries(results_collection: str = "test_results") -> List[Dict]:
+    """The app's and scripts' frequent queries, with placeholder values."""
+    run_id = "run_00000000000000"
+    return [
+        {"name": "results of a run (/api/test-results)", "collection": results_collection,
+         "filter": {"$or": [{"persona_set_id": run_id}, {"prompts_id": run_id}, {"test_run_id": run_id}]},
+         "sort": [("timestamp", DESCENDING)]},
+        {"name": "resume lookup", "collection": results_collection, "filter": {"test_run_id": run_id}},
+        {"name": "results by persona", "collection": results_collection, "filter": {"persona_id": "persona"}},
+        {"name": "results by prompt", "collection": results_collection, "filter": {"prompt_id": "prompt"}},
+        {"name": "latest persona sets (/api/personas)", "collection": "personas", "filter": {},
+         "sort": [("created_at", DESCENDING)], "limit": 50},
+        {"name": "run document", "collection": "test_runs", "filter": {"test_run_id": run_id}},
+        {"name": "runs of a result set", "collection": "test_runs",
+         "filter": {"$or": [{"persona_set_id": run_id}, {"prompts_id": run_id}, {"test_run_id": run_id}]}},
+        {"name": "next queued job", "collection": "runs", "filter": {"status": "queued"},
+         "sort": [("created_at", ASCENDING)], "limit": 1},
+        {"name": "job status", "collection": "runs", "filter": {"job_id": "job_000000000000"}},
+        {"name": "next test to lease", "collection": "run_tasks",
+         "filter": {"test_run_id": run_id, "status": "pending"},
+         "sort": [("persona_idx", ASCENDING), ("prompt_position", ASCENDING)], "limit": 1},
+        {"name": "cached analysis", "collection": "analyses", "filter": {"fingerprint": "0" * 64}},
+        {"name": "latest analysis of a run", "collection": "analyses", "filter": {"test_run_id": run_id},
+         "sort": [("created_at", DESCENDING)], "limit": 1},
+    ]
+
+def _plan_stages(plan) -> List[str]:
+    """Every `stage` in an explain plan tree (classic and SBE layouts)."""
+    if isinstance(plan, list):
+        return [stage for item in plan for stage in _plan_stages(item)]
+    if not isinstance(plan, dict):
+        return []
+    stages = [plan["stage"]] if "stage" in plan else []
+    for value in plan.values():
+        if isinstance(value, (dict, list)):
+            stages += _plan_stages(value)
+    return stages
+
+def check_query_plans(db, results_collection: str = "test_results") -> List[Dict]:
+    """
+    Explain every hot query; returns [{"name", "collection", "stages", "problem"}]
+    where problem is "COLLSCAN", "in-memory SORT" or None.
+    """
+    report = []
+    for query in hot_queries(results_collection):
+        cursor = db[query["collection"]].find(query["filter"])
+        if query.get("sort"):
+            cursor = cursor.sort(query["sort"])
+        if query.get("limit"):
+            cursor = cursor.limit(query["limit"])
+        stages = _plan_stages(cursor.explain().get("queryPlanner", {}).get("winningPlan", {}))
+
+        problem = None
+        if "COLLSCAN" in stages:
+            problem = "COLLSCAN"
+        elif "SORT" in stages:
+            problem = "in-memory SORT"
+        report.append({"name": query["name"], "collection": query["collection"],
+                       "stages": stages, "problem": problem})
+    return report
+
+def print_query_plans(report: List[Dict]) -> None:
+    print(f"\n🔎 QUERY PLANS:")
+    for entry in report:
+        flag = f"❌ {entry['problem']}" if entry["problem"] else "✅"
+        print(f"   {flag:<18} {entry['collection']:<14} {entry['name']}  [{' → '.join(entry['stages'])}]")
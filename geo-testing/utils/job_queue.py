@@ -0,0 +1,315 @@
+"""
+Managed GEO run jobs.
+
+A JobQueue launches run_from_db.py processes (for the Flask app) and keeps a
+record of every job in the `runs` collection:
+
+    job_id, status: queued | running | done | failed | cancelled
+    command, persona_set_id, prompts_id, test_run_id, options
+    host, pid, exit_code, error, log_path
+    created_at, started_at, finished_at, cancel_requested
+
+At most `concurrency` jobs run at once per host; the others wait as queued
+and are admitted oldest first. Jobs are claimed with an atomic
+find_one_and_update, so several app processes can share the collection.
+
+Each job's stdout and stderr go straight to its log file under RUN_LOGS_DIR
+(no pipe through the app, so a job outlives an app restart and a chatty run
+never blocks). The file is opened for appending, which lets the dispatcher
+rotate it by size with copy-and-truncate while the job keeps writing.
+
+cancel() interrupts a running job with SIGINT, which lets run_from_db flush
+its buffered results and mark the run interrupted, and kills the process if
+it is still alive CANCEL_GRACE_S seconds later.
+
+After an app restart, jobs of this host whose process is still alive are
+adopted: they keep their concurrency slot and, once the pid is gone, finish
+as their test_runs document says.
+"""
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import threading
+import time
+import uuid
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+GEO_TESTING_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_CONCURRENCY = int(os.getenv("RUN_JOB_CONCURRENCY", "1"))
+RUN_LOGS_DIR = os.getenv("RUN_LOGS_DIR", os.path.join(GEO_TESTING_DIR, "data", "run_logs"))
+RUN_LOG_MAX_BYTES = int(os.getenv("RUN_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+RUN_LOG_BACKUPS = int(os.getenv("RUN_LOG_BACKUPS", "3"))
+
+CANCEL_GRACE_S = 30
+POLL_INTERVAL_S = 2  # How often queued jobs and cancel requests from other hosts are picked up
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+FINISHED_JOB_STATUSES = ("done", "failed", "cancelled")
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def rotate_log(path: str, max_bytes: int = RUN_LOG_MAX_BYTES, backups: int = RUN_LOG_BACKUPS) -> None:
+    """
+    Rotate a job's log once it exceeds max_bytes: shift path.1..N, copy the
+    log to path.1 and truncate it. The job appends to the same file throughout
+    (lines written between the copy and the truncate are lost).
+    """
+    try:
+        if os.path.getsize(path) < max_bytes:
+            return
+    except OSError:
+        return
+    for index in range(backups - 1, 0, -1):
+        if os.path.exists(f"{path}.{index}"):
+            os.replace(f"{path}.{index}", f"{path}.{index + 1}")
+    if backups:
+        shutil.copyfile(path, f"{path}.1")
+    with open(path, "r+b") as f:
+        f.truncate(0)
+
+class AdoptedProcess:
+    """A job process started by an earlier app process: signalled by pid and polled until it exits."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+
+    def alive(self) -> bool:
+        return pid_alive(self.pid)
+
+    def send_signal(self, sig: int) -> None:
+        try:
+            os.kill(self.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def kill(self) -> None:
+        self.send_signal(signal.SIGKILL)
+
+class JobQueue:
+    """Bounded pool of run_from_db processes backed by the `runs` collection."""
+
+    def __init__(self, db, cwd: str = GEO_TESTING_DIR, concurrency: int = DEFAULT_CONCURRENCY,
+                 logs_dir: str = RUN_LOGS_DIR, log=print):
+        self.runs = db["runs"]
+        self.test_runs = db["test_runs"]
+        self.cwd = cwd
+        self.concurrency = max(1, int(concurrency))
+        self.logs_dir = logs_dir
+        self.log = log
+        self.host = socket.gethostname()
+        self.processes = {}  # job_id -> Popen (or AdoptedProcess) of this host's running jobs
+        self.cancelling = {}  # job_id -> monotonic time SIGINT was sent
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self) -> "JobQueue":
+        """
+        Take over this host's jobs left by a restart, then start admitting queued jobs.
+        The runs indexes come from utils/indexes.py.
+        """
+        os.makedirs(self.logs_dir, exist_ok=True)
+        self._recover()
+        self._thread = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, command: List[str], **fields) -> Dict:
+        """Queue a command (run in `cwd`); fields such as test_run_id are stored on the job."""
+        job = {
+            "job_id": f"job_{uuid.uuid4().hex[:12]}",
+            "status": "queued",
+            "command": command,
+            **fields,
+            "created_at": datetime.utcnow(),
+        }
+        self.runs.insert_one(job)
+        job.pop("_id", None)
+        self._wake.set()
+        return job
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        job = self.runs.find_one({"job_id": job_id}, {"_id": 0})
+        if job and job["status"] == "queued":
+            job["queue_position"] = self.runs.count_documents(
+                {"status": "queued", "created_at": {"$lt": job["created_at"]}}) + 1
+        return job
+
+    def list_jobs(self, limit: int = 20) -> List[Dict]:
+        return list(self.runs.find({}, {"_id": 0}).sort("created_at", DESCENDING).limit(limit))
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Drop a queued job, or ask the host running it to interrupt it. Returns the job."""
+        now = datetime.utcnow()
+        job = self.runs.find_one_and_update(
+            {"job_id": job_id, "status": "queued"},
+            {"$set": {"status": "cancelled", "cancel_requested": now, "finished_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None:
+            self.runs.update_one({"job_id": job_id, "status": "running", "cancel_requested": None},
+                                 {"$set": {"cancel_requested": now}})
+            self._interrupt(job_id)
+        return self.status(job_id)
+
+    def log_tail(self, job_id: str, lines: int = 100) -> List[str]:
+        """The last lines of a job's current log file."""
+        path = os.path.join(self.logs_dir, f"{job_id}.log")
+        if not os.path.exists(path):
+            return []
+        with open(path, errors="replace") as f:
+            return [line.rstrip("\n") for line in deque(f, maxlen=lines)]
+
+    def _recover(self) -> None:
+        for job in self.runs.find({"host": self.host, "status": "running"}):
+            if job.get("pid") and pid_alive(job["pid"]):
+                # Started by an earlier app process and still going: it keeps its slot and is
+                # polled until it exits
+                with self._lock:
+                    self.processes[job["job_id"]] = AdoptedProcess(job["pid"])
+                self.log(f"⚠️ Job {job['job_id']} (pid {job['pid']}) is still running from before a restart")
+                continue
+            self.runs.update_one({"_id": job["_id"]}, {"$set": {
+                "status": "failed",
+                "error": "The app stopped while the job was running",
+                "finished_at": datetime.utcnow(),
+            }})
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            try:
+                self._reap_adopted()
+                self._admit()
+                self._check_cancellations()
+                self._rotate_logs()
+            except Exception as e:
+                self.log(f"⚠️ Job dispatcher error: {e}")
+            self._wake.wait(POLL_INTERVAL_S)
+            self._wake.clear()
+
+    def _admit(self) -> None:
+        while True:
+            with self._lock:
+                if len(self.processes) >= self.concurrency:
+                    return
+            job = self.runs.find_one_and_update(
+                {"status": "queued"},
+                {"$set": {"status": "running", "host": self.host, "started_at": datetime.utcnow()}},
+                sort=[("created_at", ASCENDING)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is None:
+                return
+            self._launch(job)
+
+    def _launch(self, job: Dict) -> None:
+        job_id = job["job_id"]
+        log_path = os.path.join(self.logs_dir, f"{job_id}.log")
+        try:
+            with open(log_path, "ab") as log_file:
+                process = subprocess.Popen(
+                    job["command"],
+                    cwd=self.cwd,
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT,
+                    stdin=subprocess.DEVNULL,
+                    env={**os.environ, "PYTHONUNBUFFERED": "1"},
+                )
+        except OSError as e:
+            self._finish(job_id, "failed", error=f"Could not start the job: {e}")
+            return
+
+        with self._lock:
+            self.processes[job_id] = process
+        self.runs.update_one({"job_id": job_id}, {"$set": {"pid": process.pid, "log_path": log_path}})
+        self.log(f"🚀 Job {job_id} started (pid {process.pid}), log: {log_path}")
+        threading.Thread(target=self._watch, args=(job_id, process),
+                         name=f"job-{job_id}", daemon=True).start()
+
+    def _watch(self, job_id: str, process: subprocess.Popen) -> None:
+        """Wait for the job to exit, then record the outcome."""
+        exit_code = process.wait()
+        with self._lock:
+            self.processes.pop(job_id, None)
+            cancelled = self.cancelling.pop(job_id, None) is not None
+
+        if cancelled:
+            self._finish(job_id, "cancelled", exit_code=exit_code)
+        elif exit_code == 0:
+            self._finish(job_id, "done", exit_code=exit_code)
+        else:
+            self._finish(job_id, "failed", exit_code=exit_code, error=f"Exited with code {exit_code}")
+        self._wake.set()
+
+    def _reap_adopted(self) -> None:
+        """Finish adopted jobs whose process is gone; their run document tells how they ended."""
+        with self._lock:
+            exited = [job_id for job_id, process in self.processes.items()
+                      if isinstance(process, AdoptedProcess) and not process.alive()]
+        for job_id in exited:
+            with self._lock:
+                self.processes.pop(job_id, None)
+                cancelled = self.cancelling.pop(job_id, None) is not None
+            job = self.runs.find_one({"job_id": job_id}, {"test_run_id": 1, "cancel_requested": 1}) or {}
+            run = self.test_runs.find_one({"test_run_id": job.get("test_run_id")}, {"status": 1}) or {}
+            if cancelled or job.get("cancel_requested"):
+                self._finish(job_id, "cancelled")
+            elif run.get("status") == "complete":
+                self._finish(job_id, "done")
+            else:
+                self._finish(job_id, "failed",
+                             error=f"Exited after an app restart, run {run.get('status') or 'not started'}")
+
+    def _rotate_logs(self) -> None:
+        with self._lock:
+            running = list(self.processes)
+        for job_id in running:
+            rotate_log(os.path.join(self.logs_dir, f"{job_id}.log"))
+
+    def _finish(self, job_id: str, status: str, **fields) -> None:
+        self.runs.update_one({"job_id": job_id}, {"$set": {
+            "status": status,
+            **fields,
+            "finished_at": datetime.utcnow(),
+        }})
+        self.log(f"{'✅' if status == 'done' else '⚠️'} Job {job_id} {status}")
+
+    def _interrupt(self, job_id: str) -> None:
+        with self._lock:
+            process = self.processes.get(job_id)
+            if process is None or job_id in self.cancelling:
+                return
+            self.cancelling[job_id] = time.monotonic()
+        # Like Ctrl+C: run_from_db flushes its results and marks the run interrupted
+        process.send_signal(signal.SIGINT)
+
+    def _check_cancellations(self) -> None:
+        with self._lock:
+            running = list(self.processes)
+            overdue = [job_id for job_id, since in self.cancelling.items()
+                       if time.monotonic() - since > CANCEL_GRACE_S]
+        if running:
+            # Cancel requests that reached the runs collection through another app process
+            requested = self.runs.find(
+                {"job_id": {"$in": running}, "cancel_requested": {"$ne": None}}, {"job_id": 1})
+            for job in requested:
+                self._interrupt(job["job_id"])
+        for job_id in overdue:
+            with self._lock:
+                process = self.processes.get(job_id)
+            if process is not None:
+                self.log(f"⚠️ Job {job_id} ignored the interrupt for {CANCEL_GRACE_S}s, killing it")
+                process.kill()
@@ -0,0 +1,86 @@
+"""
+Browser memory probes for long runs.
+
+A page that stays open for hundreds of tests keeps growing (DOM, JS heap,
+conversation history), so runners recycle their context after a number of
+tests or when the browser's RSS passes a threshold. The probes here read the
+browser's process ids over CDP (SystemInfo.getProcessInfo) and sum their RSS
+with psutil when installed, else from /proc on Linux. Probes return None
+where memory can't be read, and the RSS guard is then skipped.
+"""
+from typing import List, Optional
+import os
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+READ_ERRORS = (OSError, ValueError, IndexError) + ((psutil.Error,) if psutil is not None else ())
+
+# Below this many tests on a context, a high RSS alone doesn't recycle it again
+MIN_TESTS_BEFORE_RSS_RECYCLE = 3
+
+def process_rss_mb(pids: List[int]) -> Optional[float]:
+    """Summed resident memory of `pids` in MB, or None if it can't be read on this platform."""
+    total = None
+    for pid in pids:
+        try:
+            if psutil is not None:
+                rss = psutil.Process(pid).memory_info().rss
+            else:
+                with open(f"/proc/{pid}/statm") as f:
+                    rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except READ_ERRORS:
+            # Process exited between listing and reading (or no /proc here)
+            continue
+        total = (total or 0) + rss
+    return round(total / 1024 / 1024, 1) if total is not None else None
+
+def _pids(process_info: dict) -> List[int]:
+    return [process["id"] for process in process_info.get("processInfo", []) if process.get("id")]
+
+class BrowserMemoryProbe:
+    """RSS of one (sync) Chromium browser and all of its child processes."""
+
+    def __init__(self, browser):
+        try:
+            self.session = browser.new_browser_cdp_session()
+        except Exception:
+            # Not Chromium, or CDP unavailable: memory is simply not reported
+            self.session = None
+
+    def rss_mb(self) -> Optional[float]:
+        if self.session is None:
+            return None
+        try:
+            return process_rss_mb(_pids(self.session.send("SystemInfo.getProcessInfo")))
+        except Exception:
+            return None
+
+class AsyncBrowserMemoryProbe:
+    """Async counterpart of BrowserMemoryProbe; create it with `await AsyncBrowserMemoryProbe.open(browser)`."""
+
+    def __init__(self, session):
+        self.session = session
+
+    @classmethod
+    async def open(cls, browser) -> "AsyncBrowserMemoryProbe":
+        try:
+            return cls(await browser.new_browser_cdp_session())
+        except Exception:
+            return cls(None)
+
+    async def rss_mb(self) -> Optional[float]:
+        if self.session is None:
+            return None
+        try:
+            return process_rss_mb(_pids(await self.session.send("SystemInfo.getProcessInfo")))
+        except Exception:
+            return None
+
+# Page-level JS heap (Chromium's non-standard performance.memory)
+JS_HEAP_SCRIPT = "() => performance.memory ? performance.memory.usedJSHeapSize : null"
+
+def heap_mb(used_bytes) -> Optional[float]:
+    return round(used_bytes / 1024 / 1024, 1) if used_bytes else None
@@ -0,0 +1,117 @@
+"""
+Per-account rate limiting for GEO runs.
+
+Every ChatGPT account gets a token bucket sized to the rate it can sustain
+(`tests_per_minute`, with a short `burst`). Workers are spread across the
+accounts of the session pool and reserve a token before each prompt they
+send, so adding accounts adds throughput without pushing any single account
+past its limit.
+"""
+from typing import Dict, List, Optional
+import os
+import threading
+import time
+
+DEFAULT_TESTS_PER_MINUTE = float(os.getenv("ACCOUNT_TESTS_PER_MINUTE", "6"))
+DEFAULT_BURST = int(os.getenv("ACCOUNT_BURST", "2"))
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate_per_minute`, holding at most `burst` tokens."""
+
+    def __init__(self, rate_per_minute: float = DEFAULT_TESTS_PER_MINUTE, burst: int = DEFAULT_BURST):
+        self.rate = max(rate_per_minute, 0.001) / 60.0  # tokens per second
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token and return how many seconds the caller must wait before using it.
+
+        The balance may go negative, so concurrent callers queue up behind each
+        other instead of all waking at the same moment. Sync callers time.sleep()
+        the delay, async callers asyncio.sleep() it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class AccountDispatcher:
+    """
+    Assigns workers to accounts and meters each account's tests through its bucket.
+
+    Keeps per-account dispatch stats (workers, dispatched, successful, failed,
+    throttled seconds) for the run document.
+    """
+
+    def __init__(self, accounts: List[Dict]):
+        self.accounts = accounts
+        self.buckets = {
+            account["name"]: TokenBucket(
+                float(account.get("tests_per_minute", DEFAULT_TESTS_PER_MINUTE)),
+                int(account.get("burst", DEFAULT_BURST)),
+            )
+            for account in accounts
+        }
+        self.stats = {
+            account["name"]: {
+                "tests_per_minute": float(account.get("tests_per_minute", DEFAULT_TESTS_PER_MINUTE)),
+                "burst": int(account.get("burst", DEFAULT_BURST)),
+                "workers": 0,
+                "dispatched": 0,
+                "successful": 0,
+                "failed": 0,
+                "throttled_s": 0.0,
+            }
+            for account in accounts
+        }
+        self._lock = threading.Lock()
+
+    def assign(self, account_name: str = None) -> Optional[str]:
+        """
+        Register a worker on `account_name`, or on the account serving the fewest
+        workers per unit of rate when no account is given.
+        """
+        if not self.accounts:
+            return None
+        with self._lock:
+            name = account_name or min(
+                (account["name"] for account in self.accounts),
+                key=lambda name: self.stats[name]["workers"] / self.stats[name]["tests_per_minute"],
+            )
+            self.stats[name]["workers"] += 1
+            return name
+
+    def reserve(self, account_name: str) -> float:
+        """Reserve a send slot for `account_name`; returns the seconds to wait first."""
+        delay = self.buckets[account_name].reserve()
+        with self._lock:
+            self.stats[account_name]["dispatched"] += 1
+            self.stats[account_name]["throttled_s"] += delay
+        return delay
+
+    def record(self, account_name: str, succeeded: bool) -> None:
+        with self._lock:
+            self.stats[account_name]["successful" if succeeded else "failed"] += 1
+
+    def to_doc(self) -> Dict[str, Dict]:
+        """Per-account dispatch stats, ready to $set on the run document."""
+        with self._lock:
+            return {
+                name: {**entry, "throttled_s": round(entry["throttled_s"], 1)}
+                for name, entry in self.stats.items()
+            }
+
+def print_dispatch_stats(dispatch: Dict[str, Dict]) -> None:
+    """Print AccountDispatcher.to_doc() as a per-account table."""
+    if not dispatch:
+        return
+    print(f"\n👥 DISPATCH BY ACCOUNT:")
+    print(f"   {'account':<16}{'rate/min':>9}{'workers':>9}{'sent':>7}{'ok':>6}{'failed':>8}{'throttled':>11}")
+    for name, entry in dispatch.items():
+        print(f"   {name:<16}{entry['tests_per_minute']:>9g}{entry['workers']:>9}{entry['dispatched']:>7}"
+              f"{entry['successful']:>6}{entry['failed']:>8}{entry['throttled_s']:>10.0f}s")
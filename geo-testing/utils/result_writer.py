@@ -0,0 +1,182 @@
+"""
+Buffered writes of test results to MongoDB.
+
+A ResultWriter stands in for the test_results collection: `insert_one()`
+assigns the document's _id and appends it to a buffer, and a background
+thread flushes the buffer with one `insert_many(ordered=False)` once it holds
+`batch_size` documents, every `flush_interval_s` seconds, and on close(). The
+Atlas round trip therefore never sits between a browser and its next prompt.
+
+With a `summaries` collection (test_runs), every flushed batch also updates
+the live summary of its run (see utils/run_summary.py); record_failure()
+queues the tallies of tests that failed for good.
+
+Failed flushes are retried on the next interval. Documents that still can't
+be written when the writer closes are saved as JSON lines under
+UNSAVED_RESULTS_DIR, so no answer is lost to an outage.
+"""
+from datetime import datetime
+from typing import Dict, List
+import os
+import threading
+import time
+from bson import ObjectId, json_util
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError, PyMongoError
+from pymongo.results import InsertOneResult
+from utils.run_summary import summary_updates
+
+DEFAULT_BATCH_SIZE = int(os.getenv("RESULT_BATCH_SIZE", "20"))
+DEFAULT_FLUSH_INTERVAL_S = float(os.getenv("RESULT_FLUSH_INTERVAL_S", "5"))
+# "1" (primary acknowledged), "majority", or "0" (fire and forget)
+DEFAULT_WRITE_CONCERN = os.getenv("RESULT_WRITE_CONCERN", "1")
+
+UNSAVED_RESULTS_DIR = "data/unsaved_results"
+
+DUPLICATE_KEY = 11000
+
+def parse_write_concern(value) -> WriteConcern:
+    """WriteConcern for "majority", a node count such as "1", or "0" (unacknowledged)."""
+    value = str(value).strip()
+    if value.isdigit():
+        return WriteConcern(w=int(value))
+    if value == "majority":
+        return WriteConcern(w="majority")
+    raise ValueError(f"write concern must be a number or 'majority', got {value!r}")
+
+class ResultWriter:
+    """Thread-safe buffered writer with the `insert_one()` interface of a collection."""
+
+    def __init__(self, collection, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval_s: float = DEFAULT_FLUSH_INTERVAL_S,
+                 write_concern: str = DEFAULT_WRITE_CONCERN, summaries=None, log=print):
+        self.write_concern = parse_write_concern(write_concern)
+        self.collection = collection.with_options(write_concern=self.write_concern)
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval_s = max(0.1, float(flush_interval_s))
+        self.summaries = summaries
+        self.log = log
+        self.buffer = []
+        self.failures = []
+        self.closed = False
+        self.stats = {"written": 0, "flushes": 0, "failed_flushes": 0, "unsaved": 0}
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._flush_loop, name="result-writer", daemon=True)
+        self._thread.start()
+
+    def insert_one(self, document: Dict) -> InsertOneResult:
+        """Queue a document; its _id is assigned here, so callers can log it right away."""
+        document.setdefault("_id", ObjectId())
+        with self._cond:
+            if self.closed:
+                raise RuntimeError("ResultWriter is closed")
+            self.buffer.append(document)
+            if len(self.buffer) >= self.batch_size:
+                self._cond.notify()
+        return InsertOneResult(document["_id"], self.write_concern.acknowledged)
+
+    def record_failure(self, entry: Dict) -> None:
+        """Queue a failed test for the run summary (see run_summary.failure_entry)."""
+        with self._cond:
+            self.failures.append(entry)
+
+    def flush(self) -> None:
+        """Write everything buffered so far, in the calling thread."""
+        with self._cond:
+            batch, self.buffer = self.buffer, []
+            failures, self.failures = self.failures, []
+        self._write(batch, failures)
+
+    def close(self) -> None:
+        """Flush what is left and stop the background thread; unwritable documents are saved to disk."""
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+        with self._cond:
+            leftover, self.buffer = self.buffer, []
+        if leftover:
+            self._save_unsaved(leftover)
+        if self.stats['flushes']:
+            self.log(f"💾 Result writer: {self.stats['written']} results in {self.stats['flushes']} batch(es)"
+                     + (f", {self.stats['unsaved']} saved to {UNSAVED_RESULTS_DIR}" if self.stats['unsaved'] else ""))
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval_s
+                while not self.closed and len(self.buffer) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self.buffer = self.buffer, []
+                failures, self.failures = self.failures, []
+                closing = self.closed
+            self._write(batch, failures)
+            if closing:
+                return
+
+    def _write(self, batch: List[Dict], failures: List[Dict] = ()) -> None:
+        if not batch and not failures:
+            return
+        with self._write_lock:
+            retry, rejected = [], []
+            if not batch:
+                self._update_summaries([], failures)
+                return
+            try:
+                self.collection.insert_many(batch, ordered=False)
+                written = len(batch)
+            except BulkWriteError as e:
+                # ordered=False: everything else in the batch was still written
+                written = e.details.get("nInserted", 0)
+                for error in e.details.get("writeErrors", []):
+                    if error.get("code") == DUPLICATE_KEY:
+                        # Written by an earlier flush whose reply was lost
+                        written += 1
+                    else:
+                        rejected.append(batch[error["index"]])
+                        self.log(f"   ⚠️ MongoDB rejected a result: {error.get('errmsg')}")
+            except PyMongoError as e:
+                written = 0
+                retry = batch
+                self.log(f"   ⚠️ Could not write {len(batch)} result(s) to MongoDB, retrying later: {e}")
+
+            self.stats["written"] += written
+            if written:
+                self.stats["flushes"] += 1
+            if retry or rejected:
+                self.stats["failed_flushes"] += 1
+            if rejected:
+                self._save_unsaved(rejected)
+            if retry:
+                with self._cond:
+                    self.buffer[:0] = retry
+            # Duplicates count too: their earlier flush failed before updating the summary
+            unwritten = {id(document) for document in retry + rejected}
+            self._update_summaries([document for document in batch if id(document) not in unwritten], failures)
+
+    def _update_summaries(self, written: List[Dict], failures: List[Dict]) -> None:
+        if self.summaries is None:
+            return
+        updates = summary_updates(written, failures)
+        if not updates:
+            return
+        try:
+            self.summaries.bulk_write(updates, ordered=False)
+        except PyMongoError as e:
+            self.log(f"   ⚠️ Could not update the run summary: {e}")
+
+    def _save_unsaved(self, documents: List[Dict]) -> None:
+        os.makedirs(UNSAVED_RESULTS_DIR, exist_ok=True)
+        path = os.path.join(UNSAVED_RESULTS_DIR, f"results_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.jsonl")
+        with open(path, "a") as f:
+            for document in documents:
+                f.write(json_util.dumps(document) + "\n")
+        self.stats["unsaved"] += len(documents)
+        self.log(f"   💾 {len(documents)} unsaved result(s) written to {path}")
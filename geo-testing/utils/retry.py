@@ -0,0 +1,102 @@
+"""
+Failure policy for the browser runner.
+
+- Per-stage timeouts: each stage bounds its locator waits via the page's
+  default timeout instead of Playwright's 30 s default.
+- Bounded retries with jittered exponential backoff: a failed test is retried
+  in a fresh chat, a failed persona setup is redone.
+- Recycling: after repeated consecutive failures a worker replaces its
+  context/page (see run_from_db.recycle_slot).
+- Circuit breaker: when the recent failure rate spikes, every worker of the
+  run pauses for a cooldown that grows while the failures continue.
+"""
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+import random
+import threading
+import time
+
+DEFAULT_RETRY_POLICY = {
+    "test_attempts": 3,              # Tries per test, each in a fresh chat
+    "setup_attempts": 2,             # Tries per persona setup
+    "backoff_base_s": 2.0,           # First retry waits ~2 s, then 4 s, 8 s, ...
+    "backoff_max_s": 30.0,
+    "recycle_after_failures": 3,     # Consecutive failed attempts before the context is replaced
+    "breaker_window": 10,            # Recent attempts the breaker looks at
+    "breaker_min_attempts": 5,
+    "breaker_failure_rate": 0.6,
+    "breaker_cooldown_s": 60.0,      # Doubles on every consecutive trip
+    "breaker_max_cooldown_s": 600.0,
+    # Locator timeouts per stage (waiting for the answer uses the run's response timeout)
+    "stage_timeouts_ms": {
+        "clear_memory": 10000,
+        "set_persona": 15000,
+        "new_chat": 15000,
+        "send": 10000,
+        "extract": 15000,
+    },
+}
+
+def build_retry_policy(test_attempts: int = None) -> Dict:
+    """Copy of DEFAULT_RETRY_POLICY, with the run's test_attempts if given."""
+    policy = {**DEFAULT_RETRY_POLICY, "stage_timeouts_ms": dict(DEFAULT_RETRY_POLICY["stage_timeouts_ms"])}
+    if test_attempts is not None:
+        policy["test_attempts"] = max(1, int(test_attempts))
+    return policy
+
+def backoff_delay(attempt: int, policy: Dict) -> float:
+    """Seconds to wait after failed attempt number `attempt` (1-based), with ±50% jitter."""
+    delay = min(policy["backoff_max_s"], policy["backoff_base_s"] * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.5)
+
+@contextmanager
+def bounded_stage(page, timer, stage: str, policy: Dict):
+    """Time a stage and cap its locator waits at the policy's timeout for that stage."""
+    timeout = policy["stage_timeouts_ms"].get(stage)
+    if timeout:
+        page.set_default_timeout(timeout)
+    with timer.span(stage):
+        yield
+
+class CircuitBreaker:
+    """
+    Shared by every worker of a run. record() each attempt's outcome; while the
+    breaker is open, remaining_pause() tells workers how long to hold off.
+    """
+
+    def __init__(self, policy: Dict = None):
+        self.policy = policy or DEFAULT_RETRY_POLICY
+        self.recent = deque(maxlen=self.policy["breaker_window"])
+        self.open_until = 0.0
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def record(self, succeeded: bool) -> Optional[float]:
+        """Record an attempt; returns the cooldown (s) if this outcome tripped the breaker."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.open_until:
+                return None
+
+            self.recent.append(succeeded)
+            if len(self.recent) < self.policy["breaker_min_attempts"]:
+                return None
+
+            failure_rate = self.recent.count(False) / len(self.recent)
+            if failure_rate < self.policy["breaker_failure_rate"]:
+                # Healthy again, the next trip starts from the base cooldown
+                self.trips = 0
+                return None
+
+            cooldown = min(self.policy["breaker_max_cooldown_s"],
+                           self.policy["breaker_cooldown_s"] * 2 ** self.trips)
+            self.trips += 1
+            self.open_until = now + cooldown
+            self.recent.clear()
+            return cooldown
+
+    def remaining_pause(self) -> float:
+        """Seconds left before workers may send again (0 when the breaker is closed)."""
+        with self._lock:
+            return max(0.0, self.open_until - time.monotonic())
@@ -0,0 +1,165 @@
+"""
+Live run summaries in the test_runs collection.
+
+Each run's test_runs document carries counters that are kept up to date with
+atomic `$inc`/`$set` updates as results are written, so progress and stats
+reads are a single find_one no matter how many results the run has:
+
+    status:    running | complete | interrupted
+    counts:    {done, failed, with_citations, brand_mentioned}
+    personas:  {"<persona_id>": {name, tests, failed, with_citations, brand_mentioned}}
+    prompts:   {"<prompt_id>": {prompt, tests, failed, with_citations, brand_mentioned}}
+    current:   {persona, prompt, test_number} of the latest result
+    started_at, last_result_at, finished_at
+    progress_base: results already saved when the run (re)started
+
+ResultWriter applies the updates for every batch it flushes (one update per
+run per batch); run_from_db sets the status when a run starts and ends.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List
+import os
+from pymongo import UpdateOne
+
+SUMMARY_COUNTERS = ("done", "failed", "with_citations", "brand_mentioned")
+
+FINISHED_STATUSES = ("complete", "interrupted")
+
+def new_test_run_id() -> str:
+    """A fresh run ID: UTC timestamp plus a random suffix, as runs can start within the same second."""
+    return f"run_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{os.urandom(2).hex()}"
+
+def summary_key(value) -> str:
+    """Persona/prompt id as a field name (dots and dollars are not allowed in keys)."""
+    return str(value).replace(".", "_").replace("$", "_")
+
+def summary_updates(results: List[Dict], failures: List[Dict] = ()) -> List[UpdateOne]:
+    """
+    One upserting UpdateOne per run for a batch of written test_results documents and
+    failed tests ({test_run_id, persona_id, persona_name, prompt_id, prompt_text}).
+    """
+    runs = {}
+
+    def run_update(test_run_id):
+        return runs.setdefault(test_run_id, {"$inc": Counter(), "$set": {}})
+
+    for result in results:
+        if not result.get("test_run_id"):
+            continue
+        update = run_update(result["test_run_id"])
+        persona = f"personas.{summary_key(result.get('persona_id'))}"
+        prompt = f"prompts.{summary_key(result.get('prompt_id'))}"
+        persona_name = (result.get("persona_details") or {}).get("name")
+        prompt_text = (result.get("prompt_details") or {}).get("prompt")
+
+        for scope in ("counts", persona, prompt):
+            update["$inc"][f"{scope}.done" if scope == "counts" else f"{scope}.tests"] += 1
+            update["$inc"][f"{scope}.with_citations"] += bool(result.get("has_citations"))
+            update["$inc"][f"{scope}.brand_mentioned"] += bool(result.get("brand_mentioned"))
+        update["$set"][f"{persona}.name"] = persona_name
+        update["$set"][f"{prompt}.prompt"] = prompt_text
+        update["$set"]["current"] = {
+            "persona": persona_name,
+            "prompt": prompt_text,
+            "test_number": result.get("test_number"),
+        }
+        update["$set"]["last_result_at"] = result.get("timestamp") or datetime.utcnow()
+
+    for failure in failures:
+        update = run_update(failure["test_run_id"])
+        persona = f"personas.{summary_key(failure['persona_id'])}"
+        prompt = f"prompts.{summary_key(failure['prompt_id'])}"
+        for scope in ("counts", persona, prompt):
+            update["$inc"][f"{scope}.failed"] += 1
+        update["$set"][f"{persona}.name"] = failure.get("persona_name")
+        update["$set"][f"{prompt}.prompt"] = failure.get("prompt_text")
+
+    return [
+        UpdateOne(
+            {"test_run_id": test_run_id},
+            {
+                # Zero increments still create the fields, so every tally has all counters
+                "$inc": dict(update["$inc"]),
+                "$set": update["$set"],
+                "$setOnInsert": {"created_at": datetime.utcnow()},
+            },
+            upsert=True,
+        )
+        for test_run_id, update in runs.items()
+    ]
+
+def failure_entry(task: dict, run_info: dict) -> Dict:
+    """The summary record of a test that failed for good."""
+    return {
+        "test_run_id": run_info["test_run_id"],
+        "persona_id": task["persona_idx"],
+        "persona_name": task["persona"].get("name"),
+        "prompt_id": task["prompt_idx"],
+        "prompt_text": task["prompt"].get("prompt"),
+    }
+
+def rate_stats(tests: int, with_citations: int, brand_mentioned: int) -> Dict:
+    """/api/test-results style stats from result counters."""
+    return {
+        "total_tests": tests,
+        "with_citations": with_citations,
+        "brand_mentioned": brand_mentioned,
+        "brand_mention_rate": brand_mentioned / tests if tests > 0 else 0,
+        "citation_rate": with_citations / tests if tests > 0 else 0,
+    }
+
+def summary_stats(summary: Dict) -> Dict:
+    """/api/test-results style stats from a run summary's counters."""
+    counts = {counter: (summary.get("counts") or {}).get(counter, 0) for counter in SUMMARY_COUNTERS}
+    return rate_stats(counts["done"], counts["with_citations"], counts["brand_mentioned"])
+
+def summary_breakdowns(summary: Dict) -> Dict[str, List[Dict]]:
+    """
+    Per-persona and per-prompt counters of a run summary:
+    {"personas": [{name, tests, with_citations, brand_mentioned}], "prompts": [{prompt, ...}]}.
+    Entries with only failed tests are left out.
+    """
+    breakdowns = {}
+    for scope, label in (("personas", "name"), ("prompts", "prompt")):
+        breakdowns[scope] = [
+            {
+                label: tally.get(label) or "Unknown",
+                "tests": tally.get("tests", 0),
+                "with_citations": tally.get("with_citations", 0),
+                "brand_mentioned": tally.get("brand_mentioned", 0),
+            }
+            for tally in (summary.get(scope) or {}).values()
+            if tally.get("tests")
+        ]
+    return breakdowns
+
+def run_progress(summary: Dict, now: datetime = None) -> Dict:
+    """
+    Progress counters of a run summary, with an ETA extrapolated from the pace
+    of the current session (None until its first test is done).
+    """
+    counts = summary.get("counts") or {}
+    done, failed = counts.get("done", 0), counts.get("failed", 0)
+    total = summary.get("total_tests", 0)
+    remaining = max(0, total - done - failed)
+
+    eta_seconds = None
+    started_at = summary.get("started_at")
+    tried = done + failed - summary.get("progress_base", 0)
+    if summary.get("status") == "running" and started_at and tried > 0 and remaining:
+        elapsed = ((now or datetime.utcnow()) - started_at).total_seconds()
+        eta_seconds = round(remaining * elapsed / tried)
+
+    return {
+        "test_run_id": summary.get("test_run_id"),
+        "status": summary.get("status"),
+        "done": done,
+        "failed": failed,
+        "total": total,
+        "remaining": remaining,
+        "current": summary.get("current"),
+        "started_at": started_at,
+        "last_result_at": summary.get("last_result_at"),
+        "eta_seconds": eta_seconds,
+    }
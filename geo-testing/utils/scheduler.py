@@ -0,0 +1,71 @@
+import random
+from typing import Dict, List, Optional, Set, Tuple
+
+def plan_persona_major(
+    personas: List[Dict],
+    prompts: List[Dict],
+    shuffle_prompts: bool = False,
+    seed: Optional[int] = None
+) -> List[Dict]:
+    """
+    Plan a run persona-major: one batch per persona holding all of its prompts.
+
+    A runner sets each persona up once (clear memory + set persona) and then
+    fires every prompt of the batch in a fresh chat, so persona setup happens
+    P times instead of P × Q times.
+
+    Args:
+        shuffle_prompts: Randomize prompt order within each persona to avoid ordering bias
+        seed: Seed for the shuffle so a run's order can be reproduced
+
+    Returns:
+        List of {"persona_idx", "persona", "tasks"} batches. Each task carries the
+        1-based persona/prompt indexes, its test_number and its prompt_position
+        within the batch.
+    """
+    rng = random.Random(seed)
+    batches = []
+    test_number = 0
+
+    for persona_idx, persona in enumerate(personas, 1):
+        prompt_order = list(enumerate(prompts, 1))
+        if shuffle_prompts:
+            rng.shuffle(prompt_order)
+
+        tasks = []
+        for position, (prompt_idx, prompt) in enumerate(prompt_order, 1):
+            test_number += 1
+            tasks.append({
+                "test_number": test_number,
+                "persona_idx": persona_idx,
+                "persona": persona,
+                "prompt_idx": prompt_idx,
+                "prompt": prompt,
+                "prompt_position": position,
+            })
+
+        batches.append({
+            "persona_idx": persona_idx,
+            "persona": persona,
+            "tasks": tasks,
+        })
+
+    return batches
+
+def count_tasks(batches: List[Dict]) -> int:
+    """Total number of tests across persona batches."""
+    return sum(len(batch["tasks"]) for batch in batches)
+
+def skip_completed(batches: List[Dict], completed: Set[Tuple[int, int]]) -> List[Dict]:
+    """
+    Drop tasks whose (persona_idx, prompt_idx) pair already has a result.
+
+    Used to resume an interrupted run: remaining tasks keep their test_number,
+    and personas with nothing left are dropped entirely.
+    """
+    remaining = []
+    for batch in batches:
+        tasks = [task for task in batch["tasks"] if (task["persona_idx"], task["prompt_idx"]) not in completed]
+        if tasks:
+            remaining.append({**batch, "tasks": tasks})
+    return remaining
@@ -0,0 +1,281 @@
+"""
+Pool of saved ChatGPT sessions (Playwright storage states).
+
+Runners check out a ready storage state and open their context with it, so
+the credential login flow stays out of the hot path. States are checked
+cheaply by auth cookie expiry and refreshed proactively by a background
+thread before they expire. Whether a state is actually logged in is seen on
+the runner's own first page: a rejected state is marked invalid there and
+replaced by the runner's credential login (run_from_db.start_session).
+"""
+from playwright.sync_api import sync_playwright
+from typing import Dict, List, Optional
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SESSIONS_DIR = "storage/sessions"
+LEGACY_AUTH_STATE = "storage/auth_state.json"
+
+# Extra accounts beyond the .env one (keep out of git, it holds passwords)
+ACCOUNTS_FILE = os.getenv("CHATGPT_ACCOUNTS_FILE", "storage/accounts.json")
+
+# Cookie that carries the ChatGPT login
+AUTH_COOKIE_PREFIX = "__Secure-next-auth.session-token"
+
+# Refresh a state when its auth cookie expires within this window
+REFRESH_MARGIN_SECONDS = 6 * 60 * 60
+
+def load_accounts_from_env() -> List[Dict]:
+    """
+    Accounts to run tests with: the CHATGPT_EMAIL / CHATGPT_PASSWORD account from
+    .env (named "default"), plus any listed in the ACCOUNTS_FILE JSON:
+
+        [{"name": "alt1", "email": "...", "password": "...", "tests_per_minute": 4, "burst": 2}]
+
+    tests_per_minute / burst are optional (see utils/rate_limit.py).
+    """
+    accounts = []
+    email = os.getenv("CHATGPT_EMAIL")
+    password = os.getenv("CHATGPT_PASSWORD")
+    if email and password:
+        accounts.append({"name": "default", "email": email, "password": password})
+
+    if os.path.exists(ACCOUNTS_FILE):
+        with open(ACCOUNTS_FILE) as f:
+            for account in json.load(f):
+                if any(existing["name"] == account["name"] for existing in accounts):
+                    raise ValueError(f"Duplicate account name in {ACCOUNTS_FILE}: {account['name']}")
+                accounts.append(account)
+    return accounts
+
+def account_slug(account: Dict) -> str:
+    """Filesystem-safe directory name for an account."""
+    return re.sub(r"[^a-z0-9]+", "_", account["name"].lower()).strip("_") or "default"
+
+def persona_strategy_path(account_name: str, storage_dir: str = SESSIONS_DIR) -> str:
+    return os.path.join(storage_dir, account_slug({"name": account_name}), "persona_strategy")
+
+def last_persona_strategy(account_name: str, storage_dir: str = SESSIONS_DIR) -> Optional[str]:
+    """
+    The persona strategy the account was last run with, which tells what
+    persona state it may still carry (None when unknown).
+    """
+    try:
+        with open(persona_strategy_path(account_name, storage_dir)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def record_persona_strategy(account_name: str, strategy: str, storage_dir: str = SESSIONS_DIR) -> None:
+    path = persona_strategy_path(account_name, storage_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(strategy)
+
+def auth_cookie_expiry(storage_state_path: str) -> Optional[float]:
+    """Return the auth cookie's expiry (unix seconds), or None if the state has no login."""
+    try:
+        with open(storage_state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    expiries = [
+        cookie.get("expires", -1)
+        for cookie in state.get("cookies", [])
+        if cookie.get("name", "").startswith(AUTH_COOKIE_PREFIX)
+    ]
+    # Session cookies (expires == -1) do not survive a restart, treat them as missing
+    expiries = [expiry for expiry in expiries if expiry and expiry > 0]
+    return min(expiries) if expiries else None
+
+class SessionPool:
+    """
+    Keeps one or more storage states per account ready for runners.
+
+    Layout on disk: storage/sessions/<account>/<n>.json. The legacy
+    storage/auth_state.json written by scripts/login.py seeds the default
+    account's first state whenever it is newer.
+    """
+
+    def __init__(
+        self,
+        accounts: List[Dict] = None,
+        storage_dir: str = SESSIONS_DIR,
+        states_per_account: int = 1,
+        refresh_margin: int = REFRESH_MARGIN_SECONDS,
+        headless: bool = False
+    ):
+        self.accounts = accounts if accounts is not None else load_accounts_from_env()
+        self.storage_dir = storage_dir
+        self.states_per_account = max(1, states_per_account)
+        self.refresh_margin = refresh_margin
+        self.headless = headless
+
+        self._lock = threading.Lock()
+        self._path_locks = {}
+        self._last_validated = {}
+        self._round_robin = {}
+        self._refresh_thread = None
+        self._stop_refresh = threading.Event()
+
+        self._seed_from_legacy_state()
+
+    def _seed_from_legacy_state(self) -> None:
+        default = [account for account in self.accounts if account["name"] == "default"]
+        if not default or not os.path.exists(LEGACY_AUTH_STATE):
+            return
+        first_state = self.state_paths(default[0])[0]
+        # A fresh manual login (scripts/login.py) replaces the pooled copy
+        if not os.path.exists(first_state) or os.path.getmtime(LEGACY_AUTH_STATE) > os.path.getmtime(first_state):
+            os.makedirs(os.path.dirname(first_state), exist_ok=True)
+            with open(LEGACY_AUTH_STATE) as src, open(first_state, "w") as dst:
+                dst.write(src.read())
+
+    def get_account(self, name: str = None) -> Dict:
+        """Look up an account by name (first account when name is None)."""
+        if not self.accounts:
+            raise RuntimeError("No ChatGPT accounts configured (set CHATGPT_EMAIL / CHATGPT_PASSWORD)")
+        if name is None:
+            return self.accounts[0]
+        for account in self.accounts:
+            if account["name"] == name:
+                return account
+        raise KeyError(f"Unknown account: {name}")
+
+    def state_paths(self, account: Dict) -> List[str]:
+        """Storage state files kept for an account."""
+        account_dir = os.path.join(self.storage_dir, account_slug(account))
+        return [os.path.join(account_dir, f"{n}.json") for n in range(1, self.states_per_account + 1)]
+
+    def needs_refresh(self, path: str) -> bool:
+        """Cheap check: missing state or auth cookie expiring within the refresh margin."""
+        expiry = auth_cookie_expiry(path)
+        return expiry is None or expiry - time.time() < self.refresh_margin
+
+    def checkout(self, account_name: str = None) -> Dict:
+        """
+        Hand out a ready storage state for an account, refreshing it first if needed.
+
+        States are handed out round-robin so parallel runners spread across them.
+
+        Returns:
+            {"account": account dict, "path": state file, "storage_state": path or None}
+            storage_state is None when the account has no saved state yet; the runner
+            then logs in with credentials and save()s the result to `path`.
+        """
+        account = self.get_account(account_name)
+        paths = self.state_paths(account)
+
+        with self._lock:
+            counter = self._round_robin.setdefault(account["name"], itertools.count())
+            path = paths[next(counter) % len(paths)]
+
+        self.ensure_ready(account, path)
+        return {
+            "account": account,
+            "path": path,
+            "storage_state": path if os.path.exists(path) else None,
+        }
+
+    def _path_lock(self, path: str) -> threading.Lock:
+        with self._lock:
+            return self._path_locks.setdefault(path, threading.Lock())
+
+    def ensure_ready(self, account: Dict, path: str) -> None:
+        """
+        Refresh the state if its auth cookie is expiring. No browser is started
+        otherwise: the runner's first page shows whether the state still works.
+
+        Launches its own sync Playwright when it has to refresh, so call it from a
+        thread that is not already driving a browser (or via asyncio.to_thread).
+        """
+        # No state yet: the runner's own login will create it
+        if not os.path.exists(path):
+            return
+
+        with self._path_lock(path):
+            if self.needs_refresh(path):
+                self.refresh(account, path)
+
+    def mark_invalid(self, path: str) -> None:
+        """Called by a runner that found a checked-out state logged out."""
+        self._last_validated.pop(path, None)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def mark_validated(self, path: str) -> None:
+        """Record that `path` was just seen logged in."""
+        self._last_validated[path] = time.time()
+
+    def save(self, context, path: str) -> None:
+        """Persist a logged-in (sync) context's storage state back into the pool."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        context.storage_state(path=path)
+        self.mark_validated(path)
+
+    def refresh(self, account: Dict, path: str, manual: bool = False) -> bool:
+        """
+        Log the account in with credentials and save a fresh state to `path`.
+
+        With `manual` (needs a visible browser and a terminal), wait for the
+        operator to finish any 2FA or captcha before saving the state.
+        """
+        from workflows.login import is_logged_in, login_to_chatgpt
+
+        print(f"🔄 Refreshing session for {account['name']} ({os.path.basename(path)})...")
+        with sync_playwright() as p:
+            browser = p.chromium.launch(
+                headless=self.headless and not manual,
+                args=['--disable-blink-features=AutomationControlled']
+            )
+            try:
+                context = browser.new_context(viewport={"width": 1280, "height": 720})
+                page = context.new_page()
+                logged_in = login_to_chatgpt(page, account["email"], account["password"])
+                if manual:
+                    input("Press Enter after completing any 2FA...")
+                    logged_in = is_logged_in(page)
+                if not logged_in:
+                    print(f"❌ Could not refresh session for {account['name']}")
+                    return False
+                self.save(context, path)
+                print(f"💾 Session saved: {path}")
+                return True
+            finally:
+                browser.close()
+
+    def refresh_expiring(self) -> None:
+        """Refresh every state whose auth cookie is missing or close to expiry."""
+        for account in self.accounts:
+            for path in self.state_paths(account):
+                if self.needs_refresh(path):
+                    try:
+                        with self._path_lock(path):
+                            if self.needs_refresh(path):
+                                self.refresh(account, path)
+                    except Exception as e:
+                        print(f"⚠️ Background refresh failed for {path}: {e}")
+
+    def start_background_refresh(self, interval: int = 15 * 60) -> None:
+        """Proactively refresh expiring states every `interval` seconds on a daemon thread."""
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+
+        def loop():
+            while not self._stop_refresh.wait(interval):
+                self.refresh_expiring()
+
+        self._stop_refresh.clear()
+        self._refresh_thread = threading.Thread(target=loop, name="session-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def stop_background_refresh(self) -> None:
+        self._stop_refresh.set()
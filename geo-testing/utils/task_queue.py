@@ -0,0 +1,257 @@
+"""
+Distributed work queue of a run's tests.
+
+With `--distributed`, every persona × prompt test of a run is a document in
+the run_tasks collection, and runners on any host lease them instead of
+draining an in-process queue:
+
+    _id:     "<test_run_id>:<persona_idx>:<prompt_idx>"
+    status:  pending | leased | done | failed
+    worker:  "<host>:<pid>" holding the lease, lease_expires_at, leases (times leased)
+    test_number, persona_idx, persona, prompt_idx, prompt, prompt_position
+
+A lease is one atomic find_one_and_update, so no two runners get the same
+test. A runner leases a persona's remaining tests together (persona setup
+still happens once per batch), and a heartbeat thread keeps extending the
+leases it holds. When a runner crashes its heartbeat stops, its leases
+expire after `lease_s`, and the tests go to whichever runner asks next; a
+test whose lease expired MAX_LEASES times is marked failed rather than
+crashing runner after runner.
+
+Starting the same command (same --test-run-id) on another host adds it to
+the run: publishing tasks is idempotent, so it just joins the queue.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import os
+import queue
+import socket
+import threading
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import PyMongoError
+
+DEFAULT_LEASE_S = float(os.getenv("TASK_LEASE_S", "300"))  # A test with retries and backoff can take minutes
+MAX_LEASES = 3
+# A done task's result can sit in its runner's ResultWriter buffer for a few flush intervals
+RESULT_SETTLE_S = float(os.getenv("TASK_RESULT_SETTLE_S", "60"))
+
+TASK_FIELDS = ("test_number", "persona_idx", "persona", "prompt_idx", "prompt", "prompt_position")
+
+def task_id(test_run_id: str, persona_idx: int, prompt_idx: int) -> str:
+    return f"{test_run_id}:{persona_idx}:{prompt_idx}"
+
+class TaskQueue:
+    """
+    A run's leased tasks, usable where the engines take a batch queue:
+    get_nowait() leases the next persona batch and raises queue.Empty once
+    nothing is left to lease.
+    """
+
+    def __init__(self, db, test_run_id: str, lease_s: float = DEFAULT_LEASE_S, log=print):
+        self.tasks = db["run_tasks"]
+        self.results = db["test_results"]
+        self.test_run_id = test_run_id
+        self.lease_s = max(10.0, float(lease_s))
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.log = log
+        self.held = set()  # _ids of the tasks this runner holds a lease on
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="task-heartbeat", daemon=True)
+
+    def publish(self, batches: List[Dict], requeue: bool = False) -> int:
+        """
+        Create the task documents of planned persona batches (existing ones are
+        left alone). With `requeue` (resuming), finished tasks among them whose
+        result is still missing go back to pending (see _requeue_missing).
+        Returns the number of tasks created.
+        """
+        now = datetime.utcnow()
+        updates = []
+        ids = []
+        for batch in batches:
+            for task in batch["tasks"]:
+                _id = task_id(self.test_run_id, task["persona_idx"], task["prompt_idx"])
+                ids.append(_id)
+                updates.append(UpdateOne({"_id": _id}, {"$setOnInsert": {
+                    "test_run_id": self.test_run_id,
+                    **{field: task[field] for field in TASK_FIELDS},
+                    "status": "pending",
+                    "leases": 0,
+                    "created_at": now,
+                }}, upsert=True))
+        if not updates:
+            return 0
+        created = self.tasks.bulk_write(updates, ordered=False).upserted_count
+        if requeue:
+            self._requeue_missing(ids)
+        return created
+
+    def start(self) -> "TaskQueue":
+        self._heartbeat.start()
+        return self
+
+    def close(self) -> None:
+        """Stop the heartbeat and hand unfinished leases straight back to the queue."""
+        self._stop.set()
+        with self._lock:
+            held, self.held = list(self.held), set()
+        if not held:
+            return
+        try:
+            released = self.tasks.update_many(
+                {"_id": {"$in": held}, "worker": self.worker, "status": "leased"},
+                # A clean release doesn't count towards MAX_LEASES
+                {"$set": {"status": "pending", "worker": None, "lease_expires_at": None}, "$inc": {"leases": -1}},
+            ).modified_count
+            self.log(f"↩️ Released {released} leased test(s) back to the queue")
+        except PyMongoError as e:
+            self.log(f"⚠️ Could not release leased tests, they return after their lease expires: {e}")
+
+    def get_nowait(self) -> Dict:
+        batch = self.lease_batch()
+        if batch is None:
+            raise queue.Empty
+        return batch
+
+    def task_done(self) -> None:
+        """Tasks are completed one by one through the batch's on_task_done."""
+
+    def lease_batch(self) -> Optional[Dict]:
+        """
+        Lease the first open test, then the rest of its persona's open tests.
+        Returns a persona batch ({"persona_idx", "persona", "tasks", "on_task_done"})
+        or None when no test is left to lease.
+        """
+        first = self._lease({})
+        if first is None:
+            self._fail_abandoned()
+            return None
+        tasks = [first]
+        while True:
+            task = self._lease({"persona_idx": first["persona_idx"]})
+            if task is None:
+                break
+            tasks.append(task)
+        tasks.sort(key=lambda task: task["prompt_position"])
+        return {
+            "persona_idx": first["persona_idx"],
+            "persona": first["persona"],
+            "tasks": tasks,
+            "on_task_done": self.complete,
+        }
+
+    def complete(self, task: Dict, succeeded: bool) -> None:
+        """Finish a leased test: done once its result is handed to the writer, failed after its last attempt."""
+        _id = task_id(self.test_run_id, task["persona_idx"], task["prompt_idx"])
+        with self._lock:
+            self.held.discard(_id)
+        finished = self.tasks.update_one(
+            {"_id": _id, "worker": self.worker, "status": "leased"},
+            {"$set": {"status": "done" if succeeded else "failed", "finished_at": datetime.utcnow(),
+                      "lease_expires_at": None}},
+        )
+        if not finished.matched_count:
+            self.log(f"   ⚠️ Lease on test {task['test_number']} had expired; another runner may repeat it")
+
+    def counts(self) -> Dict[str, int]:
+        """Number of the run's tasks in each status."""
+        grouped = self.tasks.aggregate([
+            {"$match": {"test_run_id": self.test_run_id}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ])
+        return {entry["_id"]: entry["count"] for entry in grouped}
+
+    def run_status(self) -> str:
+        """
+        The run's status once this runner stops: complete when no test is open,
+        running while other runners still hold live leases, interrupted otherwise.
+        """
+        counts = self.counts()
+        if not counts.get("pending") and not counts.get("leased"):
+            return "complete"
+        others = self.tasks.count_documents({
+            "test_run_id": self.test_run_id,
+            "status": "leased",
+            "worker": {"$ne": self.worker},
+            "lease_expires_at": {"$gte": datetime.utcnow()},
+        }, limit=1)
+        return "running" if others else "interrupted"
+
+    def _requeue_missing(self, ids: List[str]) -> None:
+        """
+        Put finished tasks without a saved result back to pending: failed ones,
+        and done ones whose result isn't in test_results. A task done in the
+        last RESULT_SETTLE_S seconds is left alone, as its result may still be
+        buffered by the runner that finished it.
+        """
+        saved = {
+            task_id(self.test_run_id, result["persona_id"], result["prompt_id"])
+            for result in self.results.find({"test_run_id": self.test_run_id}, {"persona_id": 1, "prompt_id": 1})
+        }
+        missing = [_id for _id in ids if _id not in saved]
+        if not missing:
+            return
+        settled = datetime.utcnow() - timedelta(seconds=RESULT_SETTLE_S)
+        reset = {"$set": {"status": "pending", "leases": 0, "worker": None, "lease_expires_at": None}}
+        requeued = self.tasks.update_many({"_id": {"$in": missing}, "status": "failed"}, reset).modified_count
+        requeued += self.tasks.update_many(
+            {"_id": {"$in": missing}, "status": "done", "finished_at": {"$lt": settled}}, reset).modified_count
+        unsettled = self.tasks.count_documents(
+            {"_id": {"$in": missing}, "status": "done", "finished_at": {"$gte": settled}})
+        if requeued:
+            self.log(f"↩️ Requeued {requeued} finished test(s) without a saved result")
+        if unsettled:
+            self.log(f"⏳ {unsettled} test(s) finished in the last {RESULT_SETTLE_S:.0f}s may still be saving, "
+                     f"not requeued")
+
+    def _lease(self, extra_filter: Dict) -> Optional[Dict]:
+        now = datetime.utcnow()
+        previous = self.tasks.find_one_and_update(
+            {
+                "test_run_id": self.test_run_id,
+                "leases": {"$lt": MAX_LEASES},
+                # Open tests, and tests whose runner stopped heartbeating
+                "$or": [{"status": "pending"}, {"status": "leased", "lease_expires_at": {"$lt": now}}],
+                **extra_filter,
+            },
+            {
+                "$set": {"status": "leased", "worker": self.worker, "leased_at": now,
+                         "lease_expires_at": now + timedelta(seconds=self.lease_s)},
+                "$inc": {"leases": 1},
+            },
+            sort=[("persona_idx", ASCENDING), ("prompt_position", ASCENDING)],
+            return_document=ReturnDocument.BEFORE,
+        )
+        if previous is None:
+            return None
+        if previous["status"] == "leased":
+            self.log(f"♻️ Reclaimed test {previous['test_number']} from {previous.get('worker')} (lease expired)")
+        with self._lock:
+            self.held.add(previous["_id"])
+        return {field: previous[field] for field in TASK_FIELDS}
+
+    def _fail_abandoned(self) -> None:
+        """Give up on tests whose lease expired MAX_LEASES times: they keep taking their runner down."""
+        abandoned = self.tasks.update_many(
+            {"test_run_id": self.test_run_id, "status": "leased", "leases": {"$gte": MAX_LEASES},
+             "lease_expires_at": {"$lt": datetime.utcnow()}},
+            {"$set": {"status": "failed", "finished_at": datetime.utcnow(), "lease_expires_at": None}},
+        ).modified_count
+        if abandoned:
+            self.log(f"⚠️ Gave up on {abandoned} test(s) whose runners stopped {MAX_LEASES} times")
+
+    def _heartbeat_loop(self) -> None:
+        # Renew well before expiry, so one slow or failed renewal doesn't lose the leases
+        while not self._stop.wait(self.lease_s / 3):
+            with self._lock:
+                held = list(self.held)
+            if not held:
+                continue
+            try:
+                self.tasks.update_many(
+                    {"_id": {"$in": held}, "worker": self.worker, "status": "leased"},
+                    {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_s)}},
+                )
+            except PyMongoError as e:
+                self.log(f"⚠️ Could not renew task leases: {e}")
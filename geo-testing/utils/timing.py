@@ -0,0 +1,102 @@
+"""
+Lightweight per-stage timing for GEO runs.
+
+A StageTimer collects the stages of one test (`with timer.span("wait"): ...`)
+and becomes the `timings` sub-document of its test_results document. A
+RunTimings aggregates every test's timer into the per-run latency breakdown
+printed at the end of a run.
+"""
+from contextlib import contextmanager
+from typing import Dict, List
+import threading
+import time
+
+# Stages in pipeline order (persona setup is recorded on the first test of each persona)
+STAGES = ("clear_memory", "set_persona", "new_chat", "send", "wait", "extract", "save")
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+class StageTimer:
+    """Durations (ms) of the stages of one test."""
+
+    def __init__(self):
+        self.durations = {}
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time the enclosed block as `stage`; failed blocks are timed too."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, (time.perf_counter() - started) * 1000)
+
+    def add(self, stage: str, ms: float) -> None:
+        self.durations[stage] = self.durations.get(stage, 0.0) + ms
+
+    def to_doc(self) -> Dict[str, int]:
+        """{"<stage>_ms": ..., "total_ms": ...} for the test_results document."""
+        doc = {f"{stage}_ms": round(ms) for stage, ms in self.durations.items()}
+        doc["total_ms"] = round(sum(self.durations.values()))
+        return doc
+
+class RunTimings:
+    """Collects every test's StageTimer for a run; safe to share between worker threads."""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, timer: StageTimer) -> None:
+        with self._lock:
+            for stage, ms in timer.durations.items():
+                self.samples.setdefault(stage, []).append(ms)
+            self.samples.setdefault("total", []).append(sum(timer.durations.values()))
+
+    def extend(self, samples: Dict[str, List[float]]) -> None:
+        """Merge raw samples collected elsewhere (e.g. by a worker process)."""
+        with self._lock:
+            for stage, values in samples.items():
+                self.samples.setdefault(stage, []).extend(values)
+
+    def breakdown(self) -> Dict[str, Dict]:
+        """Per-stage count, p50/p95/max and share of the summed test time."""
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self.samples.items()}
+
+        grand_total = sum(samples.get("total", [])) or 1
+        ordered = [stage for stage in STAGES if stage in samples]
+        ordered += sorted(stage for stage in samples if stage not in STAGES and stage != "total")
+        if "total" in samples:
+            ordered.append("total")
+
+        breakdown = {}
+        for stage in ordered:
+            values = samples[stage]
+            breakdown[stage] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50)),
+                "p95_ms": round(percentile(values, 95)),
+                "max_ms": round(max(values)),
+                "total_ms": round(sum(values)),
+                "share": round(sum(values) / grand_total, 3),
+            }
+        return breakdown
+
+def print_latency_breakdown(breakdown: Dict[str, Dict]) -> None:
+    """Print a RunTimings breakdown as a table; the slowest stage is flagged."""
+    if not breakdown:
+        return
+    stages = {stage: entry for stage, entry in breakdown.items() if stage != "total"}
+    slowest = max(stages, key=lambda stage: stages[stage]["total_ms"]) if stages else None
+
+    print(f"\n⏱️  LATENCY BREAKDOWN (ms):")
+    print(f"   {'stage':<14}{'count':>7}{'p50':>9}{'p95':>9}{'max':>9}{'share':>8}")
+    for stage, entry in breakdown.items():
+        flag = "  ◀ dominant" if stage == slowest else ""
+        print(f"   {stage:<14}{entry['count']:>7}{entry['p50_ms']:>9}{entry['p95_ms']:>9}"
+              f"{entry['max_ms']:>9}{entry['share']:>8.0%}{flag}")
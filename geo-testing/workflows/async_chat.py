@@ -0,0 +1,57 @@
+from playwright.async_api import Page
+from typing import Dict
+from workflows.async_completion import wait_for_response_complete
+from workflows.chat import EXTRACT_RESPONSE_JS
+from workflows.config import CHATGPT_URL
+
+async def send_prompt(page: Page, prompt: str) -> None:
+    """Send a prompt to ChatGPT."""
+    await page.locator("#prompt-textarea").fill(prompt)
+    await page.get_by_test_id("send-button").click()
+
+async def start_new_chat(page: Page) -> None:
+    """Open a fresh chat so the next prompt carries no earlier conversation context."""
+    await page.goto(CHATGPT_URL)
+    await page.locator("#prompt-textarea").wait_for(timeout=10000)
+
+async def extract_response(page: Page, turn_number: int = 2, wait_for_completion: bool = True,
+                           capture=None) -> Dict[str, any]:
+    """
+    Extract response text and citations from ChatGPT.
+    
+    Args:
+        turn_number: Which conversation turn to extract (2 = first response)
+        wait_for_completion: Wait for the answer to finish streaming first.
+            Pass False when the caller already awaited wait_for_response_complete.
+        capture: Optional ConversationCapture attached to the page. When it saw the
+            answer's network stream, that answer (with markdown and 'sources') is
+            returned instead of scraping the DOM.
+    
+    Returns:
+        Dict with 'text', 'citations', 'has_citations' and 'source' ("network" or
+        "dom"). Each citation has 'position', 'title', 'url' and 'context' (the
+        sentence that cites it).
+    """
+    # Wait for response to appear
+    response_locator = page.get_by_test_id(f"conversation-turn-{turn_number}")
+    await response_locator.wait_for(timeout=60000)
+    
+    # Wait for streaming (and citations) to finish
+    if wait_for_completion:
+        await wait_for_response_complete(page, turn_number)
+    
+    if capture is not None:
+        answer = await capture.latest_answer()
+        if answer:
+            return answer
+    
+    # Extract text and citations in a single round trip
+    payload = await response_locator.evaluate(EXTRACT_RESPONSE_JS)
+    citations = payload["citations"]
+    
+    return {
+        "text": payload["text"],
+        "citations": citations,
+        "has_citations": len(citations) > 0,
+        "source": "dom"
+    }
@@ -0,0 +1,27 @@
+from playwright.async_api import Page
+import time
+from workflows.completion import COMPLETION_PREDICATE_JS, QUIET_WINDOW_MS, RESPONSE_TIMEOUT_MS
+
+async def wait_for_response_complete(
+    page: Page,
+    turn_number: int = 2,
+    timeout_ms: int = RESPONSE_TIMEOUT_MS,
+    quiet_ms: int = QUIET_WINDOW_MS
+) -> float:
+    """
+    Wait until ChatGPT has finished streaming the given conversation turn.
+
+    Raises playwright's TimeoutError if the answer is still streaming after
+    `timeout_ms`, so a half-streamed answer is never returned as complete.
+
+    Returns:
+        Seconds spent waiting.
+    """
+    started = time.monotonic()
+    await page.wait_for_function(
+        COMPLETION_PREDICATE_JS,
+        arg={"turn": turn_number, "quietMs": quiet_ms},
+        polling=100,
+        timeout=timeout_ms
+    )
+    return time.monotonic() - started
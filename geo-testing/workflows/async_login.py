@@ -0,0 +1,92 @@
+from playwright.async_api import Page, BrowserContext
+import asyncio
+from workflows.config import CHATGPT_URL
+
+async def load_auth_session(context: BrowserContext, page: Page) -> None:
+    """Navigate to ChatGPT with existing auth session."""
+    await page.goto(CHATGPT_URL)
+    # Wait for chat interface to load
+    await page.locator("#prompt-textarea").wait_for(timeout=10000)
+
+async def is_logged_in(page: Page, timeout: int = 10000) -> bool:
+    """True when the chat interface has loaded and no "Log in" button is offered."""
+    try:
+        await page.locator("#prompt-textarea").wait_for(timeout=timeout)
+        return not await page.get_by_role("button", name="Log in").first.is_visible()
+    except Exception:
+        return False
+
+async def login_to_chatgpt(page: Page, email: str, password: str, log=print) -> bool:
+    """
+    Log into ChatGPT with credentials and verify the chat interface is usable.
+
+    Returns True when the page is ready to run tests.
+    """
+    await page.goto(CHATGPT_URL)
+    await asyncio.sleep(3)
+    
+    # Check if we need to login (look for "Log in" button)
+    login_needed = False
+    try:
+        login_button = page.get_by_role("button", name="Log in")
+        if await login_button.is_visible(timeout=2000):
+            login_needed = True
+            log(f"🔑 Not logged in. Starting login process...")
+    except:
+        # No login button found, might be logged in
+        pass
+    
+    if not login_needed:
+        # Verify we're actually logged in by checking for textarea
+        try:
+            await page.locator("#prompt-textarea").wait_for(timeout=3000)
+            log(f"✅ Already logged in!")
+        except:
+            login_needed = True
+            log(f"🔑 Session expired. Need to login...")
+    
+    if login_needed:
+        # Perform login
+        log(f"🔐 Logging in with credentials...")
+        try:
+            # Click login button
+            await page.get_by_role("button", name="Log in").click(timeout=5000)
+            await asyncio.sleep(2)
+            
+            # Enter email
+            await page.get_by_role("textbox", name="Email address").fill(email)
+            await page.get_by_role("button", name="Continue", exact=True).click()
+            await asyncio.sleep(2)
+            
+            # Enter password
+            await page.get_by_role("textbox", name="Password").fill(password)
+            await page.get_by_role("button", name="Continue", exact=True).click()
+            await asyncio.sleep(5)
+            
+            # Wait for chat interface
+            await page.locator("#prompt-textarea").wait_for(timeout=15000)
+            log(f"✅ Login successful!")
+            
+        except Exception as e:
+            log(f"❌ Login failed: {e}")
+            log(f"   Please check credentials in .env file")
+            log(f"   Current URL: {page.url}")
+            return False
+    
+    # FINAL VERIFICATION: Make sure we're logged in before starting tests
+    log(f"\n🔍 Verifying login status before starting tests...")
+    try:
+        # Check that we can interact with the textarea
+        textarea = page.locator("#prompt-textarea")
+        await textarea.wait_for(timeout=5000)
+        if not await textarea.is_visible():
+            raise Exception("Textarea not visible")
+        log(f"✅ Login verified! Ready to start tests.")
+    except Exception as e:
+        log(f"❌ Not properly logged in: {e}")
+        log(f"   Current URL: {page.url}")
+        log(f"   Taking screenshot for debugging...")
+        await page.screenshot(path="login_verification_failed.png")
+        return False
+
+    return True
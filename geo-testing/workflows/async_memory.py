@@ -0,0 +1,103 @@
+from playwright.async_api import Page
+import asyncio
+from workflows.config import CHATGPT_URL
+from workflows.memory import CUSTOM_INSTRUCTIONS_FIELD
+
+async def clear_memory(page: Page) -> None:
+    """Clear all ChatGPT memory."""
+    # Open user menu by clicking on avatar/profile button
+    try:
+        # Try multiple ways to open user menu
+        try:
+            # Method 1: Click on user button (more reliable)
+            await page.locator('button[id^="headlessui-menu-button"]').first.click()
+        except:
+            # Method 2: Click on profile/avatar area
+            await page.locator('[data-testid="profile-button"]').click()
+        
+        await asyncio.sleep(1)
+        
+        # Navigate to Personalization (Settings)
+        await page.get_by_role("menuitem", name="Personalization").click()
+        await asyncio.sleep(1)
+        
+        await page.get_by_role("button", name="Manage").click()
+        await asyncio.sleep(1)
+        
+        # Clear memory
+        await page.get_by_test_id("reset-memories-button").click()
+        await asyncio.sleep(0.5)
+        
+        await page.get_by_test_id("confirm-reset-memories-button").click()
+        await asyncio.sleep(1)
+        
+        # Close modals
+        await page.get_by_test_id("modal-memories").get_by_test_id("close-button").click()
+        await asyncio.sleep(0.5)
+        
+        await page.get_by_role("tablist").get_by_test_id("close-button").click()
+        await asyncio.sleep(1)
+        
+    except Exception as e:
+        print(f"Error in clear_memory: {e}")
+        # Try to close any open modals
+        try:
+            await page.keyboard.press("Escape")
+            await page.keyboard.press("Escape")
+        except:
+            pass
+        raise
+
+async def set_persona(page: Page, persona_text: str) -> None:
+    """Add persona to ChatGPT memory by chatting."""
+    # Type persona in chat
+    await page.locator("#prompt-textarea").fill("Save this to memory: " + persona_text)
+    await page.get_by_test_id("send-button").click()
+    
+    # Wait for response
+    await page.wait_for_timeout(3000)
+    
+    # Start new chat to clear context
+    await page.goto(CHATGPT_URL)
+    await page.locator("#prompt-textarea").wait_for(timeout=5000)
+
+async def set_custom_instructions(page: Page, persona_text: str) -> None:
+    """Replace ChatGPT's custom instructions with the persona (no memory round trip)."""
+    try:
+        try:
+            await page.locator('button[id^="headlessui-menu-button"]').first.click()
+        except:
+            await page.locator('[data-testid="profile-button"]').click()
+        
+        await page.get_by_role("menuitem", name="Personalization").click()
+        
+        # Overwrite whatever the previous persona saved
+        about_field = page.get_by_role("textbox", name=CUSTOM_INSTRUCTIONS_FIELD)
+        if await about_field.input_value(timeout=10000) == persona_text:
+            # Already set (Save stays disabled on an unchanged form)
+            await page.keyboard.press("Escape")
+        else:
+            await about_field.fill(persona_text, timeout=10000)
+            await page.get_by_role("button", name="Save", exact=True).click()
+            
+            # Some layouts close the dialog on save
+            close_button = page.get_by_role("tablist").get_by_test_id("close-button")
+            if await close_button.is_visible():
+                await close_button.click()
+        
+    except Exception as e:
+        print(f"Error in set_custom_instructions: {e}")
+        try:
+            await page.keyboard.press("Escape")
+            await page.keyboard.press("Escape")
+        except:
+            pass
+        raise
+    
+    # Custom instructions apply to chats started after saving
+    await page.goto(CHATGPT_URL)
+    await page.locator("#prompt-textarea").wait_for(timeout=5000)
+
+async def clear_custom_instructions(page: Page) -> None:
+    """Empty the custom instructions (e.g. a persona left behind by a custom_instructions run)."""
+    await set_custom_instructions(page, "")
@@ -0,0 +1,34 @@
+from playwright.async_api import Page, Response
+from typing import Dict, Optional
+from workflows.network_capture import is_conversation_stream, parse_conversation_stream
+
+class ConversationCapture:
+    """Records conversation-stream responses seen by an (async) page."""
+
+    def __init__(self, page: Page):
+        self.page = page
+        self.responses = []
+        page.on("response", self._on_response)
+
+    def _on_response(self, response: Response) -> None:
+        if is_conversation_stream(response):
+            self.responses.append(response)
+
+    def reset(self) -> None:
+        """Forget earlier turns; call right before sending the prompt to capture."""
+        self.responses = []
+
+    def detach(self) -> None:
+        self.page.remove_listener("response", self._on_response)
+
+    async def latest_answer(self) -> Optional[Dict]:
+        """Reassemble the last captured answer, or None if no stream was observed."""
+        for response in reversed(self.responses):
+            try:
+                await response.finished()
+                answer = parse_conversation_stream(await response.text())
+            except Exception:
+                continue
+            if answer:
+                return answer
+        return None
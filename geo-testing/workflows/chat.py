@@ -1,50 +1,84 @@
 from playwright.sync_api import Page
 from typing import Dict
-import time
+from workflows.completion import wait_for_response_complete
+from workflows.config import CHATGPT_URL
+
+# Runs against the answer turn in one page round trip: the full text plus every
+# citation link with its title, position and the sentence that cites it.
+EXTRACT_RESPONSE_JS = """
+(turn) => {
+    const clean = (text) => (text || '').replace(/\\s+/g, ' ').trim();
+
+    const citingSentence = (link) => {
+        const block = link.closest('p, li, td, blockquote, h1, h2, h3, h4, h5, h6') || link.parentElement;
+        const blockText = clean(block ? block.innerText : '');
+        const linkText = clean(link.innerText);
+        const sentences = blockText.match(/[^.!?]+[.!?]*/g) || [blockText];
+        const hit = linkText && sentences.find((sentence) => sentence.includes(linkText));
+        return clean(hit || blockText).slice(0, 500);
+    };
+
+    const links = Array.from(turn.querySelectorAll('a[href]'));
+    return {
+        text: turn.innerText,
+        citations: links.map((link, idx) => ({
+            position: idx + 1,
+            title: link.innerText || `Citation ${idx + 1}`,
+            url: link.getAttribute('href'),
+            context: citingSentence(link),
+        })),
+    };
+}
+"""
 
 def send_prompt(page: Page, prompt: str) -> None:
     """Send a prompt to ChatGPT."""
     page.locator("#prompt-textarea").fill(prompt)
     page.get_by_test_id("send-button").click()
 
-def extract_response(page: Page, turn_number: int = 2) -> Dict[str, any]:
+def start_new_chat(page: Page) -> None:
+    """Open a fresh chat so the next prompt carries no earlier conversation context."""
+    page.goto(CHATGPT_URL)
+    page.locator("#prompt-textarea").wait_for(timeout=10000)
+
+def extract_response(page: Page, turn_number: int = 2, wait_for_completion: bool = True,
+                     capture=None) -> Dict[str, any]:
     """
     Extract response text and citations from ChatGPT.
     
     Args:
         turn_number: Which conversation turn to extract (2 = first response)
+        wait_for_completion: Wait for the answer to finish streaming first.
+            Pass False when the caller already awaited wait_for_response_complete.
+        capture: Optional ConversationCapture attached to the page. When it saw the
+            answer's network stream, that answer (with markdown and 'sources') is
+            returned instead of scraping the DOM.
     
     Returns:
-        Dict with 'text', 'citations', and 'has_citations'
+        Dict with 'text', 'citations', 'has_citations' and 'source' ("network" or
+        "dom"). Each citation has 'position', 'title', 'url' and 'context' (the
+        sentence that cites it).
     """
     # Wait for response to appear
     response_locator = page.get_by_test_id(f"conversation-turn-{turn_number}")
     response_locator.wait_for(timeout=60000)
     
-    # Wait a bit more for citations to load
-    time.sleep(2)
-    
-    # Extract text
-    response_text = response_locator.inner_text()
+    # Wait for streaming (and citations) to finish
+    if wait_for_completion:
+        wait_for_response_complete(page, turn_number)
     
-    # Extract citations (links in response)
-    citations = []
-    citation_links = response_locator.locator("a[href]").all()
+    if capture is not None:
+        answer = capture.latest_answer()
+        if answer:
+            return answer
     
-    for idx, link in enumerate(citation_links, 1):
-        try:
-            url = link.get_attribute("href")
-            title = link.inner_text() or f"Citation {idx}"
-            citations.append({
-                "position": idx,
-                "title": title,
-                "url": url
-            })
-        except Exception:
-            pass
+    # Extract text and citations in a single round trip
+    payload = response_locator.evaluate(EXTRACT_RESPONSE_JS)
+    citations = payload["citations"]
     
     return {
-        "text": response_text,
+        "text": payload["text"],
         "citations": citations,
-        "has_citations": len(citations) > 0
+        "has_citations": len(citations) > 0,
+        "source": "dom"
     }
\ No newline at end of file
@@ -0,0 +1,64 @@
+from playwright.sync_api import Page
+import time
+
+# Default ceiling for one answer to finish streaming
+RESPONSE_TIMEOUT_MS = 120000
+
+# How long the answer DOM must stay unchanged before we call it complete
+QUIET_WINDOW_MS = 1000
+
+# Runs inside the page on every poll. The first call attaches a MutationObserver
+# to the answer turn; it is complete once the stop button is gone, no streaming
+# marker remains, and the turn has not mutated for `quietMs`.
+COMPLETION_PREDICATE_JS = """
+({ turn, quietMs }) => {
+    const el = document.querySelector(`[data-testid="conversation-turn-${turn}"]`);
+    if (!el) return false;
+
+    if (window.__geoObservedTurn !== el) {
+        if (window.__geoObserver) window.__geoObserver.disconnect();
+        window.__geoObservedTurn = el;
+        window.__geoLastMutation = Date.now();
+        window.__geoObserver = new MutationObserver(() => {
+            window.__geoLastMutation = Date.now();
+        });
+        window.__geoObserver.observe(el, { childList: true, subtree: true, characterData: true });
+        return false;
+    }
+
+    if (document.querySelector('[data-testid="stop-button"]')) return false;
+    if (el.querySelector('.result-streaming, [data-is-streaming="true"]')) return false;
+    if (!el.innerText.trim()) return false;
+
+    if (Date.now() - window.__geoLastMutation < quietMs) return false;
+
+    window.__geoObserver.disconnect();
+    window.__geoObserver = null;
+    window.__geoObservedTurn = null;
+    return true;
+}
+"""
+
+def wait_for_response_complete(
+    page: Page,
+    turn_number: int = 2,
+    timeout_ms: int = RESPONSE_TIMEOUT_MS,
+    quiet_ms: int = QUIET_WINDOW_MS
+) -> float:
+    """
+    Block until ChatGPT has finished streaming the given conversation turn.
+
+    Raises playwright's TimeoutError if the answer is still streaming after
+    `timeout_ms`, so a half-streamed answer is never returned as complete.
+
+    Returns:
+        Seconds spent waiting.
+    """
+    started = time.monotonic()
+    page.wait_for_function(
+        COMPLETION_PREDICATE_JS,
+        arg={"turn": turn_number, "quietMs": quiet_ms},
+        polling=100,
+        timeout=timeout_ms
+    )
+    return time.monotonic() - started
@@ -0,0 +1,8 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Chat app the workflows drive. Point it at benchmark/mock_chat_server.py
+# (e.g. CHATGPT_URL=http://127.0.0.1:8765/) to run without the real site.
+CHATGPT_URL = os.getenv("CHATGPT_URL", "https://chatgpt.com/")
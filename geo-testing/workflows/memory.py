@@ -1,5 +1,6 @@
 from playwright.sync_api import Page
 import time
+from workflows.config import CHATGPT_URL
 
 def clear_memory(page: Page) -> None:
     """Clear all ChatGPT memory."""
@@ -56,5 +57,49 @@ def set_persona(page: Page, persona_text: str) -> None:
     page.wait_for_timeout(3000)
     
     # Start new chat to clear context
-    page.goto("https://chatgpt.com/")
-    page.locator("#prompt-textarea").wait_for(timeout=5000)
\ No newline at end of file
+    page.goto(CHATGPT_URL)
+    page.locator("#prompt-textarea").wait_for(timeout=5000)
+
+# Label of the free-form "about you" field under Personalization > Custom instructions
+CUSTOM_INSTRUCTIONS_FIELD = "Anything else ChatGPT should know about you?"
+
+def set_custom_instructions(page: Page, persona_text: str) -> None:
+    """Replace ChatGPT's custom instructions with the persona (no memory round trip)."""
+    try:
+        try:
+            page.locator('button[id^="headlessui-menu-button"]').first.click()
+        except:
+            page.locator('[data-testid="profile-button"]').click()
+        
+        page.get_by_role("menuitem", name="Personalization").click()
+        
+        # Overwrite whatever the previous persona saved
+        about_field = page.get_by_role("textbox", name=CUSTOM_INSTRUCTIONS_FIELD)
+        if about_field.input_value(timeout=10000) == persona_text:
+            # Already set (Save stays disabled on an unchanged form)
+            page.keyboard.press("Escape")
+        else:
+            about_field.fill(persona_text, timeout=10000)
+            page.get_by_role("button", name="Save", exact=True).click()
+            
+            # Some layouts close the dialog on save
+            close_button = page.get_by_role("tablist").get_by_test_id("close-button")
+            if close_button.is_visible():
+                close_button.click()
+        
+    except Exception as e:
+        print(f"Error in set_custom_instructions: {e}")
+        try:
+            page.keyboard.press("Escape")
+            page.keyboard.press("Escape")
+        except:
+            pass
+        raise
+    
+    # Custom instructions apply to chats started after saving
+    page.goto(CHATGPT_URL)
+    page.locator("#prompt-textarea").wait_for(timeout=5000)
+
+def clear_custom_instructions(page: Page) -> None:
+    """Empty the custom instructions (e.g. a persona left behind by a custom_instructions run)."""
+    set_custom_instructions(page, "")
@@ -0,0 +1,224 @@
+"""
+Capture ChatGPT answers from the conversation network stream.
+
+The DOM flattens markdown and drops citation metadata, so runners can attach
+a ConversationCapture to their page: it records the streamed responses of the
+conversation endpoint, and latest_answer() reassembles the last assistant
+message into the same shape extract_response returns. It returns None when no
+stream was observed, and callers then fall back to DOM scraping.
+"""
+from playwright.sync_api import Page, Response
+from typing import Dict, List, Optional
+import json
+import re
+
+# POST https://chatgpt.com/backend-api/conversation (or /backend-api/f/conversation)
+CONVERSATION_URL_PATTERN = re.compile(r"/backend-api/(?:f/)?conversation/?(?:\?.*)?$")
+
+def is_conversation_stream(response: Response) -> bool:
+    """True for the streamed answer of a new chat turn."""
+    return response.request.method == "POST" and bool(CONVERSATION_URL_PATTERN.search(response.url))
+
+def _iter_sse_payloads(body: str):
+    """Yield the decoded JSON payload of every `data:` line in an SSE body."""
+    for line in body.splitlines():
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if not data or data == "[DONE]":
+            continue
+        try:
+            yield json.loads(data)
+        except ValueError:
+            continue
+
+def _apply_patch(message: Dict, path: str, op: str, value) -> None:
+    """Apply one delta-encoding patch (e.g. append to /message/content/parts/0)."""
+    keys = [key for key in path.split("/") if key]
+    if keys and keys[0] == "message":
+        keys = keys[1:]
+    if not keys:
+        return
+
+    target = message
+    for key in keys[:-1]:
+        if isinstance(target, list):
+            key = int(key)
+            while len(target) <= key:
+                target.append({})
+            target = target[key]
+        else:
+            target = target.setdefault(key, {})
+
+    last = keys[-1]
+    if isinstance(target, list):
+        last = int(last)
+        while len(target) <= last:
+            target.append("")
+        current = target[last]
+    else:
+        current = target.get(last)
+
+    if op == "append":
+        if isinstance(current, str) and isinstance(value, str):
+            value = current + value
+        elif isinstance(current, list):
+            value = current + (value if isinstance(value, list) else [value])
+        elif isinstance(current, dict) and isinstance(value, dict):
+            value = {**current, **value}
+    elif op == "truncate":
+        return
+
+    target[last] = value
+
+def reassemble_assistant_message(body: str) -> Optional[Dict]:
+    """
+    Rebuild the final assistant message from a conversation SSE body.
+
+    Handles both the full-snapshot format ({"message": {...}} on every event)
+    and the delta format ({"p": path, "o": op, "v": value} patches).
+    """
+    message = None
+    last_path, last_op = "/message/content/parts/0", "append"
+
+    for payload in _iter_sse_payloads(body):
+        if not isinstance(payload, dict):
+            continue
+
+        # Snapshot format, or the first event of the delta format
+        snapshot = payload.get("message")
+        if snapshot is None and isinstance(payload.get("v"), dict) and "p" not in payload:
+            snapshot = payload["v"].get("message")
+        if isinstance(snapshot, dict):
+            if snapshot.get("author", {}).get("role") == "assistant":
+                message = snapshot
+            continue
+
+        if message is None or "v" not in payload:
+            continue
+
+        value = payload["v"]
+        if "p" in payload:
+            last_path, last_op = payload["p"], payload.get("o", "replace")
+            _apply_patch(message, last_path, last_op, value)
+        elif isinstance(value, list) and all(isinstance(patch, dict) and "p" in patch for patch in value):
+            for patch in value:
+                last_path, last_op = patch["p"], patch.get("o", "replace")
+                _apply_patch(message, last_path, last_op, patch.get("v"))
+        else:
+            # Bare value continues the previous patch
+            _apply_patch(message, last_path, last_op, value)
+
+    return message
+
+def _sentence_around(text: str, index: Optional[int]) -> str:
+    if index is None or not text:
+        return ""
+    start = max(text.rfind(". ", 0, index), text.rfind("\n", 0, index)) + 1
+    end_candidates = [pos for pos in (text.find(". ", index), text.find("\n", index)) if pos != -1]
+    end = min(end_candidates) + 1 if end_candidates else len(text)
+    return " ".join(text[start:end].split())[:500]
+
+def _collect_citations(metadata: Dict, text: str) -> List[Dict]:
+    """Pull cited URLs (in citation order) out of assistant message metadata."""
+    found = []
+
+    for reference in metadata.get("content_references", []) or []:
+        context = _sentence_around(text, reference.get("start_idx"))
+        items = reference.get("items") or ([reference] if reference.get("url") else [])
+        for item in items:
+            found.append({"title": item.get("title"), "url": item.get("url"), "context": context})
+
+    for citation in metadata.get("citations", []) or []:
+        meta = citation.get("metadata", {}) or {}
+        found.append({
+            "title": meta.get("title"),
+            "url": meta.get("url"),
+            "context": _sentence_around(text, citation.get("start_ix")),
+        })
+
+    citations = []
+    seen = set()
+    for entry in found:
+        if not entry["url"] or entry["url"] in seen:
+            continue
+        seen.add(entry["url"])
+        position = len(citations) + 1
+        citations.append({
+            "position": position,
+            "title": entry["title"] or f"Citation {position}",
+            "url": entry["url"],
+            "context": entry["context"],
+        })
+    return citations
+
+def _collect_sources(metadata: Dict) -> List[Dict]:
+    """Search results the model consulted (whether or not it cited them)."""
+    sources = []
+    for group in metadata.get("search_result_groups", []) or []:
+        for entry in group.get("entries", []) or []:
+            if entry.get("url"):
+                sources.append({
+                    "title": entry.get("title"),
+                    "url": entry.get("url"),
+                    "snippet": entry.get("snippet"),
+                    "domain": group.get("domain"),
+                })
+    return sources
+
+def parse_conversation_stream(body: str) -> Optional[Dict]:
+    """
+    Turn a conversation SSE body into the extract_response result shape.
+
+    Returns None when the body holds no assistant answer.
+    """
+    message = reassemble_assistant_message(body)
+    if not message:
+        return None
+
+    parts = (message.get("content") or {}).get("parts") or []
+    text = "\n".join(part for part in parts if isinstance(part, str)).strip()
+    if not text:
+        return None
+
+    metadata = message.get("metadata") or {}
+    citations = _collect_citations(metadata, text)
+    return {
+        "text": text,
+        "citations": citations,
+        "has_citations": len(citations) > 0,
+        "sources": _collect_sources(metadata),
+        "source": "network",
+    }
+
+class ConversationCapture:
+    """Records conversation-stream responses seen by a (sync) page."""
+
+    def __init__(self, page: Page):
+        self.page = page
+        self.responses = []
+        page.on("response", self._on_response)
+
+    def _on_response(self, response: Response) -> None:
+        # Only collect here; reading the body inside the event handler would block the page
+        if is_conversation_stream(response):
+            self.responses.append(response)
+
+    def reset(self) -> None:
+        """Forget earlier turns; call right before sending the prompt to capture."""
+        self.responses = []
+
+    def detach(self) -> None:
+        self.page.remove_listener("response", self._on_response)
+
+    def latest_answer(self) -> Optional[Dict]:
+        """Reassemble the last captured answer, or None if no stream was observed."""
+        for response in reversed(self.responses):
+            try:
+                response.finished()
+                answer = parse_conversation_stream(response.text())
+            except Exception:
+                continue
+            if answer:
+                return answer
+        return None